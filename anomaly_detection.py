@@ -1,11 +1,24 @@
+import numpy as np
 import pandas as pd
-from typing import List, Optional
+from typing import List, Optional, Union
+from quantile_sketch import DEFAULT_K, KLLSketch
+
+Threshold = Union[float, pd.Series, np.ndarray]
+
+# Календарные интервалы для сезонных порогов: номер интервала по дате
+SEASONAL_BUCKETS = {
+    'hour': 'Час суток',
+    'weekday': 'День недели',
+    'hour_of_week': 'Час недели',
+    'day_of_month': 'День месяца',
+    'month': 'Месяц',
+}
 
 
 def detect_anomalies(data: pd.DataFrame,
                      column: str,
-                     lower_threshold: float,
-                     upper_threshold: float,
+                     lower_threshold: Threshold,
+                     upper_threshold: Threshold,
                      group_columns: Optional[List[str]] = None,
                      selected_categories: Optional[dict] = None) -> pd.DataFrame:
     """
@@ -14,8 +27,13 @@ def detect_anomalies(data: pd.DataFrame,
     Args:
         data: DataFrame с данными для анализа
         column: Название столбца для анализа
-        lower_threshold: Нижний порог для обнаружения аномалий
-        upper_threshold: Верхний порог для обнаружения аномалий
+        lower_threshold: Нижний порог для обнаружения аномалий - число,
+            Series с порогами для каждой группы (индекс - ключи групп,
+            как в результате calculate_group_stats) либо массив порогов
+            каждой строки data (как из calculate_rolling_stats); строки
+            с порогом NaN аномалиями не считаются
+        upper_threshold: Верхний порог для обнаружения аномалий - в том же
+            виде, что и нижний
         group_columns: Список столбцов для группировки (опционально)
         selected_categories: Словарь с выбранными категориями для фильтрации (опционально)
 
@@ -27,32 +45,428 @@ def detect_anomalies(data: pd.DataFrame,
 
     if group_columns:
         if selected_categories:
+            selected = np.ones(len(data), dtype=bool)
             for col, values in selected_categories.items():
-                data = data[data[col].isin(values)]
-        grouped = data.groupby(group_columns)
-        anomalies = pd.DataFrame()
-        for name, group in grouped:
-            group_anomalies = group[(group[column] < lower_threshold) |
-                                    (group[column] > upper_threshold)]
-            anomalies = pd.concat([anomalies, group_anomalies])
-        return anomalies
+                selected &= data[col].isin(values).to_numpy()
+            data = data[selected]
+            # Пороги строк отбираются вместе со строками
+            if isinstance(lower_threshold, np.ndarray):
+                lower_threshold = lower_threshold[selected]
+            if isinstance(upper_threshold, np.ndarray):
+                upper_threshold = upper_threshold[selected]
+        return _detect_grouped(data, column, lower_threshold, upper_threshold, group_columns)
     else:
+        if isinstance(lower_threshold, pd.Series) or isinstance(upper_threshold, pd.Series):
+            raise ValueError("Пороги по группам требуют указания group_columns")
         return data[(data[column] < lower_threshold) |
                     (data[column] > upper_threshold)]
 
 
-def calculate_stats(data: pd.DataFrame, column: str) -> tuple:
+def _detect_grouped(data: pd.DataFrame,
+                    column: str,
+                    lower_threshold: Threshold,
+                    upper_threshold: Threshold,
+                    group_columns: List[str]) -> pd.DataFrame:
+    """
+    Находит аномалии с группировкой за один векторизованный проход.
+
+    Строит одну булеву маску по всему DataFrame и упорядочивает найденные
+    строки по номеру группы (стабильная сортировка), поэтому результат
+    совпадает с поочередным обходом групп ``groupby``: группы в порядке
+    сортировки ключей, внутри группы - исходный порядок строк. Строки с
+    пропусками в ключах группировки, как и в ``groupby``, отбрасываются.
+
+    Пороги по группам (Series) сопоставляются строкам через хеш-соединение
+    по ключам групп, без цикла по группам. Строки групп, для которых порог
+    не задан, аномалиями не считаются.
+
+    Args:
+        data: DataFrame с данными для анализа
+        column: Название столбца для анализа
+        lower_threshold: Нижний порог (число или Series по группам)
+        upper_threshold: Верхний порог (число или Series по группам)
+        group_columns: Список столбцов для группировки
+
+    Returns:
+        DataFrame с обнаруженными аномалиями
+    """
+    codes = data.groupby(group_columns, sort=True, observed=True).ngroup().to_numpy()
+    values = data[column]
+    if isinstance(lower_threshold, pd.Series):
+        lower_threshold = broadcast_group_values(data, group_columns, lower_threshold)
+    if isinstance(upper_threshold, pd.Series):
+        upper_threshold = broadcast_group_values(data, group_columns, upper_threshold)
+    mask = ((values < lower_threshold) | (values > upper_threshold)).to_numpy(dtype=bool, na_value=False)
+    mask = mask & ~np.isnan(codes)
+    positions = np.flatnonzero(mask)
+    order = np.argsort(codes[positions], kind='stable')
+    return data.iloc[positions[order]]
+
+
+def broadcast_group_values(data: pd.DataFrame,
+                           group_columns: List[str],
+                           values: pd.Series) -> np.ndarray:
+    """
+    Сопоставляет каждой строке значение её группы.
+
+    Args:
+        data: DataFrame с данными
+        group_columns: Список столбцов для группировки
+        values: Series, индексированная ключами групп (Index для одного
+            столбца группировки, MultiIndex - для нескольких)
+
+    Returns:
+        Массив float длины len(data); для строк без своей группы - NaN
+    """
+    if len(group_columns) == 1:
+        keys = pd.Index(data[group_columns[0]])
+    else:
+        keys = pd.MultiIndex.from_frame(data[group_columns])
+    positions = values.index.get_indexer(keys)
+    result = values.to_numpy(dtype=float, na_value=np.nan)[positions]
+    result[positions == -1] = np.nan
+    return result
+
+
+def calculate_stats(data: pd.DataFrame, column: str,
+                    method: str = 'exact',
+                    sketch_k: int = DEFAULT_K) -> tuple:
     """
     Рассчитывает статистические показатели для обнаружения аномалий.
 
     Args:
         data: DataFrame с данными
         column: Название столбца для анализа
+        method: 'exact' - точные квартили pandas; 'sketch' - оценка по
+            объединяемому скетчу KLL (см. quantile_sketch, ошибка ранга
+            около 1.3% при k=200)
+        sketch_k: Параметр точности скетча для method='sketch'
 
     Returns:
         Кортеж (IQR, Q1, Q3)
     """
+    if method == 'sketch':
+        sketch = KLLSketch(sketch_k).update(data[column].to_numpy(dtype=float, na_value=np.nan))
+        return stats_from_sketch(sketch)
+    if method != 'exact':
+        raise ValueError(f"Неизвестный метод расчета статистики: {method}")
+
     q1 = data[column].quantile(0.25)
     q3 = data[column].quantile(0.75)
     iqr = q3 - q1
-    return iqr, q1, q3
\ No newline at end of file
+    return iqr, q1, q3
+
+
+def stats_from_sketch(sketch: KLLSketch) -> tuple:
+    """
+    Рассчитывает статистические показатели по скетчу квантилей.
+
+    Скетчи частей данных можно предварительно объединить методом merge.
+
+    Args:
+        sketch: Скетч значений столбца
+
+    Returns:
+        Кортеж (IQR, Q1, Q3)
+    """
+    q1, q3 = sketch.quantile([0.25, 0.75])
+    iqr = q3 - q1
+    return iqr, q1, q3
+
+
+def update_sketches(data: pd.DataFrame,
+                    columns: List[str],
+                    sketches: Optional[dict] = None,
+                    sketch_k: int = DEFAULT_K) -> dict:
+    """
+    Добавляет значения столбцов в их скетчи квантилей.
+
+    Позволяет накапливать статистику по частям данных; скетчи разных
+    частей объединяются методом KLLSketch.merge.
+
+    Args:
+        data: DataFrame с очередной частью данных
+        columns: Список числовых столбцов
+        sketches: Словарь {столбец: KLLSketch} для дополнения (опционально)
+        sketch_k: Параметр точности для новых скетчей
+
+    Returns:
+        Словарь {столбец: KLLSketch}
+    """
+    if sketches is None:
+        sketches = {}
+    for column in columns:
+        if column not in sketches:
+            sketches[column] = KLLSketch(sketch_k)
+        sketches[column].update(data[column].to_numpy(dtype=float, na_value=np.nan))
+    return sketches
+
+
+def calculate_group_stats(data: pd.DataFrame,
+                          column: str,
+                          group_columns: List[str]) -> pd.DataFrame:
+    """
+    Рассчитывает статистические показатели отдельно для каждой группы.
+
+    Квартили всех групп вычисляются за один проход ``groupby().quantile``.
+    Пороги для detect_anomalies получаются из результата так же, как из
+    calculate_stats: ``stats['Q1'] - 1.5 * stats['IQR']``.
+
+    Args:
+        data: DataFrame с данными
+        column: Название столбца для анализа
+        group_columns: Список столбцов для группировки
+
+    Returns:
+        DataFrame со столбцами IQR, Q1, Q3, индексированный ключами групп
+    """
+    quantiles = (data.groupby(group_columns, sort=True, observed=True)[column]
+                 .quantile([0.25, 0.75])
+                 .unstack())
+    return _quartile_stats(quantiles)
+
+
+def seasonal_keys(data: pd.DataFrame,
+                  date_column: str,
+                  bucket: str = 'hour_of_week',
+                  group_columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Формирует ключи сезонных групп строк.
+
+    Args:
+        data: DataFrame с данными
+        date_column: Столбец с датой
+        bucket: Календарный интервал (ключ SEASONAL_BUCKETS): 'hour' - час
+            суток (0-23), 'weekday' - день недели (0 - понедельник),
+            'hour_of_week' - час недели (0-167), 'day_of_month' - день
+            месяца (1-31), 'month' - месяц (1-12)
+        group_columns: Столбцы группировки (опционально)
+
+    Returns:
+        DataFrame с индексом data: столбцы группировки и столбец bucket с
+        номером интервала (для строк без даты - <NA>)
+    """
+    if bucket not in SEASONAL_BUCKETS:
+        raise ValueError(f"Неизвестный календарный интервал: {bucket}. "
+                         f"Доступны: {', '.join(SEASONAL_BUCKETS)}")
+    group_columns = list(group_columns or [])
+    if bucket in group_columns:
+        raise ValueError(f"Название интервала {bucket} совпадает со столбцом группировки")
+
+    dates = pd.to_datetime(data[date_column]).dt
+    if bucket == 'hour':
+        codes = dates.hour
+    elif bucket == 'weekday':
+        codes = dates.dayofweek
+    elif bucket == 'hour_of_week':
+        codes = dates.dayofweek * 24 + dates.hour
+    elif bucket == 'day_of_month':
+        codes = dates.day
+    else:
+        codes = dates.month
+
+    keys = data[group_columns].copy()
+    keys[bucket] = codes.astype('Int64')
+    return keys
+
+
+def calculate_seasonal_stats(data: pd.DataFrame,
+                             column: str,
+                             date_column: str,
+                             bucket: str = 'hour_of_week',
+                             group_columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Рассчитывает статистические показатели для каждого календарного интервала.
+
+    Квартили всех интервалов (и сочетаний группа x интервал) вычисляются за
+    один проход ``groupby().quantile``, поэтому обычная для интервала
+    сезонность (ночной спад, выходные) не считается аномалией.
+
+    Args:
+        data: DataFrame с данными
+        column: Название столбца для анализа
+        date_column: Столбец с датой
+        bucket: Календарный интервал (см. seasonal_keys)
+        group_columns: Столбцы группировки (опционально)
+
+    Returns:
+        DataFrame со столбцами IQR, Q1, Q3, индексированный ключами групп
+        и номером интервала (уровень bucket)
+    """
+    keys = seasonal_keys(data, date_column, bucket, group_columns)
+    quantiles = (data[column].groupby([keys[key] for key in keys.columns], sort=True, observed=True)
+                 .quantile([0.25, 0.75])
+                 .unstack())
+    return _quartile_stats(quantiles)
+
+
+def seasonal_thresholds(data: pd.DataFrame,
+                        stats: pd.DataFrame,
+                        date_column: str,
+                        bucket: str = 'hour_of_week',
+                        group_columns: Optional[List[str]] = None,
+                        multiplier: float = 1.5) -> tuple:
+    """
+    Сопоставляет строкам пороги их календарного интервала.
+
+    Пороги интервалов переносятся на строки одним хеш-соединением по ключу
+    интервала (см. broadcast_group_values); результат передается в
+    detect_anomalies как пороги строк.
+
+    Args:
+        data: DataFrame с данными
+        stats: Результат calculate_seasonal_stats с теми же параметрами
+        date_column: Столбец с датой
+        bucket: Календарный интервал
+        group_columns: Столбцы группировки (опционально)
+        multiplier: Множитель IQR
+
+    Returns:
+        Кортеж (нижние пороги, верхние пороги) - массивы длины len(data);
+        для строк без даты или без статистики интервала - NaN
+    """
+    keys = seasonal_keys(data, date_column, bucket, group_columns)
+    key_columns = list(keys.columns)
+    lower_threshold = broadcast_group_values(keys, key_columns, stats['Q1'] - multiplier * stats['IQR'])
+    upper_threshold = broadcast_group_values(keys, key_columns, stats['Q3'] + multiplier * stats['IQR'])
+    return lower_threshold, upper_threshold
+
+
+def _quartile_stats(quantiles: pd.DataFrame) -> pd.DataFrame:
+    """Формирует таблицу IQR, Q1, Q3 из квантилей 0.25 и 0.75 по группам."""
+    stats = pd.DataFrame({
+        'IQR': quantiles[0.75] - quantiles[0.25],
+        'Q1': quantiles[0.25],
+        'Q3': quantiles[0.75],
+    })
+    stats.columns.name = None
+    return stats
+
+
+def calculate_rolling_stats(data: pd.DataFrame,
+                            column: str,
+                            date_column: str,
+                            window: str = '7D',
+                            group_columns: Optional[List[str]] = None,
+                            expanding: bool = False,
+                            min_periods: int = 1) -> pd.DataFrame:
+    """
+    Рассчитывает квартили каждой строки по скользящему окну времени.
+
+    Для каждой строки квартили считаются по значениям за window до ее даты
+    включительно (или по всей истории до нее при expanding=True), при
+    группировке - только по строкам той же группы. Данные один раз
+    сортируются по группе и дате, после чего квартили вычисляются
+    скользящими окнами pandas (``rolling().quantile`` и его вариант для
+    ``groupby``) без цикла по окнам в Python.
+
+    Пороги для detect_anomalies получаются так же, как из calculate_stats:
+    ``(stats['Q1'] - 1.5 * stats['IQR']).to_numpy()``.
+
+    Args:
+        data: DataFrame с данными
+        column: Название столбца для анализа
+        date_column: Столбец с датой
+        window: Длина окна (строка смещения pandas: '7D', '12h', ...)
+        group_columns: Список столбцов для группировки (опционально)
+        expanding: Нарастающее окно от начала данных вместо скользящего
+        min_periods: Минимальное количество значений в окне; при меньшем
+            квартили строки - NaN
+
+    Returns:
+        DataFrame со столбцами IQR, Q1, Q3 с тем же индексом, что у data;
+        для строк без даты или без группы - NaN
+    """
+    dates = pd.to_datetime(data[date_column]).to_numpy(dtype='datetime64[ns]')
+    values = data[column].to_numpy(dtype=float, na_value=np.nan)
+    if group_columns:
+        codes = data.groupby(group_columns, sort=True, observed=True).ngroup().to_numpy(dtype=float)
+    else:
+        codes = np.zeros(len(data))
+
+    valid = np.flatnonzero(~np.isnat(dates) & ~np.isnan(codes))
+    q1 = np.full(len(data), np.nan)
+    q3 = np.full(len(data), np.nan)
+    if valid.size == 0:
+        return pd.DataFrame({'IQR': q3 - q1, 'Q1': q1, 'Q3': q3}, index=data.index)
+
+    order = valid[np.lexsort((dates[valid], codes[valid]))]
+    series = pd.Series(values[order], index=pd.DatetimeIndex(dates[order]))
+    if group_columns:
+        series = series.groupby(codes[order])
+
+    windows = series.expanding(min_periods) if expanding else series.rolling(window, min_periods=min_periods)
+    # Окно строки заканчивается на ней самой; строки с одинаковой датой
+    # должны видеть друг друга, поэтому берется окно последней из них
+    sorted_codes = codes[order]
+    sorted_dates = dates[order]
+    new_run = np.r_[True, (sorted_codes[1:] != sorted_codes[:-1]) | (sorted_dates[1:] != sorted_dates[:-1])]
+    run_last = np.r_[np.flatnonzero(new_run)[1:], order.size] - 1
+    window_end = run_last[np.cumsum(new_run) - 1]
+
+    # Результат упорядочен по группе и дате, как order
+    q1[order] = windows.quantile(0.25).to_numpy()[window_end]
+    q3[order] = windows.quantile(0.75).to_numpy()[window_end]
+    return pd.DataFrame({'IQR': q3 - q1, 'Q1': q1, 'Q3': q3}, index=data.index)
+
+
+def calculate_stats_batch(data: pd.DataFrame,
+                          columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Рассчитывает статистические показатели сразу для нескольких столбцов.
+
+    Квартили всех столбцов вычисляются одним вызовом ``DataFrame.quantile``
+    вместо двух отдельных проходов на каждый столбец.
+
+    Args:
+        data: DataFrame с данными
+        columns: Список числовых столбцов (по умолчанию - все числовые)
+
+    Returns:
+        DataFrame со столбцами IQR, Q1, Q3, индексированный названиями столбцов
+    """
+    if columns is None:
+        columns = numeric_columns(data)
+    quantiles = as_float_frame(data, columns).quantile([0.25, 0.75])
+    q1 = quantiles.loc[0.25]
+    q3 = quantiles.loc[0.75]
+    stats = pd.DataFrame({'IQR': q3 - q1, 'Q1': q1, 'Q3': q3})
+    stats.index = pd.Index(columns, dtype=object)
+    return stats
+
+
+def detect_anomalies_matrix(data: pd.DataFrame,
+                            columns: List[str],
+                            lower_thresholds: np.ndarray,
+                            upper_thresholds: np.ndarray) -> np.ndarray:
+    """
+    Строит матрицу аномалий для нескольких столбцов за одно сравнение.
+
+    Args:
+        data: DataFrame с данными
+        columns: Список числовых столбцов
+        lower_thresholds: Нижние пороги, по одному на столбец
+        upper_thresholds: Верхние пороги, по одному на столбец
+
+    Returns:
+        Булев массив формы (строки, столбцы); True - значение вне порогов
+    """
+    values = as_float_frame(data, columns).to_numpy()
+    lower = np.asarray(lower_thresholds, dtype=float)[np.newaxis, :]
+    upper = np.asarray(upper_thresholds, dtype=float)[np.newaxis, :]
+    return (values < lower) | (values > upper)
+
+
+def numeric_columns(data: pd.DataFrame) -> list:
+    """Возвращает список числовых столбцов DataFrame в исходном порядке."""
+    return [column for column in data.columns
+            if pd.api.types.is_numeric_dtype(data[column])]
+
+
+def as_float_frame(data: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+    """Приводит выбранные столбцы к единой матрице float64 (NaN вместо пропусков)."""
+    subset = data[columns]
+    if all(dtype == np.float64 for dtype in subset.dtypes):
+        return subset
+    values = subset.to_numpy(dtype=float, na_value=np.nan)
+    return pd.DataFrame(values, index=data.index, columns=subset.columns)
@@ -1,45 +1,661 @@
 import pandas as pd
-from anomaly_detection import detect_anomalies, calculate_stats
+from collections.abc import Mapping
+from typing import BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+from anomaly_detection import (
+    broadcast_group_values, detect_anomalies, calculate_stats, calculate_stats_batch,
+    detect_anomalies_matrix, numeric_columns, as_float_frame,
+    stats_from_sketch, update_sketches
+)
+from quantile_sketch import DEFAULT_K, KLLSketch, sketch_quantiles
+from baseline_store import Baseline, BaselineStore, group_token
+from data_loader import DEFAULT_CHUNK_SIZE, excel_sheet_names, iter_excel_chunks, read_table
+from excel_export import check_engine, write_xlsxwriter_sheets
 import io
+import multiprocessing
+import os
+import tempfile
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 from openpyxl.styles import PatternFill
 
+# Минимальный размер таблицы (строки x числовые столбцы), начиная с которого
+# параллельная обработка окупает запуск процессов
+PARALLEL_MIN_CELLS = 2_000_000
 
-def process_file(file_path: str) -> list:
+
+class ColumnResult(Mapping):
+    """
+    Результат анализа одного столбца.
+
+    Вместо копии аномальных строк хранит ссылку на общую для всех столбцов
+    таблицу и номера строк этого столбца в ней: строка, аномальная в
+    нескольких столбцах, хранится один раз. Таблица аномалий столбца
+    создается только при обращении к anomalies (каждый раз заново, поэтому
+    ее изменение не затрагивает результат).
+
+    Поддерживает доступ как к словарю: result['column'], result['anomalies'],
+    result['lower_threshold'], result['upper_threshold'].
+
+    Args:
+        column: Название столбца
+        frame: Общая таблица строк (обычно - строки, аномальные хотя бы в
+            одном столбце)
+        positions: Номера аномальных строк столбца в frame
+        lower_threshold: Нижний порог
+        upper_threshold: Верхний порог
+    """
+
+    _KEYS = ('column', 'anomalies', 'lower_threshold', 'upper_threshold')
+
+    def __init__(self, column, frame: pd.DataFrame, positions: np.ndarray,
+                 lower_threshold, upper_threshold):
+        self.column = column
+        self.frame = frame
+        self.positions = positions
+        self.lower_threshold = lower_threshold
+        self.upper_threshold = upper_threshold
+
+    @property
+    def anomalies(self) -> pd.DataFrame:
+        """Аномальные строки столбца (с исходными метками строк)."""
+        return self.frame.iloc[self.positions]
+
+    @property
+    def count(self) -> int:
+        """Количество аномалий без создания таблицы."""
+        return len(self.positions)
+
+    def __getitem__(self, key):
+        if key not in self._KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self._KEYS)
+
+    def __len__(self) -> int:
+        return len(self._KEYS)
+
+    def __repr__(self) -> str:
+        return (f"ColumnResult(column={self.column!r}, anomalies={self.count}, "
+                f"lower_threshold={self.lower_threshold!r}, upper_threshold={self.upper_threshold!r})")
+
+
+def column_results(df: pd.DataFrame,
+                   columns: Sequence,
+                   positions: Sequence[np.ndarray],
+                   lower_thresholds: Sequence,
+                   upper_thresholds: Sequence) -> List[ColumnResult]:
+    """
+    Создает результаты столбцов с общей таблицей аномальных строк.
+
+    Из df один раз выбираются строки, аномальные хотя бы в одном столбце;
+    результаты ссылаются на эту таблицу, поэтому исходная таблица после
+    анализа не удерживается в памяти.
+
+    Args:
+        df: Проанализированная таблица
+        columns: Столбцы
+        positions: Номера аномальных строк каждого столбца в df
+        lower_thresholds: Нижние пороги столбцов
+        upper_thresholds: Верхние пороги столбцов
+
+    Returns:
+        Список ColumnResult в порядке columns
+    """
+    rows = np.unique(np.concatenate(positions)) if len(positions) else np.empty(0, dtype=np.intp)
+    shared = df.iloc[rows]
+    return [
+        ColumnResult(column, shared, np.searchsorted(rows, column_positions),
+                     lower_threshold, upper_threshold)
+        for column, column_positions, lower_threshold, upper_threshold
+        in zip(columns, positions, lower_thresholds, upper_thresholds)
+    ]
+
+
+def process_file(source: Union[str, bytes, BinaryIO, pd.DataFrame],
+                 batch: bool = True,
+                 columns: Optional[List[str]] = None,
+                 workers: int = 1,
+                 sheets: Optional[Union[str, List[str]]] = None,
+                 file_name: Optional[str] = None) -> Union[list, Dict[str, list]]:
     """
-    Обрабатывает Excel файл и находит аномалии для каждого числового столбца.
+    Обрабатывает файл и находит аномалии для каждого числового столбца.
+
+    Формат файла (Excel, CSV, Parquet, Feather) определяется автоматически.
+    По умолчанию обрабатывается первый лист Excel файла; при указании
+    sheets обрабатываются несколько листов (см. process_workbook).
+
+    Файл можно передать путем, байтами или потоком, а уже прочитанную
+    таблицу - как DataFrame: тогда она анализируется без повторного
+    разбора и без записи на диск.
 
     Args:
-        file_path: Путь к Excel файлу
+        source: Путь к файлу, байты, двоичный поток или DataFrame
+        batch: Пакетный режим - квартили всех числовых столбцов считаются
+            одним вызовом DataFrame.quantile, а аномалии - одной матрицей
+            сравнений. При False столбцы обрабатываются по одному.
+        columns: Список столбцов для чтения (по умолчанию - все); для
+            Parquet, Feather и CSV остальные столбцы не читаются с диска
+        workers: Количество процессов для параллельного анализа столбцов
+            (или листов, если указан sheets)
+        sheets: 'all' - все листы, список - выбранные листы Excel файла
+            (DataFrame содержит один лист, поэтому с ним не указывается)
+        file_name: Имя файла для определения формата (для байтов и потоков)
 
     Returns:
-        Список словарей с результатами анализа для каждого столбца
+        Список результатов анализа (ColumnResult) для каждого столбца, а при
+        указании sheets - словарь {лист: список результатов}
     """
+    if isinstance(source, pd.DataFrame):
+        if sheets is not None:
+            raise ValueError("Для DataFrame листы не указываются: передайте файл или его байты")
+        df = source if columns is None else source[columns]
+        return process_frame(df, batch=batch, workers=workers)
+
+    if sheets is not None:
+        return process_workbook(source, None if sheets == 'all' else sheets,
+                                batch=batch, columns=columns, workers=workers,
+                                file_name=file_name)
+
     # Чтение файла
-    df = pd.read_excel(file_path)
+    df = read_table(source, file_name, columns=columns)
+
+    return process_frame(df, batch=batch, workers=workers)
+
+
+def process_workbook(source: Union[str, bytes, BinaryIO],
+                     sheets: Optional[List[str]] = None,
+                     batch: bool = True,
+                     columns: Optional[List[str]] = None,
+                     workers: int = 1,
+                     file_name: Optional[str] = None) -> Dict[str, list]:
+    """
+    Обрабатывает несколько листов Excel файла.
+
+    При workers > 1 листы читаются и анализируются параллельно в
+    отдельных процессах: каждый процесс сам разбирает свой лист. Файл,
+    переданный байтами или потоком, один раз записывается во временный
+    файл, и процессам передается только путь к нему (а не копия байтов
+    на каждый лист).
+
+    Args:
+        source: Путь к Excel файлу, его байты или двоичный поток
+        sheets: Список листов (по умолчанию - все листы книги)
+        batch: Пакетный режим (см. process_file)
+        columns: Список столбцов для чтения (по умолчанию - все)
+        workers: Количество процессов
+        file_name: Имя файла для определения формата (для байтов и потоков)
+
+    Returns:
+        Словарь {лист: список результатов} в порядке листов
+    """
+    if not isinstance(source, (str, os.PathLike, bytes)):
+        # Поток нельзя передать другим процессам и читать одновременно
+        source.seek(0)
+        source = source.read()
+    sheet_names = excel_sheet_names(source, file_name)
+    if sheets is None:
+        sheets = sheet_names
+    unknown = [sheet for sheet in sheets if sheet not in sheet_names]
+    if unknown:
+        raise ValueError(f"В файле нет листов: {', '.join(map(str, unknown))}")
+
+    if workers <= 1 or len(sheets) <= 1:
+        return {sheet: _process_sheet(source, sheet, batch, columns, file_name) for sheet in sheets}
+
+    temp_path = None
+    if isinstance(source, bytes):
+        suffix = os.path.splitext(file_name)[1] if file_name else ''
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as temp_file:
+            temp_file.write(source)
+        source = temp_path = temp_file.name
+    try:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(workers, len(sheets)), mp_context=context) as executor:
+            futures = [executor.submit(_process_sheet, source, sheet, batch, columns, file_name)
+                       for sheet in sheets]
+            return {sheet: future.result() for sheet, future in zip(sheets, futures)}
+    finally:
+        if temp_path is not None:
+            os.unlink(temp_path)
+
+
+def _process_sheet(source: Union[str, bytes], sheet_name: str, batch: bool,
+                   columns: Optional[List[str]], file_name: Optional[str] = None) -> list:
+    """Читает и анализирует один лист Excel файла (в том числе в процессе-обработчике)."""
+    df = read_table(source, file_name, columns=columns, sheet_name=sheet_name)
+    return process_frame(df, batch=batch)
+
+
+def process_frame(df: pd.DataFrame, batch: bool = True, workers: int = 1,
+                  columns: Optional[list] = None) -> list:
+    """
+    Находит аномалии для каждого числового столбца DataFrame.
+
+    Args:
+        df: DataFrame с данными
+        batch: Пакетный режим (см. process_file)
+        workers: Количество процессов для параллельного анализа столбцов.
+            Для небольших таблиц (меньше PARALLEL_MIN_CELLS значений)
+            всегда используется последовательная обработка.
+        columns: Столбцы для анализа (по умолчанию - все числовые); в
+            таблицах аномалий остаются все столбцы строк
+
+    Returns:
+        Список результатов анализа (ColumnResult) для каждого столбца
+    """
+    if columns is None:
+        columns = numeric_columns(df)
+    if workers > 1 and len(columns) > 1 and len(df) * len(columns) >= PARALLEL_MIN_CELLS:
+        return _process_columns_parallel(df, columns, workers)
+
+    if batch:
+        return _process_columns_batch(df, columns)
 
-    # Список для хранения результатов
-    results = []
+    # Метки строк заменяются номерами, чтобы получить позиции аномалий
+    numbered = df.reset_index(drop=True)
+    positions, lower_thresholds, upper_thresholds = [], [], []
 
     # Проход по каждому столбцу
-    for column in df.columns:
-        if pd.api.types.is_numeric_dtype(df[column]):
-            # Вычисление статистик
-            iqr, q1, q3 = calculate_stats(df, column)
-            lower_threshold = q1 - 1.5 * iqr
-            upper_threshold = q3 + 1.5 * iqr
-
-            # Нахождение аномалий
-            anomalies = detect_anomalies(df, column, lower_threshold, upper_threshold)
-            results.append({
-                'column': column,
-                'anomalies': anomalies,
-                'lower_threshold': lower_threshold,
-                'upper_threshold': upper_threshold
-            })
+    for column in columns:
+        # Вычисление статистик
+        iqr, q1, q3 = calculate_stats(df, column)
+        lower_thresholds.append(q1 - 1.5 * iqr)
+        upper_thresholds.append(q3 + 1.5 * iqr)
+
+        # Нахождение аномалий
+        anomalies = detect_anomalies(numbered, column, lower_thresholds[-1], upper_thresholds[-1])
+        positions.append(anomalies.index.to_numpy())
+
+    return column_results(df, columns, positions, lower_thresholds, upper_thresholds)
+
+
+def _process_columns_batch(df: pd.DataFrame, columns: list) -> list:
+    """
+    Находит аномалии во всех переданных столбцах за несколько проходов по данным.
+
+    Args:
+        df: DataFrame с данными
+        columns: Список числовых столбцов
+
+    Returns:
+        Список результатов анализа (ColumnResult) для каждого столбца
+    """
+    if not columns:
+        return []
+
+    # Приводим столбцы к float64 один раз для расчета квартилей и сравнения
+    values = as_float_frame(df, columns)
+    stats = calculate_stats_batch(values, columns)
+    lower_thresholds = (stats['Q1'] - 1.5 * stats['IQR']).to_numpy()
+    upper_thresholds = (stats['Q3'] + 1.5 * stats['IQR']).to_numpy()
+    mask = detect_anomalies_matrix(values, columns, lower_thresholds, upper_thresholds)
+
+    positions = [np.flatnonzero(mask[:, position]) for position in range(len(columns))]
+    return column_results(df, columns, positions, lower_thresholds, upper_thresholds)
+
+
+def _process_columns_parallel(df: pd.DataFrame, columns: list, workers: int) -> list:
+    """
+    Находит аномалии в столбцах, распределяя их между процессами.
+
+    Числовые столбцы копируются один раз в разделяемую память как матрица
+    float64 (по столбцам); процессы подключаются к ней по имени и получают
+    свои диапазоны столбцов без сериализации данных. Обратно передаются
+    только пороги и номера аномальных строк.
+
+    Args:
+        df: DataFrame с данными
+        columns: Список числовых столбцов
+        workers: Количество процессов
+
+    Returns:
+        Список результатов анализа (ColumnResult) для каждого столбца
+    """
+    values = as_float_frame(df, columns).to_numpy()
+    memory = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+    try:
+        shared = np.ndarray(values.shape, dtype=np.float64, buffer=memory.buf, order='F')
+        shared[:] = values
+        del values
+
+        bounds = np.linspace(0, len(columns), min(workers, len(columns)) + 1).astype(int)
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=len(bounds) - 1, mp_context=context) as executor:
+            futures = [
+                executor.submit(_analyze_shared_columns, memory.name, shared.shape, start, stop)
+                for start, stop in zip(bounds[:-1], bounds[1:])
+            ]
+            shards = [future.result() for future in futures]
+        del shared
+    finally:
+        memory.close()
+        memory.unlink()
+
+    lower_thresholds, upper_thresholds, positions = zip(*(item for shard in shards for item in shard))
+    return column_results(df, columns, positions, lower_thresholds, upper_thresholds)
+
+
+def _analyze_shared_columns(memory_name: str, shape: tuple, start: int, stop: int) -> list:
+    """
+    Рассчитывает пороги и аномальные строки для диапазона столбцов (в процессе-обработчике).
+
+    Args:
+        memory_name: Имя блока разделяемой памяти с матрицей значений
+        shape: Форма матрицы (строки, столбцы)
+        start: Первый столбец диапазона
+        stop: Столбец, следующий за последним
+
+    Returns:
+        Список кортежей (нижний порог, верхний порог, номера строк)
+    """
+    memory = shared_memory.SharedMemory(name=memory_name)
+    try:
+        shared = np.ndarray(shape, dtype=np.float64, buffer=memory.buf, order='F')
+        block = pd.DataFrame(shared[:, start:stop])
+        stats = calculate_stats_batch(block, list(block.columns))
+        lower_thresholds = (stats['Q1'] - 1.5 * stats['IQR']).to_numpy()
+        upper_thresholds = (stats['Q3'] + 1.5 * stats['IQR']).to_numpy()
+        mask = detect_anomalies_matrix(block, list(block.columns), lower_thresholds, upper_thresholds)
+
+        shard = [
+            (lower_thresholds[position], upper_thresholds[position], np.flatnonzero(mask[:, position]))
+            for position in range(stop - start)
+        ]
+        del block, shared, mask
+    finally:
+        memory.close()
+    return shard
+
+
+def process_file_streaming(file_path: str,
+                           chunk_size: int = DEFAULT_CHUNK_SIZE,
+                           sheet_name: Optional[str] = None,
+                           method: str = 'exact',
+                           sketch_k: int = DEFAULT_K) -> list:
+    """
+    Обрабатывает Excel файл потоково, не загружая лист целиком.
+
+    Файл читается дважды частями по chunk_size строк. Первый проход
+    накапливает значения числовых столбцов и рассчитывает квартили, второй -
+    классифицирует строки по готовым порогам и сохраняет только аномальные
+    строки. Результат имеет тот же формат, что и у process_file.
+
+    Предел памяти зависит от метода. При method='exact' первый проход
+    хранит все значения числовых столбцов в массивах float64: 8 байт на
+    каждое числовое значение файла (строки x числовые столбцы), что все
+    равно в несколько раз меньше DataFrame всего листа. При method='sketch'
+    каждый столбец представлен скетчем KLL из O(sketch_k) значений, и
+    память первого прохода не зависит от числа строк; квартили при этом
+    приближенные (см. quantile_sketch). В обоих методах в памяти находятся
+    одна часть из chunk_size строк и аномальные строки результата.
+
+    Args:
+        file_path: Путь к Excel файлу (.xlsx)
+        chunk_size: Количество строк в одной части
+        sheet_name: Название листа (по умолчанию - первый лист)
+        method: Способ расчета квартилей: 'exact' или 'sketch'
+        sketch_k: Параметр точности скетча для method='sketch'
+
+    Returns:
+        Список результатов анализа (ColumnResult) для каждого столбца
+    """
+    if method not in ('exact', 'sketch'):
+        raise ValueError(f"Неизвестный метод расчета статистики: {method}")
+
+    # Первый проход: значения (или скетчи) числовых столбцов
+    all_columns, accumulated = _accumulate_columns(
+        iter_excel_chunks(file_path, chunk_size, sheet_name), method, sketch_k)
+    columns = [column for column in all_columns if column in accumulated]
+    if not columns:
+        return []
+    thresholds = {column: _accumulated_thresholds(accumulated.pop(column), method) for column in columns}
 
+    # Второй проход: классификация строк по готовым порогам; сохраняются
+    # строки, аномальные хотя бы в одном столбце, и маска по столбцам
+    lower_thresholds = np.array([thresholds[column][0] for column in columns])
+    upper_thresholds = np.array([thresholds[column][1] for column in columns])
+    parts = []
+    masks = []
+    for chunk in iter_excel_chunks(file_path, chunk_size, sheet_name):
+        mask = detect_anomalies_matrix(chunk, columns, lower_thresholds, upper_thresholds)
+        rows = mask.any(axis=1)
+        if rows.any():
+            parts.append(chunk[rows])
+            masks.append(mask[rows])
+
+    shared = pd.concat(parts) if parts else pd.DataFrame(columns=all_columns)
+    mask = np.concatenate(masks) if masks else np.zeros((0, len(columns)), dtype=bool)
+    return [
+        ColumnResult(column, shared, np.flatnonzero(mask[:, position]), *thresholds[column])
+        for position, column in enumerate(columns)
+    ]
+
+
+def _accumulate_columns(chunks: Iterator[pd.DataFrame], method: str, sketch_k: int) -> Tuple[list, dict]:
+    """
+    Накапливает значения числовых столбцов по частям таблицы.
+
+    Returns:
+        (все столбцы таблицы, {числовой столбец: список массивов значений
+        при method='exact' или скетч при method='sketch'})
+    """
+    accumulated = {}
+    non_numeric = set()
+    all_columns = []
+    for chunk in chunks:
+        all_columns = list(chunk.columns)
+        chunk_columns = _numeric_chunk_columns(chunk, non_numeric)
+        if method == 'sketch':
+            update_sketches(chunk, chunk_columns, accumulated, sketch_k)
+        else:
+            for column in chunk_columns:
+                accumulated.setdefault(column, []).append(chunk[column].to_numpy(dtype=float, na_value=np.nan))
+        for column in non_numeric:
+            accumulated.pop(column, None)
+    return all_columns, accumulated
+
+
+def _numeric_chunk_columns(chunk: pd.DataFrame, non_numeric: set) -> list:
+    """Числовые столбцы части; нечисловые добавляются в non_numeric и дальше не проверяются."""
+    columns = []
+    for column in chunk.columns:
+        if column in non_numeric:
+            continue
+        series = chunk[column]
+        if pd.api.types.is_numeric_dtype(series) or series.isna().all():
+            columns.append(column)
+        else:
+            non_numeric.add(column)
+    return columns
+
+
+def _accumulated_thresholds(accumulated, method: str) -> Tuple[float, float]:
+    """Пороги IQR столбца по накопленным значениям или скетчу."""
+    if method == 'sketch':
+        iqr, q1, q3 = stats_from_sketch(accumulated)
+    else:
+        iqr, q1, q3 = calculate_stats(pd.DataFrame({'values': np.concatenate(accumulated)}), 'values')
+    return q1 - 1.5 * iqr, q3 + 1.5 * iqr
+
+
+def process_incremental(source: Union[str, BinaryIO, bytes, pd.DataFrame],
+                        name: str,
+                        store: Optional[BaselineStore] = None,
+                        date_column: Optional[str] = None,
+                        group_columns: Optional[List[str]] = None,
+                        sketch_k: int = DEFAULT_K,
+                        file_name: Optional[str] = None) -> list:
+    """
+    Находит аномалии только в строках, добавленных после прошлого запуска.
+
+    Базовая статистика набора данных (скетчи квантилей каждого числового
+    столбца и, при группировке, каждой группы) и отметка обработанных строк
+    хранятся в store. Новые строки - строки с датой позже последней
+    обработанной (если задан date_column) или строки после последней
+    обработанной по номеру. Они классифицируются по порогам IQR сохраненных
+    скетчей, после чего скетчи дополняются их значениями, поэтому время
+    анализа зависит от объема новых данных, а не от всей истории.
+
+    Пороги строки берутся из скетча ее группы, для новой группы - из скетча
+    столбца. При первом запуске (статистики еще нет) все строки новые и
+    пороги рассчитываются по ним самим (по группам, если они заданы).
+    Квартили скетча приближенные (см. quantile_sketch).
+
+    Args:
+        source: Путь к файлу, байты, поток или уже загруженный DataFrame
+        name: Название набора данных в хранилище (например, имя файла)
+        store: Хранилище статистик (по умолчанию - BaselineStore())
+        date_column: Столбец с датой для отметки обработанных строк
+        group_columns: Столбцы группировки для порогов по группам
+        sketch_k: Параметр точности скетчей для нового набора данных
+        file_name: Имя файла для определения формата (для байтов и потоков)
+
+    Returns:
+        Список результатов анализа новых строк (ColumnResult) для каждого
+        числового столбца; при группировке пороги - Series по группам
+    """
+    if store is None:
+        store = BaselineStore()
+    group_columns = list(group_columns or [])
+    df = source if isinstance(source, pd.DataFrame) else read_table(source, file_name)
+
+    baseline = store.load(name)
+    if baseline is None:
+        baseline = Baseline(sketch_k, date_column, group_columns)
+    elif baseline.date_column != date_column or baseline.group_columns != group_columns:
+        raise ValueError(
+            f"Статистика набора {name} собрана с date_column={baseline.date_column!r}, "
+            f"group_columns={baseline.group_columns}; удалите ее, чтобы сменить параметры"
+        )
+
+    delta = _new_rows(df, baseline)
+    columns = [column for column in numeric_columns(df) if column not in group_columns]
+    values = as_float_frame(delta, columns).to_numpy()
+    groups = _group_positions(delta, group_columns)
+    tokens = [group_token(key) for key, _ in groups]
+
+    # Пороги каждой новой строки по статистике до добавления новых значений:
+    # пороги групп рассчитываются одним векторным расчетом и сопоставляются
+    # строкам по ключу группы; строкам без группы - пороги столбца
+    lower = np.empty(values.shape)
+    upper = np.empty(values.shape)
+    thresholds = []
+    for position, column in enumerate(columns):
+        (lower_threshold, upper_threshold), column_bounds = _column_thresholds(
+            baseline, str(column), values[:, position], groups, tokens)
+        if group_columns:
+            for bounds, threshold, column_bound in ((lower, lower_threshold, column_bounds[0]),
+                                                    (upper, upper_threshold, column_bounds[1])):
+                row_bounds = broadcast_group_values(delta, group_columns, threshold)
+                bounds[:, position] = np.where(np.isnan(row_bounds), column_bound, row_bounds)
+        else:
+            lower[:, position], upper[:, position] = column_bounds
+        thresholds.append((lower_threshold, upper_threshold))
+
+    mask = (values < lower) | (values > upper)
+    results = column_results(delta, columns,
+                             [np.flatnonzero(mask[:, position]) for position in range(len(columns))],
+                             [lower_threshold for lower_threshold, _ in thresholds],
+                             [upper_threshold for _, upper_threshold in thresholds])
+
+    _mark_processed(baseline, df, delta)
+    store.save(name, baseline)
     return results
 
 
+def _new_rows(df: pd.DataFrame, baseline: Baseline) -> pd.DataFrame:
+    """Выбирает строки, добавленные после последнего запуска."""
+    if baseline.date_column is not None:
+        if baseline.last_date is None:
+            return df
+        dates = pd.to_datetime(df[baseline.date_column])
+        return df[(dates > baseline.last_date).to_numpy(dtype=bool, na_value=False)]
+
+    if len(df) < baseline.rows:
+        raise ValueError(
+            f"В данных {len(df)} строк, а при прошлом запуске было {baseline.rows}; "
+            "строки можно только добавлять в конец"
+        )
+    return df.iloc[baseline.rows:]
+
+
+def _group_positions(data: pd.DataFrame, group_columns: List[str]) -> List[Tuple[tuple, np.ndarray]]:
+    """Возвращает ключи групп и позиции их строк (строки с пропусками в ключах не входят)."""
+    if not group_columns or data.empty:
+        return []
+    indices = data.groupby(group_columns, sort=True).indices
+    return [(key if isinstance(key, tuple) else (key,), rows) for key, rows in indices.items()]
+
+
+def _group_index(keys: List[tuple], group_columns: List[str]) -> pd.Index:
+    """Индекс по ключам групп в формате calculate_group_stats."""
+    if len(group_columns) == 1:
+        return pd.Index([key[0] for key in keys], name=group_columns[0])
+    return pd.MultiIndex.from_tuples(keys, names=group_columns)
+
+
+def _sketch_bounds(sketches: List[KLLSketch]) -> np.ndarray:
+    """Пороги IQR по скетчам квантилей: массив формы (len(sketches), 2)."""
+    q1, q3 = sketch_quantiles(sketches, [0.25, 0.75]).T
+    iqr = q3 - q1
+    return np.column_stack([q1 - 1.5 * iqr, q3 + 1.5 * iqr])
+
+
+def _column_thresholds(baseline: Baseline, column: str, values: np.ndarray,
+                       groups: list, tokens: List[str]) -> tuple:
+    """
+    Пороги столбца по статистике до новых строк; скетчи дополняются их значениями.
+
+    Обновляются только скетчи групп, которые есть в новых строках. Пороги
+    групп со статистикой рассчитываются по их скетчам; новой группе
+    достаются пороги столбца, а если и столбец новый - пороги по ее
+    собственным новым значениям.
+
+    Returns:
+        ((нижний, верхний порог), (нижний, верхний порог столбца)); при
+        группировке пороги - Series по группам новых строк
+    """
+    column_sketch = baseline.column_sketches.setdefault(column, KLLSketch(baseline.sketch_k))
+    known = column_sketch.count > 0
+    column_bounds = _sketch_bounds([column_sketch])[0] if known else None
+    column_sketch.update(values)
+    if not known:
+        column_bounds = _sketch_bounds([column_sketch])[0]
+    column_bounds = tuple(column_bounds.tolist())
+    if not baseline.group_columns:
+        return column_bounds, column_bounds
+
+    sketches = baseline.group_sketches.setdefault(column, {})
+    stored = np.array([token in sketches and sketches[token].count > 0 for token in tokens], dtype=bool)
+    bounds = np.tile(np.array(column_bounds), (len(tokens), 1))
+    bounds[stored] = _sketch_bounds([sketches[token] for token, old in zip(tokens, stored) if old])
+
+    for token, (_, rows) in zip(tokens, groups):
+        if token not in sketches:
+            sketches[token] = KLLSketch(baseline.sketch_k)
+        sketches[token].update(values[rows])
+    if not known:
+        # Скетч новой группы содержит только ее новые значения
+        bounds[~stored] = _sketch_bounds([sketches[token] for token, old in zip(tokens, stored) if not old])
+
+    index = _group_index([key for key, _ in groups], baseline.group_columns)
+    thresholds = (pd.Series(bounds[:, 0], index=index, dtype=float),
+                  pd.Series(bounds[:, 1], index=index, dtype=float))
+    return thresholds, column_bounds
+
+
+def _mark_processed(baseline: Baseline, df: pd.DataFrame, delta: pd.DataFrame) -> None:
+    """Сдвигает отметку обработанных строк."""
+    baseline.rows = len(df)
+    if baseline.date_column is not None and not delta.empty:
+        last_date = pd.to_datetime(delta[baseline.date_column]).max()
+        if not pd.isna(last_date):
+            baseline.last_date = last_date
+
+
 def display_results(results: list) -> None:
     """
     Выводит результаты анализа в консоль.
@@ -54,55 +670,163 @@ def display_results(results: list) -> None:
         print(f"Аномалии:\n{anomalies}\n")
 
 
-def create_anomalies_excel(results: list) -> bytes:
+def create_anomalies_excel(results: list, engine: str = 'openpyxl') -> bytes:
     """
     Создает Excel файл с аномалиями, выделенными цветом.
 
     Args:
         results: Список результатов анализа
+        engine: Движок записи: 'openpyxl' или 'xlsxwriter' (потоковая
+            запись с постоянным расходом памяти)
+
+    Returns:
+        Байтовое представление Excel файла
+    """
+    output = io.BytesIO()
+    write_anomalies_excel(results, output, engine)
+    return output.getvalue()
+
+
+def write_anomalies_excel(results: list,
+                          target: Union[str, BinaryIO],
+                          engine: str = 'openpyxl') -> None:
+    """
+    Записывает Excel файл с аномалиями, выделенными цветом.
+
+    Args:
+        results: Список результатов анализа
+        target: Путь к файлу или двоичный поток
+        engine: Движок записи: 'openpyxl' или 'xlsxwriter'
+    """
+    write_workbook_anomalies_excel({'All Anomalies': results}, target, engine)
+
+
+def create_workbook_anomalies_excel(results_by_sheet: Dict[str, list],
+                                    engine: str = 'openpyxl') -> bytes:
+    """
+    Создает Excel файл с аномалиями: по одному листу на каждый исходный лист.
+
+    Args:
+        results_by_sheet: Словарь {лист: список результатов} из process_workbook
+        engine: Движок записи: 'openpyxl' или 'xlsxwriter'
 
     Returns:
         Байтовое представление Excel файла
     """
-    all_anomalies = pd.DataFrame()
+    output = io.BytesIO()
+    write_workbook_anomalies_excel(results_by_sheet, output, engine)
+    return output.getvalue()
+
+
+def write_workbook_anomalies_excel(results_by_sheet: Dict[str, list],
+                                   target: Union[str, BinaryIO],
+                                   engine: str = 'openpyxl') -> None:
+    """
+    Записывает Excel файл с аномалиями: по одному листу на каждый исходный лист.
+
+    Args:
+        results_by_sheet: Словарь {лист: список результатов}
+        target: Путь к файлу или двоичный поток
+        engine: Движок записи: 'openpyxl' или 'xlsxwriter'
+    """
+    check_engine(engine)
+    sheets = [(sheet_name, *combine_anomalies(results))
+              for sheet_name, results in results_by_sheet.items()]
+
+    if engine == 'xlsxwriter':
+        write_xlsxwriter_sheets(target, [
+            (sheet_name, all_anomalies, _highlight_columns(all_anomalies, blocks), None)
+            for sheet_name, all_anomalies, blocks in sheets
+        ])
+        return
+
+    red_fill = PatternFill(start_color='FFFF0000',
+                           end_color='FFFF0000',
+                           fill_type='solid')
+    with pd.ExcelWriter(target, engine='openpyxl') as writer:
+        for sheet_name, all_anomalies, blocks in sheets:
+            all_anomalies.to_excel(writer, sheet_name=sheet_name, index=False)
+            worksheet = writer.book[sheet_name]
+            for row, column in _anomaly_cells(all_anomalies, blocks):
+                worksheet.cell(row=row, column=column).fill = red_fill
+
+
+def combine_anomalies(results: list) -> Tuple[pd.DataFrame, list]:
+    """
+    Объединяет аномалии всех столбцов в общую таблицу.
+
+    Args:
+        results: Список результатов анализа
+
+    Returns:
+        Кортеж (общая таблица с столбцом Anomaly, список пар (столбец,
+        количество строк) в порядке блоков)
+    """
+    if results and all(isinstance(result, ColumnResult) for result in results) \
+            and len({id(result.frame) for result in results}) == 1:
+        return _combine_shared(results)
 
+    frames = []
+    blocks = []
     for result in results:
         column = result['column']
         anomalies = result['anomalies']
         if not anomalies.empty:
-            anomalies['Anomaly'] = anomalies[column].astype(str) + ' ' + column
-            if all_anomalies.empty:
-                all_anomalies = anomalies
-            else:
-                all_anomalies = pd.concat([all_anomalies, anomalies], axis=0)
+            frames.append(anomalies.assign(Anomaly=anomalies[column].astype(str) + ' ' + str(column)))
+            blocks.append((column, len(anomalies)))
 
-    all_anomalies = all_anomalies.reset_index(drop=True)
+    all_anomalies = pd.concat(frames, axis=0) if frames else pd.DataFrame()
+    return all_anomalies.reset_index(drop=True), blocks
 
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        all_anomalies.to_excel(writer, sheet_name='All Anomalies', index=False)
-        workbook = writer.book
-        worksheet = workbook['All Anomalies']
-
-        red_fill = PatternFill(start_color='FFFF0000',
-                               end_color='FFFF0000',
-                               fill_type='solid')
-        for row in worksheet.iter_rows(min_row=2,
-                                       max_row=worksheet.max_row,
-                                       min_col=1,
-                                       max_col=worksheet.max_column):
-            for cell in row:
-                # Исключаем столбец Date
-                if cell.column_letter != 'A' and cell.value is not None:
-                    column_name = worksheet.cell(row=1, column=cell.column).value
-                    if f"{cell.value} {column_name}" in all_anomalies['Anomaly'].values:
-                        cell.fill = red_fill
 
-    return output.getvalue()
+def _combine_shared(results: List[ColumnResult]) -> Tuple[pd.DataFrame, list]:
+    """Объединяет результаты с общей таблицей строк одной выборкой из нее."""
+    results = [result for result in results if result.count]
+    if not results:
+        return pd.DataFrame(), []
+    frame = results[0].frame
+    all_anomalies = frame.iloc[np.concatenate([result.positions for result in results])].reset_index(drop=True)
+    all_anomalies['Anomaly'] = pd.concat(
+        [frame[result.column].iloc[result.positions].astype(str) + ' ' + str(result.column)
+         for result in results],
+        ignore_index=True
+    )
+    return all_anomalies, [(result.column, result.count) for result in results]
+
+
+def _highlight_columns(all_anomalies: pd.DataFrame, blocks: list) -> np.ndarray:
+    """Возвращает для каждой строки общей таблицы номер аномального столбца (с 0)."""
+    return np.repeat(
+        [all_anomalies.columns.get_loc(column) for column, _ in blocks],
+        [count for _, count in blocks]
+    ).astype(int)
+
+
+def _anomaly_cells(all_anomalies: pd.DataFrame, blocks: list) -> Iterator[Tuple[int, int]]:
+    """
+    Возвращает координаты аномальных ячеек листа с общей таблицей аномалий.
+
+    Строки общей таблицы идут блоками - по одному на проанализированный
+    столбец, - поэтому аномальная ячейка каждой строки известна точно:
+    это ячейка столбца, в котором найдена аномалия.
+
+    Args:
+        all_anomalies: Общая таблица аномалий
+        blocks: Список пар (столбец, количество строк) в порядке блоков
+
+    Yields:
+        Пары (строка, столбец) в нумерации Excel (с 1, строка 1 - заголовок)
+    """
+    first_row = 2
+    for column, count in blocks:
+        column_number = all_anomalies.columns.get_loc(column) + 1
+        for row in range(first_row, first_row + count):
+            yield row, column_number
+        first_row += count
 
 
-# Пример использования
+# Пакетная обработка из командной строки (см. batch_runner.py)
 if __name__ == "__main__":
-    file_path = 'path_to_your_file.xlsx'
-    results = process_file(file_path)
-    display_results(results)
\ No newline at end of file
+    import sys
+    from batch_runner import main
+    sys.exit(main())
@@ -0,0 +1,508 @@
+"""
+HTTP API поиска аномалий для других сервисов (без веб-интерфейса).
+
+Маршруты:
+    GET  /api/health - состояние сервиса;
+    POST /api/stats - квартили и пороги столбца (с group - по группам);
+    POST /api/detect - аномальные строки столбца;
+    POST /api/process - аномалии всех числовых столбцов (как process_file).
+
+Тело запроса - таблица в формате CSV, Parquet, Arrow IPC (файл или поток)
+или Excel. Формат определяется по Content-Type, а без него - по содержимому.
+Результат - таблица в формате NDJSON (по умолчанию) или поток Arrow IPC
+(параметр format=arrow либо заголовок Accept:
+application/vnd.apache.arrow.stream). Процесс пула записывает ее во
+временный файл частями по ROWS_PER_CHUNK строк, а сервер передает файл
+частями по READ_CHUNK_BYTES байт и удаляет его, поэтому результат не
+хранится в памяти целиком.
+
+Сервер асинхронный (Starlette и uvicorn - зависимости streamlit). Разбор
+тела, расчет и кодирование результата выполняются в постоянном пуле
+процессов: он запускается один раз при старте сервера, поэтому запросы
+не импортируют модули и не создают процессы заново, а цикл событий,
+принимающий запросы, не блокируется вычислениями.
+
+Пример:
+    python api_server.py --host 0.0.0.0 --port 8506 --workers 4
+    curl --data-binary @data.csv -H 'Content-Type: text/csv' \\
+        'http://localhost:8506/api/detect?column=temperature&group=plant'
+"""
+
+import argparse
+import asyncio
+import io
+import multiprocessing
+import os
+import sys
+import tempfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from typing import Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import uvicorn
+from pyarrow import ipc
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from anomaly_detection import calculate_group_stats, calculate_stats, detect_anomalies
+from anomaly_processor import process_frame
+from data_loader import read_table
+from version import __version__
+
+API_WORKERS_ENV = 'ANOMALIZER_API_WORKERS'
+MAX_BODY_ENV = 'ANOMALIZER_API_MAX_BODY_BYTES'
+MAX_PENDING_ENV = 'ANOMALIZER_API_MAX_PENDING'
+
+DEFAULT_PORT = 8506
+DEFAULT_MAX_BODY_BYTES = 200 * 1024 * 1024
+
+# Количество запросов на один процесс, которые могут ожидать в очереди пула;
+# сверх этого сервер отвечает 503, а не накапливает тела запросов в памяти
+PENDING_PER_WORKER = 16
+
+# Количество строк результата в одной записываемой части
+ROWS_PER_CHUNK = 10_000
+
+# Размер части файла результата, передаваемой клиенту
+READ_CHUNK_BYTES = 256 * 1024
+
+# Форматы результата и их типы содержимого
+OUTPUT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+# Служебные столбцы результата /api/process перед столбцами данных
+PROCESS_COLUMNS = ('anomaly_column', 'row', 'lower_threshold', 'upper_threshold')
+
+# Типы содержимого тела запроса и имена файлов для определения формата read_table
+_CONTENT_TYPES = {
+    'text/csv': 'body.csv',
+    'application/vnd.apache.parquet': 'body.parquet',
+    'application/x-parquet': 'body.parquet',
+    'application/vnd.apache.arrow.file': 'body.arrow',
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': 'body.xlsx',
+}
+_ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+# Начало потока Arrow IPC (маркер продолжения первого сообщения)
+_ARROW_STREAM_MAGIC = b'\xff\xff\xff\xff'
+
+
+def read_body(body: bytes, content_type: Optional[str] = None) -> pd.DataFrame:
+    """
+    Читает таблицу из тела запроса.
+
+    Args:
+        body: Тело запроса
+        content_type: Заголовок Content-Type (без него формат определяется
+            по содержимому, как в read_table)
+
+    Returns:
+        DataFrame с номерами строк в качестве индекса
+    """
+    if not body:
+        raise ValueError("Тело запроса пусто: передайте таблицу")
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    if media_type == _ARROW_STREAM or (media_type not in _CONTENT_TYPES
+                                       and body.startswith(_ARROW_STREAM_MAGIC)):
+        df = ipc.open_stream(body).read_pandas()
+    else:
+        df = read_table(body, _CONTENT_TYPES.get(media_type))
+    # Индекс из метаданных pandas не сохраняется: строки нумеруются по порядку
+    return df.reset_index(drop=True)
+
+
+def encode_table(frame: pd.DataFrame, output_format: str = 'ndjson',
+                 rows_per_chunk: int = ROWS_PER_CHUNK) -> Iterator[bytes]:
+    """
+    Кодирует таблицу частями.
+
+    Args:
+        frame: Таблица результата (индекс не передается)
+        output_format: 'ndjson' - строка JSON на каждую строку таблицы
+            (пропуски - null, даты - ISO 8601); 'arrow' - поток Arrow IPC,
+            каждая часть - пакет строк
+        rows_per_chunk: Количество строк в одной части
+
+    Returns:
+        Итератор частей ответа
+    """
+    if output_format == 'arrow':
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        buffer = io.BytesIO()
+        with ipc.new_stream(buffer, table.schema) as writer:
+            for batch in table.to_batches(max_chunksize=rows_per_chunk):
+                writer.write_batch(batch)
+                yield _drain(buffer)
+        # Схема пустой таблицы и признак конца потока
+        yield _drain(buffer)
+    elif output_format == 'ndjson':
+        for start in range(0, len(frame), rows_per_chunk):
+            yield frame.iloc[start:start + rows_per_chunk].to_json(
+                orient='records', lines=True, date_format='iso', force_ascii=False
+            ).encode('utf-8')
+    else:
+        raise ValueError(f"Неизвестный формат результата: {output_format}. "
+                         f"Доступны: {', '.join(OUTPUT_FORMATS)}")
+
+
+def write_result(frame: pd.DataFrame, output_format: str) -> str:
+    """
+    Записывает таблицу результата во временный файл частями (в процессе пула).
+
+    Args:
+        frame: Таблица результата
+        output_format: Формат результата (см. encode_table)
+
+    Returns:
+        Путь к файлу; файл удаляет сервер после передачи
+    """
+    descriptor, path = tempfile.mkstemp(prefix='anomalizer-', suffix='.' + output_format)
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            for chunk in encode_table(frame, output_format):
+                file.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+
+def run_stats(body: bytes, content_type: Optional[str], column: str,
+              group_columns: List[str], multiplier: float, method: str,
+              output_format: str) -> str:
+    """
+    Рассчитывает квартили и пороги столбца (в процессе пула).
+
+    Returns:
+        Путь к временному файлу с таблицей со столбцами IQR, Q1, Q3, lower_threshold,
+        upper_threshold (с group - по строке на группу, ключи групп -
+        первыми столбцами)
+    """
+    df = read_body(body, content_type)
+    stats, _, _ = _thresholds(df, column, group_columns, multiplier, method)
+    return write_result(stats, output_format)
+
+
+def run_detect(body: bytes, content_type: Optional[str], column: str,
+               group_columns: List[str], multiplier: float, method: str,
+               output_format: str) -> str:
+    """
+    Находит аномалии столбца (в процессе пула).
+
+    Returns:
+        Путь к временному файлу с таблицей аномальных строк: номер строки во входной таблице
+        (row) и все столбцы строки
+    """
+    df = read_body(body, content_type)
+    _, lower_threshold, upper_threshold = _thresholds(df, column, group_columns, multiplier, method)
+    anomalies = detect_anomalies(df, column, lower_threshold, upper_threshold, group_columns or None)
+    if anomalies.empty:
+        anomalies = df.iloc[:0]
+    return write_result(anomalies.rename_axis('row').reset_index(), output_format)
+
+
+def run_process(body: bytes, content_type: Optional[str], columns: List[str],
+                output_format: str) -> str:
+    """
+    Находит аномалии всех числовых столбцов (в процессе пула).
+
+    Returns:
+        Путь к временному файлу с таблицей аномалий в длинном формате: на каждую аномалию -
+        столбец (anomaly_column), номер строки (row), пороги столбца и все
+        столбцы строки; строки упорядочены по столбцам
+    """
+    df = read_body(body, content_type)
+    _check_columns(df, columns)
+    clash = [name for name in PROCESS_COLUMNS if name in df.columns]
+    if clash:
+        raise ValueError(f"Столбцы {', '.join(clash)} совпадают со служебными столбцами результата")
+
+    results = process_frame(df, columns=columns or None)
+    counts = [result.count for result in results]
+    rows = pd.concat([result.anomalies for result in results]) if results else df.iloc[:0]
+    info = pd.DataFrame({
+        'anomaly_column': np.repeat([str(result['column']) for result in results], counts),
+        'row': rows.index.to_numpy(),
+        'lower_threshold': np.repeat([float(result['lower_threshold']) for result in results], counts),
+        'upper_threshold': np.repeat([float(result['upper_threshold']) for result in results], counts),
+    })
+    return write_result(pd.concat([info, rows.reset_index(drop=True)], axis=1), output_format)
+
+
+def _thresholds(df: pd.DataFrame, column: str, group_columns: List[str],
+                multiplier: float, method: str) -> tuple:
+    """Статистика столбца и пороги (числа либо Series по группам) для множителя IQR."""
+    _check_columns(df, [column] + group_columns)
+    if group_columns:
+        if method != 'exact':
+            raise ValueError("Статистика по группам рассчитывается только методом exact")
+        stats = calculate_group_stats(df, column, group_columns)
+        lower_threshold = stats['Q1'] - multiplier * stats['IQR']
+        upper_threshold = stats['Q3'] + multiplier * stats['IQR']
+        table = stats.assign(lower_threshold=lower_threshold, upper_threshold=upper_threshold).reset_index()
+        return table, lower_threshold, upper_threshold
+
+    iqr, q1, q3 = calculate_stats(df, column, method=method)
+    lower_threshold = q1 - multiplier * iqr
+    upper_threshold = q3 + multiplier * iqr
+    table = pd.DataFrame({'IQR': [iqr], 'Q1': [q1], 'Q3': [q3],
+                          'lower_threshold': [lower_threshold], 'upper_threshold': [upper_threshold]})
+    return table, lower_threshold, upper_threshold
+
+
+def _check_columns(df: pd.DataFrame, columns: Sequence[str]) -> None:
+    """Проверяет, что столбцы есть в таблице."""
+    missing = [column for column in columns if column not in df.columns]
+    if missing:
+        raise ValueError(f"Столбцы не найдены: {', '.join(map(str, missing))}")
+
+
+def _drain(buffer: io.BytesIO) -> bytes:
+    """Забирает записанные в буфер байты и очищает буфер."""
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+def _warm_up() -> None:
+    """Пустое задание: запускает процесс пула и импортирует в нем модули."""
+
+
+async def health(request):
+    """Состояние сервиса."""
+    return JSONResponse({'status': 'ok', 'version': __version__, 'workers': request.app.state.workers})
+
+
+async def stats(request):
+    """Квартили и пороги столбца."""
+    params = request.query_params
+    return await _table_response(request, run_stats, _required(params, 'column'), params.getlist('group'),
+                                 _float(params, 'multiplier', 1.5), params.get('method', 'exact'))
+
+
+async def detect(request):
+    """Аномальные строки столбца."""
+    params = request.query_params
+    return await _table_response(request, run_detect, _required(params, 'column'), params.getlist('group'),
+                                 _float(params, 'multiplier', 1.5), params.get('method', 'exact'))
+
+
+async def process(request):
+    """Аномалии всех числовых (или выбранных) столбцов."""
+    return await _table_response(request, run_process, request.query_params.getlist('column'))
+
+
+async def _table_response(request, function, *args) -> StreamingResponse:
+    """Выполняет расчет в пуле процессов и передает файл результата частями."""
+    output_format = _output_format(request)
+    state = request.app.state
+    # Место в очереди занимается до чтения тела: перегруженный сервер
+    # отвечает 503, не принимая тело в память
+    if state.pending >= state.max_pending:
+        raise HTTPException(503, "Сервер перегружен, повторите запрос позже")
+    state.pending += 1
+    try:
+        body = await _read_request_body(request)
+        path = await _submit(request.app, function, body, request.headers.get('content-type'),
+                             *args, output_format)
+    finally:
+        state.pending -= 1
+    return StreamingResponse(_read_result(path), media_type=OUTPUT_FORMATS[output_format])
+
+
+def _read_result(path: str) -> Iterator[bytes]:
+    """Читает файл результата частями и удаляет его."""
+    try:
+        with open(path, 'rb') as file:
+            while True:
+                chunk = file.read(READ_CHUNK_BYTES)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.unlink(path)
+
+
+async def _read_request_body(request) -> bytes:
+    """Читает тело запроса, не допуская превышения предельного размера."""
+    limit = request.app.state.max_body_bytes
+    length = request.headers.get('content-length')
+    if length and length.isdigit() and int(length) > limit:
+        raise HTTPException(413, f"Тело запроса больше {limit} байт")
+    parts, size = [], 0
+    async for part in request.stream():
+        size += len(part)
+        if size > limit:
+            raise HTTPException(413, f"Тело запроса больше {limit} байт")
+        parts.append(part)
+    return b''.join(parts)
+
+
+async def _submit(app, function, *args) -> str:
+    """Выполняет функцию в пуле процессов; возвращает путь к файлу результата."""
+    future = None
+    try:
+        future = _executor(app).submit(function, *args)
+        return await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        # Клиент отключился: файл результата удаляется, когда расчет завершится
+        if future is not None:
+            future.add_done_callback(_discard_result)
+        raise
+    except BrokenProcessPool:
+        # Процесс пула завершился аварийно (например, по нехватке памяти): пул создается заново
+        _shutdown(app, wait=False)
+        raise HTTPException(503, "Процесс обработки завершился аварийно, повторите запрос")
+
+
+def _discard_result(future: Future) -> None:
+    """Удаляет файл результата расчета, который уже некому передать."""
+    if not future.cancelled() and future.exception() is None:
+        try:
+            os.unlink(future.result())
+        except OSError:
+            pass
+
+
+def _executor(app) -> ProcessPoolExecutor:
+    """Пул процессов приложения (создается при первом обращении)."""
+    if app.state.executor is None:
+        app.state.executor = ProcessPoolExecutor(
+            max_workers=app.state.workers, mp_context=multiprocessing.get_context('spawn'))
+    return app.state.executor
+
+
+def _shutdown(app, wait: bool = True) -> None:
+    """Останавливает пул процессов приложения."""
+    executor, app.state.executor = app.state.executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait, cancel_futures=True)
+
+
+@asynccontextmanager
+async def _lifespan(app):
+    """Запускает процессы пула до приема запросов и останавливает их при завершении."""
+    loop = asyncio.get_running_loop()
+    executor = _executor(app)
+    await asyncio.gather(*[loop.run_in_executor(executor, _warm_up) for _ in range(app.state.workers)])
+    yield
+    _shutdown(app)
+
+
+def _output_format(request) -> str:
+    """Формат результата из параметра format или заголовка Accept."""
+    output_format = request.query_params.get('format')
+    if output_format is None:
+        accept = request.headers.get('accept', '')
+        output_format = 'arrow' if OUTPUT_FORMATS['arrow'] in accept else 'ndjson'
+    if output_format not in OUTPUT_FORMATS:
+        raise HTTPException(400, f"Неизвестный формат результата: {output_format}. "
+                                 f"Доступны: {', '.join(OUTPUT_FORMATS)}")
+    return output_format
+
+
+def _required(params, name: str) -> str:
+    """Обязательный параметр запроса."""
+    value = params.get(name)
+    if not value:
+        raise HTTPException(400, f"Не указан параметр {name}")
+    return value
+
+
+def _float(params, name: str, default: float) -> float:
+    """Числовой параметр запроса."""
+    value = params.get(name)
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        raise HTTPException(400, f"Параметр {name} должен быть числом: {value}")
+
+
+async def _http_error(request, error: HTTPException) -> JSONResponse:
+    """Ошибка запроса в формате JSON."""
+    return JSONResponse({'error': error.detail}, status_code=error.status_code, headers=error.headers)
+
+
+async def _value_error(request, error: ValueError) -> JSONResponse:
+    """Ошибка в данных запроса (формат, столбцы, параметры расчета)."""
+    return JSONResponse({'error': str(error)}, status_code=400)
+
+
+def create_app(workers: Optional[int] = None,
+               max_body_bytes: Optional[int] = None,
+               max_pending: Optional[int] = None) -> Starlette:
+    """
+    Создает приложение HTTP API.
+
+    Args:
+        workers: Количество процессов пула (по умолчанию из
+            ANOMALIZER_API_WORKERS или число ядер)
+        max_body_bytes: Предельный размер тела запроса (по умолчанию из
+            ANOMALIZER_API_MAX_BODY_BYTES или 200 МБ)
+        max_pending: Предельное количество запросов, ожидающих пул (по
+            умолчанию из ANOMALIZER_API_MAX_PENDING или PENDING_PER_WORKER
+            на процесс)
+
+    Returns:
+        ASGI приложение
+    """
+    if workers is None:
+        workers = int(os.environ.get(API_WORKERS_ENV, os.cpu_count() or 1))
+    if max_body_bytes is None:
+        max_body_bytes = int(os.environ.get(MAX_BODY_ENV, DEFAULT_MAX_BODY_BYTES))
+    workers = max(1, workers)
+    if max_pending is None:
+        max_pending = int(os.environ.get(MAX_PENDING_ENV, workers * PENDING_PER_WORKER))
+
+    app = Starlette(
+        routes=[
+            Route('/api/health', health, methods=['GET']),
+            Route('/api/stats', stats, methods=['POST']),
+            Route('/api/detect', detect, methods=['POST']),
+            Route('/api/process', process, methods=['POST']),
+        ],
+        exception_handlers={HTTPException: _http_error, ValueError: _value_error},
+        lifespan=_lifespan,
+    )
+    app.state.workers = workers
+    app.state.max_body_bytes = max_body_bytes
+    app.state.max_pending = max_pending
+    app.state.pending = 0
+    app.state.executor = None
+    return app
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(description="HTTP API поиска аномалий методом IQR.")
+    parser.add_argument('--host', default='127.0.0.1',
+                        help="адрес для приема запросов (по умолчанию 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help=f"порт (по умолчанию {DEFAULT_PORT})")
+    parser.add_argument('-j', '--workers', type=int,
+                        help="количество процессов обработки (по умолчанию - число ядер)")
+    parser.add_argument('--max-body-bytes', type=int,
+                        help="предельный размер тела запроса в байтах")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Точка входа командной строки: запускает сервер uvicorn."""
+    args = parse_args(argv)
+    app = create_app(workers=args.workers, max_body_bytes=args.max_body_bytes)
+    uvicorn.run(app, host=args.host, port=args.port)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
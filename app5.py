@@ -1,11 +1,27 @@
+import os
+import hashlib
+import json
 import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
-from io import BytesIO
-from anomaly_detection import detect_anomalies, calculate_stats
+from anomaly_detection import (
+    SEASONAL_BUCKETS, broadcast_group_values, detect_anomalies, calculate_stats, calculate_group_stats,
+    calculate_rolling_stats, calculate_seasonal_stats, seasonal_thresholds
+)
 from ui_elements import set_page_config, set_title, set_instructions, set_documentation
-from anomaly_processor import process_file, create_anomalies_excel
+from anomaly_processor import (
+    combine_anomalies, create_anomalies_excel, create_workbook_anomalies_excel, process_file
+)
+from data_cache import FrameCache, file_digest
+from data_loader import FORMAT_EXTENSIONS, detect_format, excel_sheet_names, optimize_dtypes, read_table
+from excel_export import EXCEL_ENGINES, export_frame
+from instrumentation import MEMORY_MODES, span, start_recording, stop_recording
+from job_queue import FINAL_STATES, JobQueue
+from plot_utils import (
+    DEFAULT_MAX_POINTS, DOWNSAMPLE_METHODS, band_positions, downsample_positions, limit_groups,
+    split_by_group, trace_budgets
+)
 from version import __version__, VERSION_INFO
 
 # Настройка страницы
@@ -62,23 +78,159 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
+# Кеширование вычислений между перезапусками скрипта: ключ - отпечаток
+# данных и параметры, память ограничена числом записей и временем жизни
+MEMO_TTL_SECONDS = int(os.environ.get('ANOMALIZER_MEMO_TTL', 1800))
+MEMO_MAX_ENTRIES = int(os.environ.get('ANOMALIZER_MEMO_MAX_ENTRIES', 16))
+
+# Фоновые задания: количество процессов, срок хранения результатов и
+# период обновления состояния на странице
+JOB_WORKERS = int(os.environ.get('ANOMALIZER_JOB_WORKERS', 2))
+JOB_TTL_SECONDS = int(os.environ.get('ANOMALIZER_JOB_TTL', 24 * 3600))
+JOB_POLL_SECONDS = 2
+
+# Способы расчета порогов
+THRESHOLD_MODES = {
+    'global': 'Общие',
+    'groups': 'По группам',
+    'rolling': 'Скользящее окно',
+    'seasonal': 'Сезонные',
+}
+
+
+def data_fingerprint(uploaded_file):
+    """Возвращает SHA-256 загруженного файла, вычисляя его один раз за сессию."""
+    upload_id = getattr(uploaded_file, 'file_id', None)
+    if upload_id is None:
+        # Без идентификатора загрузки файлы с одинаковыми именем и размером неразличимы
+        return file_digest(uploaded_file.getvalue())
+    fingerprints = st.session_state.setdefault('data_fingerprints', {})
+    if upload_id not in fingerprints:
+        fingerprints[upload_id] = file_digest(uploaded_file.getvalue())
+    return fingerprints[upload_id]
+
+
+def make_data_key(fingerprint, group_columns, selected_categories):
+    """Формирует ключ отфильтрованных данных: отпечаток файла и параметры фильтра."""
+    categories = {col: list(map(str, values)) for col, values in selected_categories.items()}
+    description = repr((fingerprint, list(group_columns or []), sorted(categories.items())))
+    return hashlib.sha256(description.encode('utf-8')).hexdigest()
+
+
+@st.cache_resource(ttl=MEMO_TTL_SECONDS, max_entries=MEMO_MAX_ENTRIES, show_spinner=False)
+def cached_load_data(fingerprint, _uploaded_file):
+    """Загружает данные один раз для каждого содержимого файла."""
+    return load_data(_uploaded_file)
+
+
+@st.cache_resource(ttl=MEMO_TTL_SECONDS, max_entries=MEMO_MAX_ENTRIES, show_spinner=False)
+def cached_optimize_dtypes(fingerprint, _df):
+    """Уменьшает типы данных загруженной таблицы один раз для каждого содержимого файла."""
+    return optimize_dtypes(_df)
+
+
+@st.cache_data(ttl=MEMO_TTL_SECONDS, max_entries=MEMO_MAX_ENTRIES * 8, show_spinner=False)
+def cached_unique_values(data_key, _df, column):
+    """Возвращает уникальные значения столбца."""
+    return _df[column].unique()
+
+
+@st.cache_resource(ttl=MEMO_TTL_SECONDS, max_entries=MEMO_MAX_ENTRIES, show_spinner=False)
+def cached_filter_data(data_key, _df, group_columns, selected_categories):
+    """Фильтрует данные по выбранным категориям."""
+    return filter_data(_df, group_columns, selected_categories)
+
+
+@st.cache_data(ttl=MEMO_TTL_SECONDS, max_entries=MEMO_MAX_ENTRIES * 8, show_spinner=False)
+def cached_stats(data_key, _df, column):
+    """Рассчитывает статистику столбца."""
+    return calculate_stats(_df, column)
+
+
+@st.cache_data(ttl=MEMO_TTL_SECONDS, max_entries=MEMO_MAX_ENTRIES * 8, show_spinner=False)
+def cached_group_stats(data_key, _df, column, group_columns):
+    """Рассчитывает статистику столбца по группам."""
+    return calculate_group_stats(_df, column, group_columns)
+
+
+@st.cache_data(ttl=MEMO_TTL_SECONDS, max_entries=MEMO_MAX_ENTRIES, show_spinner=False)
+def cached_rolling_stats(data_key, _df, column, date_column, window, group_columns, expanding):
+    """Скользящие квартили столбца по дате (с учетом группировки)."""
+    return calculate_rolling_stats(_df, column, date_column, window, group_columns, expanding)
+
+
+@st.cache_data(ttl=MEMO_TTL_SECONDS, max_entries=MEMO_MAX_ENTRIES, show_spinner=False)
+def cached_seasonal_stats(data_key, _df, column, date_column, bucket, group_columns):
+    """Квартили столбца по календарным интервалам (с учетом группировки)."""
+    return calculate_seasonal_stats(_df, column, date_column, bucket, group_columns)
+
+
+@st.cache_resource(ttl=MEMO_TTL_SECONDS, max_entries=MEMO_MAX_ENTRIES, show_spinner=False)
+def cached_detect_anomalies(data_key, _df, column, lower_threshold, upper_threshold,
+                            group_columns, selected_categories):
+    """Обнаруживает аномалии."""
+    return detect_anomalies(_df, column, lower_threshold, upper_threshold,
+                            group_columns, selected_categories)
+
+
+@st.cache_resource(ttl=MEMO_TTL_SECONDS, max_entries=MEMO_MAX_ENTRIES, show_spinner=False)
+def cached_visualization(data_key, _filtered_df, _anomalies, selected_column, date_column,
+                         group_columns, lower_threshold, upper_threshold, selected_categories,
+                         max_points=None, downsample_method='minmax'):
+    """Создает визуализацию; аномалии однозначно определяются остальными параметрами."""
+    return create_visualization(_filtered_df, _anomalies, selected_column, date_column,
+                                group_columns, lower_threshold, upper_threshold,
+                                max_points, downsample_method)
+
+
+@st.cache_resource(show_spinner=False)
+def cached_job_queue():
+    """Очередь фоновых заданий, общая для всех сессий (старые результаты удаляются)."""
+    queue = JobQueue(workers=JOB_WORKERS)
+    queue.purge(JOB_TTL_SECONDS)
+    return queue
+
+
+@st.cache_data(ttl=MEMO_TTL_SECONDS, max_entries=MEMO_MAX_ENTRIES, show_spinner=False)
+def cached_sheet_names(fingerprint, _uploaded_file):
+    """Возвращает названия листов Excel файла (для других форматов - пустой список)."""
+    file_bytes = _uploaded_file.getvalue()
+    if detect_format(file_bytes, _uploaded_file.name) not in ('xlsx', 'xls'):
+        return []
+    return excel_sheet_names(file_bytes, _uploaded_file.name)
+
+
 def load_data(uploaded_file):
-    """Загружает данные из Excel файла."""
-    file_bytes = uploaded_file.read()
-    if uploaded_file.name.endswith('.xlsx'):
-        return pd.read_excel(BytesIO(file_bytes), engine='openpyxl')
-    else:
-        return pd.read_excel(BytesIO(file_bytes), engine='xlrd')
+    """Загружает данные из файла Excel, CSV, Parquet или Feather (Excel и CSV кешируются)."""
+    file_bytes = uploaded_file.getvalue()
+    file_format = detect_format(file_bytes, uploaded_file.name)
+    if file_format in ('parquet', 'feather'):
+        return read_table(file_bytes, uploaded_file.name)
+    return FrameCache().load(
+        file_bytes, lambda data: read_table(data, uploaded_file.name)
+    )
+
+
+def display_dtype_report(report):
+    """Формирует описание экономии памяти после уменьшения типов данных."""
+    before = report['memory_before'] / 2 ** 20
+    after = report['memory_after'] / 2 ** 20
+    if not report['columns']:
+        return f"Типы данных уже оптимальны: {before:.1f} МБ"
+    ratio = report['memory_before'] / max(report['memory_after'], 1)
+    return (f"Типы данных уменьшены у {len(report['columns'])} столбцов: "
+            f"{before:.1f} МБ → {after:.1f} МБ (в {ratio:.1f} раза меньше)")
 
 
 def select_columns(df):
     """Позволяет пользователю выбрать столбцы для анализа."""
     # Выбор столбца с датой
+    # Столбцы уже имеют тип даты, поэтому таблица не изменяется: она общая
+    # для всех сессий (cached_load_data)
     date_columns = df.select_dtypes(include=['datetime64']).columns.tolist()
     date_column = None
     if date_columns:
         date_column = st.selectbox("Выберите столбец с датой для оси X", date_columns)
-        df[date_column] = pd.to_datetime(df[date_column])
     else:
         st.warning("В датасете не обнаружены столбцы с датами. Будет использован индекс.")
     
@@ -89,7 +241,7 @@ def select_columns(df):
     return date_column, selected_column
 
 
-def select_categories(df):
+def select_categories(df, data_key):
     """Позволяет пользователю выбрать категории для группировки."""
     categorical_columns = df.select_dtypes(include=['object', 'category']).columns.tolist()
     group_columns = st.multiselect(
@@ -100,7 +252,7 @@ def select_categories(df):
     selected_categories = {}
     if group_columns:
         for col in group_columns:
-            unique_values = df[col].unique()
+            unique_values = cached_unique_values(data_key, df, col)
             selected_values = st.multiselect(
                 f"Выберите значения для {col}", 
                 unique_values, 
@@ -119,9 +271,25 @@ def filter_data(df, group_columns, selected_categories):
     return df
 
 
-def display_statistics(filtered_df, selected_column):
+def display_statistics(filtered_df, selected_column, data_key, group_columns=None, date_column=None):
     """Отображает статистику и позволяет настроить пороги."""
-    iqr, q1, q3 = calculate_stats(filtered_df, selected_column)
+    modes = ['global']
+    if group_columns:
+        modes.append('groups')
+    if date_column:
+        modes.extend(['rolling', 'seasonal'])
+    mode = 'global'
+    if len(modes) > 1:
+        mode = st.radio("Расчет порогов", modes, format_func=THRESHOLD_MODES.get, horizontal=True)
+
+    if mode == 'groups':
+        return display_group_statistics(filtered_df, selected_column, data_key, group_columns)
+    if mode == 'rolling':
+        return display_rolling_statistics(filtered_df, selected_column, data_key, date_column, group_columns)
+    if mode == 'seasonal':
+        return display_seasonal_statistics(filtered_df, selected_column, data_key, date_column, group_columns)
+
+    iqr, q1, q3 = cached_stats(data_key, filtered_df, selected_column)
     
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -136,72 +304,132 @@ def display_statistics(filtered_df, selected_column):
     return lower_threshold, upper_threshold
 
 
+def display_group_statistics(filtered_df, selected_column, data_key, group_columns):
+    """Отображает статистику по группам и рассчитывает пороги каждой группы."""
+    stats = cached_group_stats(data_key, filtered_df, selected_column, group_columns)
+    multiplier = st.number_input("Множитель IQR", value=1.5, min_value=0.0, step=0.1)
+
+    lower_threshold = stats['Q1'] - multiplier * stats['IQR']
+    upper_threshold = stats['Q3'] + multiplier * stats['IQR']
+
+    st.write("Статистика и пороги по группам:")
+    st.dataframe(stats.assign(**{
+        'Нижний порог': lower_threshold,
+        'Верхний порог': upper_threshold
+    }))
+
+    return lower_threshold, upper_threshold
+
+
+def display_rolling_statistics(filtered_df, selected_column, data_key, date_column, group_columns=None):
+    """Рассчитывает пороги каждой строки по квартилям скользящего окна времени."""
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        window = st.text_input("Окно", value="7D", help="Длина окна: 7D - 7 дней, 12h - 12 часов, 30min - 30 минут")
+    with col2:
+        multiplier = st.number_input("Множитель IQR", value=1.5, min_value=0.0, step=0.1)
+    with col3:
+        expanding = st.checkbox("Нарастающее окно (вся история до даты)")
+        by_group = bool(group_columns) and st.checkbox("Отдельно для каждой группы")
+
+    try:
+        stats = cached_rolling_stats(data_key, filtered_df, selected_column, date_column, window,
+                                     group_columns if by_group else None, expanding)
+    except ValueError as error:
+        st.error(f"Некорректная длина окна: {error}")
+        st.stop()
+
+    if stats['IQR'].notna().any():
+        st.write("Медианный IQR по окнам:", round(float(stats['IQR'].median()), 4))
+    lower_threshold = (stats['Q1'] - multiplier * stats['IQR']).to_numpy()
+    upper_threshold = (stats['Q3'] + multiplier * stats['IQR']).to_numpy()
+    return lower_threshold, upper_threshold
+
+
+def display_seasonal_statistics(filtered_df, selected_column, data_key, date_column, group_columns=None):
+    """Рассчитывает пороги каждого календарного интервала (час, день недели, месяц)."""
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        bucket = st.selectbox("Календарный интервал", list(SEASONAL_BUCKETS), format_func=SEASONAL_BUCKETS.get,
+                              index=list(SEASONAL_BUCKETS).index('hour_of_week'))
+    with col2:
+        multiplier = st.number_input("Множитель IQR", value=1.5, min_value=0.0, step=0.1)
+    with col3:
+        by_group = bool(group_columns) and st.checkbox("Отдельно для каждой группы")
+
+    seasonal_groups = group_columns if by_group else None
+    stats = cached_seasonal_stats(data_key, filtered_df, selected_column, date_column, bucket, seasonal_groups)
+    lower_threshold, upper_threshold = seasonal_thresholds(
+        filtered_df, stats, date_column, bucket, seasonal_groups, multiplier
+    )
+
+    st.write("Статистика и пороги по интервалам:")
+    st.dataframe(stats.assign(**{
+        'Нижний порог': stats['Q1'] - multiplier * stats['IQR'],
+        'Верхний порог': stats['Q3'] + multiplier * stats['IQR']
+    }))
+    return lower_threshold, upper_threshold
+
+
 def create_visualization(filtered_df, anomalies, selected_column, date_column, 
-                         group_columns, lower_threshold, upper_threshold):
-    """Создает визуализацию данных с аномалиями."""
+                         group_columns, lower_threshold, upper_threshold,
+                         max_points=None, downsample_method='minmax'):
+    """
+    Создает визуализацию данных с аномалиями.
+
+    Если задан max_points, график строится через WebGL (Scattergl), а фоновые
+    данные и полосы порогов прореживаются до max_points точек на весь
+    график (бюджет рядов и полос распределяет trace_budgets); аномалии
+    выводятся все. Без max_points выводятся все точки в SVG. При группировке
+    отдельными наборами точек выводятся не больше DEFAULT_MAX_GROUPS групп.
+
+    Числовые пороги выводятся горизонтальными линиями, пороги строк
+    (массивы, например из скользящего окна) и пороги групп (Series по
+    ключам групп) - полосой между границами.
+    """
     fig = go.Figure()
+    # Пороги групп сопоставляются строкам и выводятся как пороги строк
+    if group_columns and isinstance(lower_threshold, pd.Series):
+        lower_threshold = broadcast_group_values(filtered_df, group_columns, lower_threshold)
+    if group_columns and isinstance(upper_threshold, pd.Series):
+        upper_threshold = broadcast_group_values(filtered_df, group_columns, upper_threshold)
+    row_thresholds = isinstance(lower_threshold, np.ndarray)
 
     if group_columns:
-        for name, group in filtered_df.groupby(group_columns):
-            # Фильтруем аномалии для текущей группы
-            group_mask = anomalies[group_columns].apply(tuple, axis=1).isin(
-                group[group_columns].apply(tuple, axis=1)
-            )
-            group_anomalies = anomalies[group_mask]
-            
-            # Добавляем данные группы
-            x_values = group[date_column] if date_column else group.index
-            fig.add_trace(go.Scatter(
-                x=x_values, 
-                y=group[selected_column], 
-                mode='markers', 
-                name=f'Данные: {name}', 
-                opacity=0.5
-            ))
-            
-            # Добавляем аномалии группы
-            x_anomalies = group_anomalies[date_column] if date_column else group_anomalies.index
-            fig.add_trace(go.Scatter(
-                x=x_anomalies,
-                y=group_anomalies[selected_column], 
-                mode='markers',
-                name=f'Аномалии: {name}', 
-                marker=dict(color='red', size=10)
-            ))
+        # Данные и аномалии раскладываются по группам за один проход; мелкие
+        # группы сверх DEFAULT_MAX_GROUPS выводятся одним набором точек, без
+        # полосы порогов (пороги в ней скачут между группами)
+        groups = limit_groups(split_by_group(filtered_df, anomalies, group_columns))
+        budgets = trace_budgets([len(positions) for _, positions, _ in groups], max_points,
+                                [row_thresholds and name is not None for name, _, _ in groups])
+        for (name, positions, anomaly_positions), budget in zip(groups, budgets):
+            thresholds = None
+            if row_thresholds and name is not None:
+                thresholds = (lower_threshold[positions], upper_threshold[positions])
+            add_series(fig, filtered_df.iloc[positions], anomalies.iloc[anomaly_positions],
+                       selected_column, date_column, thresholds,
+                       f": {'остальные группы' if name is None else name}", budget, downsample_method)
     else:
-        # Добавляем все данные
-        x_values = filtered_df[date_column] if date_column else filtered_df.index
-        fig.add_trace(go.Scatter(
-            x=x_values, 
-            y=filtered_df[selected_column], 
-            mode='markers', 
-            name='Данные', 
-            opacity=0.5
-        ))
-        
-        # Добавляем аномалии
-        x_anomalies = anomalies[date_column] if date_column else anomalies.index
-        fig.add_trace(go.Scatter(
-            x=x_anomalies,
-            y=anomalies[selected_column], 
-            mode='markers',
-            name='Аномалии', 
-            marker=dict(color='red', size=10)
-        ))
-
-    # Добавляем пороговые линии
-    fig.add_hline(
-        y=lower_threshold, 
-        line_dash="dash", 
-        line_color="red", 
-        annotation_text="Нижний порог"
-    )
-    fig.add_hline(
-        y=upper_threshold, 
-        line_dash="dash", 
-        line_color="red", 
-        annotation_text="Верхний порог"
-    )
+        budget, = trace_budgets([len(filtered_df)], max_points, [row_thresholds])
+        thresholds = (lower_threshold, upper_threshold) if row_thresholds else None
+        add_series(fig, filtered_df, anomalies, selected_column, date_column, thresholds, '',
+                   budget, downsample_method)
+
+    # Добавляем пороговые линии (для порогов по группам и строкам общих линий нет)
+    if np.ndim(lower_threshold) == 0:
+        fig.add_hline(
+            y=lower_threshold, 
+            line_dash="dash", 
+            line_color="red", 
+            annotation_text="Нижний порог"
+        )
+    if np.ndim(upper_threshold) == 0:
+        fig.add_hline(
+            y=upper_threshold, 
+            line_dash="dash", 
+            line_color="red", 
+            annotation_text="Верхний порог"
+        )
 
     # Настройка макета
     fig.update_layout(
@@ -214,22 +442,102 @@ def create_visualization(filtered_df, anomalies, selected_column, date_column,
     return fig
 
 
+def add_series(fig, data, anomalies, selected_column, date_column, thresholds, label, budget,
+               downsample_method='minmax'):
+    """
+    Добавляет ряд графика: полосу порогов строк, фоновые данные и аномалии.
+
+    Args:
+        thresholds: Пороги строк ряда (нижние, верхние) или None
+        label: Окончание названий наборов точек (например, ': группа')
+        budget: (бюджет данных, точек полосы) из trace_budgets; None -
+            все точки в SVG, иначе точки прореживаются и выводятся через WebGL
+    """
+    data_budget, band_points = budget
+    x_values = data[date_column] if date_column else data.index
+    if thresholds is not None:
+        add_threshold_band(fig, x_values, *thresholds, f'Пороги{label}', band_points)
+    if data_budget != 0:
+        add_data_trace(fig, x_values, data[selected_column], f'Данные{label}', data_budget, downsample_method)
+
+    scatter = go.Scatter if data_budget is None else go.Scattergl
+    fig.add_trace(scatter(
+        x=anomalies[date_column] if date_column else anomalies.index,
+        y=anomalies[selected_column],
+        mode='markers',
+        name=f'Аномалии{label}',
+        marker=dict(color='red', size=10)
+    ))
+
+
+def add_data_trace(fig, x_values, y_values, name, max_points=None, downsample_method='minmax'):
+    """Добавляет фоновые данные; при заданном бюджете точек - прореженные, через WebGL."""
+    if not max_points:
+        fig.add_trace(go.Scatter(x=x_values, y=y_values, mode='markers', name=name, opacity=0.5))
+        return
+
+    positions = downsample_positions(x_values, y_values, max_points, downsample_method)
+    fig.add_trace(go.Scattergl(
+        x=pd.Series(x_values).iloc[positions],
+        y=pd.Series(y_values).iloc[positions],
+        mode='markers',
+        name=name,
+        opacity=0.5
+    ))
+
+
+def add_threshold_band(fig, x_values, lower_threshold, upper_threshold, name, max_points=None):
+    """Добавляет полосу между нижним и верхним порогами строк; при заданном бюджете точек - через WebGL."""
+    positions = band_positions(x_values, lower_threshold, upper_threshold, max_points)
+    if positions.size == 0:
+        return
+    scatter = go.Scatter if max_points is None else go.Scattergl
+    x_band = pd.Series(x_values).iloc[positions]
+    fig.add_trace(scatter(
+        x=x_band,
+        y=upper_threshold[positions],
+        mode='lines',
+        line=dict(color='red', width=1, dash='dash'),
+        legendgroup=name,
+        showlegend=False,
+        hoverinfo='skip'
+    ))
+    fig.add_trace(scatter(
+        x=x_band,
+        y=lower_threshold[positions],
+        mode='lines',
+        line=dict(color='red', width=1, dash='dash'),
+        fill='tonexty',
+        fillcolor='rgba(255, 0, 0, 0.08)',
+        legendgroup=name,
+        name=name,
+        hoverinfo='skip'
+    ))
+
+
 def process_anomalies(filtered_df, selected_column, lower_threshold, upper_threshold, 
-                      group_columns, selected_categories, date_column):
+                      group_columns, selected_categories, date_column, data_key,
+                      excel_engine='openpyxl', max_points=None, downsample_method='minmax'):
     """Обрабатывает и визуализирует аномалии."""
-    anomalies = detect_anomalies(
-        filtered_df, selected_column, lower_threshold, upper_threshold, 
-        group_columns, selected_categories
-    )
+    with span('detect_anomalies', rows=len(filtered_df), column=str(selected_column)) as current:
+        anomalies = cached_detect_anomalies(
+            data_key, filtered_df, selected_column, lower_threshold, upper_threshold, 
+            group_columns, selected_categories
+        )
+        current.set(anomalies=len(anomalies))
 
     st.write(f"Обнаружено {len(anomalies)} аномалий")
 
     # Создание визуализации
-    fig = create_visualization(
-        filtered_df, anomalies, selected_column, date_column, 
-        group_columns, lower_threshold, upper_threshold
-    )
-    st.plotly_chart(fig, use_container_width=True)
+    with span('create_visualization', rows=len(filtered_df), max_points=max_points):
+        fig = cached_visualization(
+            data_key, filtered_df, anomalies, selected_column, date_column, 
+            group_columns, lower_threshold, upper_threshold, selected_categories,
+            max_points, downsample_method
+        )
+    # Отправка графика в браузер (сериализация фигуры в JSON)
+    with span('render_chart', rows=len(filtered_df)):
+        st.plotly_chart(fig, use_container_width=True)
 
     # Отображение таблицы с аномалиями
     st.write("Аномальные значения:")
@@ -237,10 +545,11 @@ def process_anomalies(filtered_df, selected_column, lower_threshold, upper_thres
 
     # Кнопка скачивания
     if not anomalies.empty:
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            anomalies.to_excel(writer, index=False, sheet_name='Аномалии')
-        excel_data = output.getvalue()
+        threshold_rule = None
+        if np.ndim(lower_threshold) == 0 and np.ndim(upper_threshold) == 0:
+            threshold_rule = (selected_column, lower_threshold, upper_threshold)
+        with span('export', rows=len(anomalies), engine=excel_engine):
+            excel_data = export_frame(anomalies, 'Аномалии', excel_engine, threshold_rule)
         st.download_button(
             label="Скачать аномалии в Excel",
             data=excel_data,
@@ -249,39 +558,45 @@ def process_anomalies(filtered_df, selected_column, lower_threshold, upper_thres
         )
 
 
-def process_all_columns(uploaded_file):
-    """Обрабатывает все столбцы файла и находит аномалии."""
-    # Сохранение загруженного файла
-    with open("uploaded_file.xlsx", "wb") as f:
-        f.write(uploaded_file.getbuffer())
-
-    # Обработка файла
-    results = process_file("uploaded_file.xlsx")
-    st.write("Результаты обработки:")
-
-    all_anomalies = pd.DataFrame()
-
-    for result in results:
-        column = result['column']
-        anomalies = result['anomalies']
-        st.write(f"Столбец: {column}")
-        st.dataframe(anomalies)
-
-        if not anomalies.empty:
-            anomalies['Anomaly'] = anomalies[column].astype(str) + ' ' + column
-            if all_anomalies.empty:
-                all_anomalies = anomalies
-            else:
-                all_anomalies = pd.concat([all_anomalies, anomalies], axis=0)
+def select_sheets(uploaded_file, fingerprint):
+    """Позволяет выбрать листы Excel файла для обработки всех столбцов."""
+    sheet_names = cached_sheet_names(fingerprint, uploaded_file)
+    if len(sheet_names) <= 1:
+        return None
+    return st.multiselect(
+        "Листы для обработки всех столбцов",
+        sheet_names,
+        default=sheet_names
+    )
 
-    all_anomalies = all_anomalies.reset_index(drop=True)
 
-    # Отображение общей таблицы
-    st.write("Общая таблица аномалий:")
-    st.dataframe(all_anomalies)
+def process_all_columns(uploaded_file, df, excel_engine='openpyxl', sheets=None):
+    """
+    Обрабатывает все столбцы файла (или выбранных листов) и находит аномалии.
+
+    Файл не сохраняется на диск: без выбора листов анализируется уже
+    загруженная таблица df, выбранные листы читаются из байтов файла.
+    """
+    if sheets:
+        with span('process_file', sheets=len(sheets)):
+            results_by_sheet = process_file(uploaded_file.getvalue(), sheets=sheets,
+                                            workers=os.cpu_count() or 1, file_name=uploaded_file.name)
+        st.write("Результаты обработки:")
+        for sheet, results in results_by_sheet.items():
+            st.subheader(f"Лист: {sheet}")
+            display_column_results(results)
+        with span('export', engine=excel_engine):
+            excel_data = create_workbook_anomalies_excel(results_by_sheet, excel_engine)
+    else:
+        with span('process_file', rows=len(df)) as current:
+            results = process_file(df)
+            current.set(columns=len(results))
+        st.write("Результаты обработки:")
+        display_column_results(results)
+        with span('export', engine=excel_engine):
+            excel_data = create_anomalies_excel(results, excel_engine)
 
     # Кнопка скачивания
-    excel_data = create_anomalies_excel(results)
     st.download_button(
         label="Скачать все аномалии в Excel",
         data=excel_data,
@@ -290,12 +605,161 @@ def process_all_columns(uploaded_file):
     )
 
 
+def display_column_results(results):
+    """Отображает аномалии каждого столбца и общую таблицу аномалий."""
+    for result in results:
+        st.write(f"Столбец: {result['column']}")
+        st.dataframe(result['anomalies'])
+
+    # Общая таблица собирается без изменения результатов столбцов
+    all_anomalies, _ = combine_anomalies(results)
+
+    # Отображение общей таблицы
+    st.write("Общая таблица аномалий:")
+    st.dataframe(all_anomalies)
+
+
+def submit_job(uploaded_file, excel_engine='openpyxl', sheets=None):
+    """Ставит обработку всех столбцов файла в очередь фоновых заданий."""
+    job_id = cached_job_queue().submit(uploaded_file.getvalue(), uploaded_file.name, sheets, excel_engine)
+    st.session_state.setdefault('jobs', []).append(job_id)
+
+
+def display_jobs():
+    """Отображает фоновые задания сессии: выполняемые обновляются, готовые можно скачать."""
+    queue = cached_job_queue()
+    statuses = [(job_id, queue.status(job_id)) for job_id in st.session_state.get('jobs', [])]
+    # Задания, удаленные по сроку хранения, убираются из списка
+    statuses = [(job_id, status) for job_id, status in statuses if status is not None]
+    st.session_state['jobs'] = [job_id for job_id, _ in statuses]
+    if not statuses:
+        return
+
+    st.subheader("Фоновые задания")
+    for job_id, status in statuses:
+        if status['state'] in FINAL_STATES:
+            display_finished_job(queue, job_id, status)
+    active = [job_id for job_id, status in statuses if status['state'] not in FINAL_STATES]
+    if active:
+        display_active_jobs(active)
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def display_active_jobs(job_ids):
+    """Показывает прогресс выполняемых заданий; перезапускается по таймеру отдельно от страницы."""
+    queue = cached_job_queue()
+    for job_id in job_ids:
+        status = queue.status(job_id)
+        if status is None or status['state'] in FINAL_STATES:
+            # Задание завершено: страница перестраивается, чтобы показать результат
+            st.rerun()
+        st.progress(status['progress'], text=f"{status['file_name']}: {status['message']}")
+        if st.button("Отменить", key=f"cancel_{job_id}"):
+            queue.cancel(job_id)
+
+
+def display_finished_job(queue, job_id, status):
+    """Отображает итог завершенного задания и кнопку скачивания результата."""
+    col1, col2 = st.columns([4, 1])
+    with col1:
+        if status['state'] == 'done':
+            st.write(f"{status['file_name']}: обнаружено {status['anomalies']} аномалий")
+            st.download_button(
+                label="Скачать все аномалии в Excel",
+                data=queue.result_path(job_id).read_bytes(),
+                file_name=f"{os.path.splitext(status['file_name'])[0]}_anomalies.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                key=f"download_{job_id}"
+            )
+        elif status['state'] == 'failed':
+            st.error(f"{status['file_name']}: {status['error']}")
+        else:
+            st.warning(f"{status['file_name']}: обработка отменена")
+    with col2:
+        if st.button("Удалить", key=f"delete_{job_id}"):
+            queue.delete(job_id)
+            st.session_state['jobs'].remove(job_id)
+            st.rerun()
+
+
+def display_debug_panel(records):
+    """Отображает в боковой панели время и память этапов текущего запуска."""
+    with st.sidebar.expander("⏱️ Время этапов", expanded=True):
+        if not records:
+            st.caption("В этом запуске этапы не выполнялись")
+            return
+        table = pd.DataFrame(records).drop(columns=['event', 'timestamp'])
+        # Байты переводятся в мегабайты
+        for column in [name for name in table.columns if name.endswith('_bytes')]:
+            table[column[:-len('_bytes')] + '_mb'] = (table.pop(column) / 2 ** 20).round(2)
+        st.dataframe(table, hide_index=True)
+        st.download_button(
+            label="Скачать журнал (JSON)",
+            data='\n'.join(json.dumps(record, ensure_ascii=False, default=str) for record in records),
+            file_name="stages.jsonl",
+            mime="application/x-ndjson"
+        )
+
+
 # Основная логика приложения
-uploaded_file = st.file_uploader("Загрузите файл Excel", type=["xlsx", "xls"])
+excel_engine = st.sidebar.selectbox(
+    "Движок экспорта Excel",
+    EXCEL_ENGINES,
+    help="xlsxwriter записывает файл потоково с постоянным расходом памяти"
+)
+max_points = st.sidebar.number_input(
+    "Максимум точек на графике",
+    min_value=0,
+    value=DEFAULT_MAX_POINTS,
+    step=5000,
+    help="Фоновые данные прореживаются до этого количества точек и выводятся "
+         "через WebGL; аномалии выводятся все. 0 - все точки без прореживания"
+)
+downsample_method = st.sidebar.selectbox(
+    "Метод прореживания графика",
+    DOWNSAMPLE_METHODS,
+    help="minmax - минимум и максимум на каждом интервале оси X, "
+         "lttb - сохранение формы ряда (Largest-Triangle-Three-Buckets)"
+)
+debug_panel = st.sidebar.checkbox(
+    "Панель отладки",
+    help="Время, количество строк и память каждого этапа обработки"
+)
+if debug_panel:
+    memory_mode = st.sidebar.selectbox(
+        "Измерение памяти",
+        MEMORY_MODES,
+        help="rss - память процесса (без замедления), "
+             "tracemalloc - пик выделенной памяти этапа (замедляет обработку)"
+    )
+    start_recording(memory_mode)
+else:
+    # Сбор мог остаться включенным после прерванного запуска (st.stop)
+    stop_recording()
+optimize_types = st.sidebar.checkbox(
+    "Оптимизировать типы данных",
+    help="Текстовые столбцы с повторяющимися значениями хранятся как category, "
+         "целые числа - в наименьшем подходящем типе: таблица занимает меньше "
+         "памяти, группировка и фильтрация работают быстрее"
+)
+uploaded_file = st.file_uploader(
+    "Загрузите файл Excel, CSV, Parquet или Feather",
+    type=list(FORMAT_EXTENSIONS)
+)
 
 if uploaded_file is not None:
-    # Загрузка данных
-    df = load_data(uploaded_file)
+    # Загрузка данных (повторные запуски скрипта используют кеш)
+    fingerprint = data_fingerprint(uploaded_file)
+    with span('load_data', file_size=uploaded_file.size) as current:
+        df = cached_load_data(fingerprint, uploaded_file)
+        current.set(rows=len(df), columns=len(df.columns))
+    frame_key = fingerprint
+    if optimize_types:
+        with span('optimize_dtypes', rows=len(df)):
+            df, dtype_report = cached_optimize_dtypes(fingerprint, df)
+        st.caption(display_dtype_report(dtype_report))
+        # Таблица с уменьшенными типами кешируется отдельно от исходной
+        frame_key = f"{fingerprint}:optimized"
     st.write("Предварительный просмотр данных:")
     st.dataframe(df.head())
 
@@ -303,24 +767,47 @@ if uploaded_file is not None:
     date_column, selected_column = select_columns(df)
     
     # Выбор категорий
-    group_columns, selected_categories = select_categories(df)
+    group_columns, selected_categories = select_categories(df, frame_key)
     
     # Фильтрация данных
-    filtered_df = filter_data(df, group_columns, selected_categories)
+    data_key = make_data_key(frame_key, group_columns, selected_categories)
+    with span('filter_data', rows=len(df)) as current:
+        filtered_df = cached_filter_data(data_key, df, group_columns, selected_categories)
+        current.set(selected_rows=len(filtered_df))
     
     # Отображение статистики и настройка порогов
-    lower_threshold, upper_threshold = display_statistics(filtered_df, selected_column)
+    with span('calculate_stats', rows=len(filtered_df), column=str(selected_column)):
+        lower_threshold, upper_threshold = display_statistics(
+            filtered_df, selected_column, data_key, group_columns, date_column
+        )
 
     # Кнопка обнаружения аномалий
     if st.button("Обнаружить аномалии"):
         process_anomalies(
             filtered_df, selected_column, lower_threshold, upper_threshold,
-            group_columns, selected_categories, date_column
+            group_columns, selected_categories, date_column, data_key,
+            excel_engine, max_points, downsample_method
         )
 
     # Кнопка обработки всех столбцов
+    sheets = select_sheets(uploaded_file, fingerprint)
+    background = st.checkbox(
+        "Обрабатывать в фоне",
+        value=True,
+        help="Обработка выполняется отдельным процессом: страница остается доступной, "
+             "результат можно скачать, когда он будет готов"
+    )
     if st.button("Обработать файл и найти аномалии по каждому столбцу"):
-        process_all_columns(uploaded_file)
+        if background:
+            submit_job(uploaded_file, excel_engine, sheets)
+        else:
+            process_all_columns(uploaded_file, df, excel_engine, sheets)
+
+# Фоновые задания сессии (остаются доступны и после смены файла)
+display_jobs()
+
+if debug_panel:
+    display_debug_panel(stop_recording())
 
 # Отображение инструкций и документации
 set_instructions()
@@ -0,0 +1,174 @@
+"""
+Модуль хранения базовых статистик для инкрементальной обработки.
+
+Базовая статистика набора данных - скетчи квантилей KLL каждого числового
+столбца (и каждой группы, если задана группировка) и отметка о том, какие
+строки уже обработаны: количество строк или последняя дата. При
+повторной загрузке дополненного файла новые строки классифицируются по
+сохраненным скетчам, а скетчи дополняются только новыми значениями.
+
+Статистики хранятся в двоичных файлах npz, по одному на набор данных:
+значения всех скетчей - в нескольких плоских массивах (pack_sketches),
+параметры и ключи групп - в JSON строке. Каталог
+задается переменной окружения ANOMALIZER_BASELINE_DIR (по умолчанию
+.anomalizer_baselines).
+"""
+
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from quantile_sketch import DEFAULT_K, KLLSketch, pack_sketches, unpack_sketches
+
+BASELINE_DIR_ENV = 'ANOMALIZER_BASELINE_DIR'
+DEFAULT_BASELINE_DIR = '.anomalizer_baselines'
+
+_SUFFIX = '.npz'
+_FORMAT_VERSION = 2
+
+
+def group_token(key) -> str:
+    """
+    Преобразует ключ группы в строку для хранения.
+
+    Args:
+        key: Значение или кортеж значений столбцов группировки
+
+    Returns:
+        Строковое представление ключа
+    """
+    if not isinstance(key, tuple):
+        key = (key,)
+    return json.dumps([str(value) for value in key], ensure_ascii=False)
+
+
+class Baseline:
+    """
+    Базовая статистика набора данных.
+
+    Args:
+        sketch_k: Параметр точности скетчей
+        date_column: Столбец с датой для отметки обработанных строк; без
+            него отметкой служит количество строк
+        group_columns: Столбцы группировки для статистики по группам
+    """
+
+    def __init__(self, sketch_k: int = DEFAULT_K,
+                 date_column: Optional[str] = None,
+                 group_columns: Optional[List[str]] = None):
+        self.sketch_k = sketch_k
+        self.date_column = date_column
+        self.group_columns = list(group_columns or [])
+        # Отметка обработанных строк
+        self.rows = 0
+        self.last_date: Optional[pd.Timestamp] = None
+        # {столбец: скетч} и {столбец: {ключ группы: скетч}}
+        self.column_sketches: Dict[str, KLLSketch] = {}
+        self.group_sketches: Dict[str, Dict[str, KLLSketch]] = {}
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Сериализует статистику в массивы numpy (для файла npz)."""
+        meta = {
+            'version': _FORMAT_VERSION,
+            'sketch_k': self.sketch_k,
+            'date_column': self.date_column,
+            'group_columns': self.group_columns,
+            'rows': self.rows,
+            'last_date': None if self.last_date is None else self.last_date.isoformat(),
+            'columns': list(self.column_sketches),
+            'groups': {column: list(sketches) for column, sketches in self.group_sketches.items()},
+        }
+        sketches = list(self.column_sketches.values())
+        for group_sketches in self.group_sketches.values():
+            sketches.extend(group_sketches.values())
+        arrays = {f'sketch_{name}': values for name, values in pack_sketches(sketches).items()}
+        # JSON хранится байтами UTF-8 (строковый массив numpy занимает 4 байта на символ)
+        arrays['meta'] = np.frombuffer(json.dumps(meta, ensure_ascii=False).encode('utf-8'), dtype=np.uint8)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'Baseline':
+        """Восстанавливает статистику из массивов, полученных методом to_arrays."""
+        meta = json.loads(arrays['meta'].tobytes().decode('utf-8'))
+        if meta.get('version') != _FORMAT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия базовой статистики: {meta.get('version')}")
+        baseline = cls(meta['sketch_k'], meta['date_column'], meta['group_columns'])
+        baseline.rows = meta['rows']
+        baseline.last_date = None if meta['last_date'] is None else pd.Timestamp(meta['last_date'])
+
+        prefix = 'sketch_'
+        sketches = iter(unpack_sketches({name[len(prefix):]: values for name, values in arrays.items()
+                                         if name.startswith(prefix)}))
+        baseline.column_sketches = {column: next(sketches) for column in meta['columns']}
+        baseline.group_sketches = {
+            column: {token: next(sketches) for token in tokens} for column, tokens in meta['groups'].items()
+        }
+        return baseline
+
+
+class BaselineStore:
+    """
+    Хранилище базовых статистик в каталоге на диске.
+
+    Args:
+        store_dir: Каталог хранилища (по умолчанию из ANOMALIZER_BASELINE_DIR)
+    """
+
+    def __init__(self, store_dir: Optional[str] = None):
+        if store_dir is None:
+            store_dir = os.environ.get(BASELINE_DIR_ENV, DEFAULT_BASELINE_DIR)
+        self.store_dir = Path(store_dir)
+
+    def load(self, name: str) -> Optional[Baseline]:
+        """
+        Читает базовую статистику набора данных.
+
+        Args:
+            name: Название набора данных (например, имя файла)
+
+        Returns:
+            Baseline или None, если статистика еще не сохранялась
+        """
+        try:
+            with np.load(self._path(name), allow_pickle=False) as data:
+                return Baseline.from_arrays({key: data[key] for key in data.files})
+        except FileNotFoundError:
+            return None
+
+    def save(self, name: str, baseline: Baseline) -> None:
+        """
+        Сохраняет базовую статистику (запись атомарна: файл заменяется целиком).
+
+        Args:
+            name: Название набора данных
+            baseline: Базовая статистика
+        """
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(name)
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(temp_path, 'wb') as f:
+            np.savez(f, **baseline.to_arrays())
+        os.replace(temp_path, path)
+
+    def delete(self, name: str) -> bool:
+        """
+        Удаляет базовую статистику, чтобы следующий запуск начал с нуля.
+
+        Returns:
+            True, если статистика была удалена
+        """
+        try:
+            self._path(name).unlink()
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _path(self, name: str) -> Path:
+        """Путь к файлу статистики (недопустимые в именах файлов символы заменяются)."""
+        safe_name = re.sub(r'[^\w.-]', '_', name)
+        return self.store_dir / f"{safe_name}{_SUFFIX}"
@@ -0,0 +1,314 @@
+"""
+Пакетная обработка файлов из командной строки.
+
+Находит аномалии в каждом столбце каждого файла без запуска веб-интерфейса:
+файлы обрабатываются параллельно пулом процессов ограниченного размера,
+аномалии каждого файла сохраняются в xlsx, csv или parquet, а итоговая
+сводка с временем обработки и количеством аномалий выводится в JSON.
+
+Модуль не импортирует streamlit и plotly, поэтому запускается быстро.
+
+Пример:
+    python batch_runner.py data/*.xlsx reports/ -o anomalies -f parquet -j 8 \\
+        --summary summary.json
+"""
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+from anomaly_processor import (
+    combine_anomalies, process_file_streaming, process_frame, process_incremental, write_anomalies_excel
+)
+from baseline_store import BaselineStore
+from data_loader import FORMAT_EXTENSIONS, read_table
+from excel_export import EXCEL_ENGINES
+
+OUTPUT_FORMATS = ('xlsx', 'csv', 'parquet')
+
+# Методы потоковой обработки Excel файлов (см. process_file_streaming)
+STREAMING_METHODS = ('exact', 'sketch')
+
+
+def collect_files(inputs: Sequence[str]) -> List[Path]:
+    """
+    Составляет список файлов для обработки.
+
+    Args:
+        inputs: Пути к файлам, шаблоны glob (поддерживается **) или
+            каталоги; в каталогах рекурсивно выбираются файлы
+            поддерживаемых форматов
+
+    Returns:
+        Отсортированный список файлов без повторов
+    """
+    files = set()
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            files.update(candidate for candidate in path.rglob('*')
+                         if candidate.is_file() and _is_supported(candidate))
+        elif path.is_file():
+            files.add(path)
+        else:
+            matches = [Path(match) for match in glob.glob(item, recursive=True)]
+            if not matches:
+                raise FileNotFoundError(f"Файлы не найдены: {item}")
+            files.update(match for match in matches if match.is_file())
+    return sorted(files)
+
+
+def output_paths(files: Sequence[Path], output_dir: Path, output_format: str) -> List[Path]:
+    """Формирует имена выходных файлов; одинаковые имена получают номер."""
+    used = set()
+    paths = []
+    for path in files:
+        name = f"{path.stem}_anomalies"
+        candidate, number = name, 1
+        while candidate in used:
+            number += 1
+            candidate = f"{name}_{number}"
+        used.add(candidate)
+        paths.append(output_dir / f"{candidate}.{output_format}")
+    return paths
+
+
+def run_file(file_path: str, output_path: str, output_format: str = 'xlsx',
+             batch: bool = True, engine: str = 'xlsxwriter',
+             baseline_dir: Optional[str] = None,
+             date_column: Optional[str] = None,
+             group_columns: Optional[List[str]] = None,
+             streaming: Optional[str] = None) -> dict:
+    """
+    Обрабатывает один файл и сохраняет его аномалии.
+
+    Args:
+        file_path: Путь к входному файлу
+        output_path: Путь к выходному файлу
+        output_format: Формат выходного файла ('xlsx', 'csv' или 'parquet')
+        batch: Вычислять статистики всех столбцов за один проход
+        engine: Движок записи xlsx
+        baseline_dir: Каталог базовых статистик; если задан, анализируются
+            только строки, добавленные после прошлого запуска (статистика
+            набора хранится под именем файла, см. process_incremental)
+        date_column: Столбец с датой для отметки обработанных строк
+        group_columns: Столбцы группировки для порогов по группам
+        streaming: Метод потоковой обработки xlsx файлов ('exact' или
+            'sketch', см. process_file_streaming): лист читается частями и
+            не загружается в память целиком; файлы других форматов
+            читаются целиком
+
+    Returns:
+        Запись сводки: статус, размеры таблицы (при потоковой обработке
+        не известны), количество аномалий по столбцам и время этапов в
+        секундах; при ошибке - ее текст
+    """
+    summary = {'file': file_path, 'output': None, 'status': 'ok'}
+    started = time.perf_counter()
+    try:
+        if streaming and baseline_dir is None and Path(file_path).suffix.lower() == '.xlsx':
+            # Лист читается частями: чтение и поиск выполняются вместе
+            df = None
+            loaded = started
+            results = process_file_streaming(file_path, method=streaming)
+        else:
+            df = read_table(file_path)
+            loaded = time.perf_counter()
+            if baseline_dir is None:
+                results = process_frame(df, batch=batch)
+            else:
+                results = process_incremental(df, Path(file_path).name, BaselineStore(baseline_dir),
+                                              date_column, group_columns)
+        processed = time.perf_counter()
+        save_anomalies(results, output_path, output_format, engine)
+        saved = time.perf_counter()
+    except Exception as error:
+        summary.update(status='error', error=f"{type(error).__name__}: {error}",
+                       seconds={'total': round(time.perf_counter() - started, 4)})
+        return summary
+
+    counts = {str(result.column): result.count for result in results}
+    summary.update(
+        output=output_path,
+        rows=None if df is None else len(df),
+        columns=None if df is None else len(df.columns),
+        anomalies=sum(counts.values()),
+        anomalies_by_column=counts,
+        seconds={
+            'read': round(loaded - started, 4),
+            'detect': round(processed - loaded, 4),
+            'write': round(saved - processed, 4),
+            'total': round(saved - started, 4),
+        },
+    )
+    return summary
+
+
+def save_anomalies(results: list, output_path: str, output_format: str,
+                   engine: str = 'xlsxwriter') -> None:
+    """
+    Сохраняет аномалии всех столбцов в файл.
+
+    xlsx повторяет выгрузку веб-интерфейса (с выделением аномальных ячеек),
+    csv и parquet содержат общую таблицу аномалий со столбцом Anomaly.
+    """
+    if output_format == 'xlsx':
+        # Файл записывается прямо на диск (xlsxwriter - потоково, без копии в памяти)
+        write_anomalies_excel(results, output_path, engine)
+        return
+
+    all_anomalies, _ = combine_anomalies(results)
+    if output_format == 'csv':
+        all_anomalies.to_csv(output_path, index=False)
+    elif output_format == 'parquet':
+        # В parquet названия столбцов должны быть строками
+        all_anomalies.columns = [str(column) for column in all_anomalies.columns]
+        all_anomalies.to_parquet(output_path, index=False)
+    else:
+        raise ValueError(f"Неизвестный формат: {output_format}. Доступны: {', '.join(OUTPUT_FORMATS)}")
+
+
+def run_batch(files: Sequence[Path], output_dir: Path, output_format: str = 'xlsx',
+              jobs: int = 1, batch: bool = True, engine: str = 'xlsxwriter',
+              progress=None, **incremental) -> dict:
+    """
+    Обрабатывает файлы пулом из jobs процессов.
+
+    Args:
+        files: Входные файлы
+        output_dir: Каталог для выходных файлов (создается при необходимости)
+        output_format: Формат выходных файлов
+        jobs: Количество процессов (1 - обработка в текущем процессе)
+        batch: Вычислять статистики всех столбцов за один проход
+        engine: Движок записи xlsx
+        progress: Функция progress(done, total, summary), вызываемая после
+            каждого файла
+        **incremental: Параметры run_file: инкрементальной обработки
+            (baseline_dir, date_column, group_columns) и потоковой
+            (streaming)
+
+    Returns:
+        Сводка: записи по файлам в порядке входного списка и итоги
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    tasks = [(str(path), str(output), output_format, batch, engine)
+             for path, output in zip(files, output_paths(files, output_dir, output_format))]
+
+    started = time.perf_counter()
+    summaries = [None] * len(tasks)
+    if jobs <= 1 or len(tasks) <= 1:
+        for position, task in enumerate(tasks):
+            summaries[position] = run_file(*task, **incremental)
+            if progress:
+                progress(position + 1, len(tasks), summaries[position])
+    else:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(jobs, len(tasks)), mp_context=context) as executor:
+            futures = {executor.submit(run_file, *task, **incremental): position
+                       for position, task in enumerate(tasks)}
+            for done, future in enumerate(as_completed(futures), start=1):
+                summaries[futures[future]] = future.result()
+                if progress:
+                    progress(done, len(tasks), summaries[futures[future]])
+
+    failed = sum(summary['status'] != 'ok' for summary in summaries)
+    return {
+        'files': summaries,
+        'total_files': len(summaries),
+        'failed_files': failed,
+        'total_anomalies': sum(summary.get('anomalies', 0) for summary in summaries),
+        'seconds': round(time.perf_counter() - started, 4),
+        'jobs': jobs,
+    }
+
+
+def print_progress(done: int, total: int, summary: dict) -> None:
+    """Выводит строку прогресса в stderr."""
+    if summary['status'] == 'ok':
+        details = f"{summary['anomalies']} аномалий за {summary['seconds']['total']:.2f} с"
+    else:
+        details = f"ошибка: {summary['error']}"
+    print(f"[{done}/{total}] {summary['file']}: {details}", file=sys.stderr, flush=True)
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(
+        description="Пакетный поиск аномалий в каждом столбце файлов методом IQR.")
+    parser.add_argument('inputs', nargs='+',
+                        help="файлы, шаблоны glob или каталоги")
+    parser.add_argument('-o', '--output-dir', default='anomalies',
+                        help="каталог для файлов с аномалиями (по умолчанию anomalies)")
+    parser.add_argument('-f', '--format', dest='output_format', choices=OUTPUT_FORMATS,
+                        default='xlsx', help="формат файлов с аномалиями")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help="количество процессов (по умолчанию - число ядер)")
+    parser.add_argument('--engine', choices=EXCEL_ENGINES, default='xlsxwriter',
+                        help="движок записи xlsx")
+    parser.add_argument('--baseline-dir',
+                        help="каталог базовых статистик: анализировать только строки, "
+                             "добавленные после прошлого запуска")
+    parser.add_argument('--date-column',
+                        help="столбец с датой для отметки обработанных строк (с --baseline-dir)")
+    parser.add_argument('--group-by', action='append', dest='group_columns',
+                        help="столбец группировки для порогов по группам (с --baseline-dir)")
+    parser.add_argument('--streaming', choices=STREAMING_METHODS,
+                        help="читать xlsx файлы частями: exact - точные квартили (8 байт на "
+                             "числовое значение), sketch - приближенные (память не зависит "
+                             "от числа строк)")
+    parser.add_argument('--summary',
+                        help="файл для JSON сводки (по умолчанию - stdout)")
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help="не выводить прогресс")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """
+    Точка входа командной строки.
+
+    Returns:
+        Код завершения: 0 - все файлы обработаны, 1 - были ошибки,
+        2 - не найдено ни одного файла
+    """
+    args = parse_args(argv)
+    if args.streaming and args.baseline_dir:
+        print("--streaming нельзя использовать вместе с --baseline-dir", file=sys.stderr)
+        return 2
+    try:
+        files = collect_files(args.inputs)
+    except FileNotFoundError as error:
+        print(error, file=sys.stderr)
+        return 2
+    if not files:
+        print("Не найдено ни одного файла для обработки", file=sys.stderr)
+        return 2
+
+    summary = run_batch(files, Path(args.output_dir), args.output_format,
+                        jobs=max(1, args.jobs), engine=args.engine,
+                        progress=None if args.quiet else print_progress,
+                        baseline_dir=args.baseline_dir, date_column=args.date_column,
+                        group_columns=args.group_columns, streaming=args.streaming)
+
+    report = json.dumps(summary, ensure_ascii=False, indent=2)
+    if args.summary:
+        Path(args.summary).write_text(report, encoding='utf-8')
+    else:
+        print(report)
+    return 1 if summary['failed_files'] else 0
+
+
+def _is_supported(path: Path) -> bool:
+    """Проверяет, что расширение файла относится к поддерживаемым форматам."""
+    return path.suffix.lower().lstrip('.') in FORMAT_EXTENSIONS
+
+
+if __name__ == '__main__':
+    sys.exit(main())
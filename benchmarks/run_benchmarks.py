@@ -0,0 +1,396 @@
+"""
+Набор тестов производительности.
+
+Генерирует синтетические таблицы и измеряет время и пиковую память
+основных операций: detect_anomalies, calculate_stats, process_file и
+create_anomalies_excel. Параметры таблиц:
+    rows - количество строк (от 1e3 до 1e7),
+    columns - количество числовых столбцов (от 10 до 1000),
+    groups - количество групп (от 1 до 1e5),
+    anomaly_rate - доля выбросов (от 0.1% до 20%).
+
+Параметры меняются по одному относительно базовой точки набора (полный
+перебор всех сочетаний занял бы часы), каждая операция получает только
+те параметры, от которых зависит. Время - минимум и медиана нескольких
+повторов, память - пик tracemalloc в отдельном запуске (tracemalloc
+замедляет выполнение, поэтому на время не влияет). Память Arrow вне кучи
+Python и NumPy не учитывается.
+
+Результаты сохраняются в JSON вместе с версиями библиотек и коммитом;
+--compare сравнивает их с результатами другого коммита. Сеть не нужна.
+
+Примеры:
+    python benchmarks/run_benchmarks.py --preset quick -o bench.json
+    python benchmarks/run_benchmarks.py --preset full --only detect_anomalies,calculate_stats
+    python benchmarks/run_benchmarks.py -o new.json --compare bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from anomaly_detection import calculate_group_stats, calculate_stats, detect_anomalies  # noqa: E402
+from anomaly_processor import create_anomalies_excel, process_file, process_frame  # noqa: E402
+
+# Базовая точка и значения параметров каждого набора
+PRESETS = {
+    'smoke': {
+        'base': {'rows': 1_000, 'columns': 10, 'groups': 1, 'anomaly_rate': 0.01},
+        'rows': [1_000, 5_000],
+        'columns': [10],
+        'groups': [1, 10],
+        'anomaly_rate': [0.01],
+    },
+    'quick': {
+        'base': {'rows': 100_000, 'columns': 10, 'groups': 1, 'anomaly_rate': 0.01},
+        'rows': [1_000, 10_000, 100_000, 1_000_000],
+        'columns': [10, 100],
+        'groups': [1, 100, 10_000],
+        'anomaly_rate': [0.001, 0.01, 0.2],
+    },
+    'full': {
+        'base': {'rows': 100_000, 'columns': 10, 'groups': 1, 'anomaly_rate': 0.01},
+        'rows': [1_000, 10_000, 100_000, 1_000_000, 10_000_000],
+        'columns': [10, 100, 1_000],
+        'groups': [1, 100, 1_000, 100_000],
+        'anomaly_rate': [0.001, 0.01, 0.05, 0.2],
+    },
+}
+
+# Порог замедления, после которого --compare сообщает о регрессии
+DEFAULT_REGRESSION_RATIO = 1.25
+
+
+def make_frame(rows: int, columns: int = 1, groups: int = 1,
+               anomaly_rate: float = 0.01, seed: int = 0) -> pd.DataFrame:
+    """
+    Создает синтетическую таблицу.
+
+    Значения столбцов value_i - нормальное распределение (100, 10), доля
+    anomaly_rate значений заменяется выбросами на расстоянии 10-20
+    стандартных отклонений. Столбец group - номер группы (от 0 до groups - 1).
+
+    Args:
+        rows: Количество строк
+        columns: Количество числовых столбцов
+        groups: Количество групп
+        anomaly_rate: Доля выбросов в каждом столбце
+        seed: Начальное значение генератора случайных чисел
+
+    Returns:
+        DataFrame со столбцами group, value_0, ..., value_{columns - 1}
+    """
+    rng = np.random.default_rng(seed)
+    values = rng.normal(100.0, 10.0, size=(rows, columns))
+    outliers = rng.random((rows, columns)) < anomaly_rate
+    shifts = rng.uniform(100.0, 200.0, size=outliers.sum()) * rng.choice([-1.0, 1.0], size=outliers.sum())
+    values[outliers] = 100.0 + shifts
+
+    frame = pd.DataFrame(values, columns=[f'value_{i}' for i in range(columns)])
+    frame.insert(0, 'group', rng.integers(0, groups, rows))
+    return frame
+
+
+def _bench_detect_anomalies(params: dict, workdir: Path):
+    """detect_anomalies по одному столбцу; при groups > 1 - с порогами групп."""
+    data = make_frame(params['rows'], 1, params['groups'], params['anomaly_rate'])
+    if params['groups'] > 1:
+        stats = calculate_group_stats(data, 'value_0', ['group'])
+        lower = stats['Q1'] - 1.5 * stats['IQR']
+        upper = stats['Q3'] + 1.5 * stats['IQR']
+        return lambda: detect_anomalies(data, 'value_0', lower, upper, ['group'])
+    iqr, q1, q3 = calculate_stats(data, 'value_0')
+    return lambda: detect_anomalies(data, 'value_0', q1 - 1.5 * iqr, q3 + 1.5 * iqr)
+
+
+def _bench_calculate_stats(params: dict, workdir: Path):
+    """calculate_stats по одному столбцу; при groups > 1 - calculate_group_stats."""
+    data = make_frame(params['rows'], 1, params['groups'], params['anomaly_rate'])
+    if params['groups'] > 1:
+        return lambda: calculate_group_stats(data, 'value_0', ['group'])
+    return lambda: calculate_stats(data, 'value_0')
+
+
+def _bench_process_file(params: dict, workdir: Path):
+    """process_file по Parquet файлу (чтение и анализ всех столбцов)."""
+    path = workdir / f"frame_{params['rows']}_{params['columns']}_{params['anomaly_rate']}.parquet"
+    if not path.exists():
+        make_frame(params['rows'], params['columns'], 1, params['anomaly_rate']).to_parquet(path)
+    return lambda: process_file(str(path))
+
+
+def _bench_create_anomalies_excel(params: dict, workdir: Path, engine: str):
+    """create_anomalies_excel по результатам process_frame."""
+    results = process_frame(make_frame(params['rows'], params['columns'], 1, params['anomaly_rate']))
+    return lambda: create_anomalies_excel(results, engine)
+
+
+# Операция: (параметры, от которых она зависит; функция подготовки)
+BENCHMARKS: Dict[str, tuple] = {
+    'detect_anomalies': (('rows', 'groups', 'anomaly_rate'), _bench_detect_anomalies),
+    'calculate_stats': (('rows', 'groups'), _bench_calculate_stats),
+    'process_file': (('rows', 'columns', 'anomaly_rate'), _bench_process_file),
+    'create_anomalies_excel[xlsxwriter]': (
+        ('rows', 'columns', 'anomaly_rate'),
+        lambda params, workdir: _bench_create_anomalies_excel(params, workdir, 'xlsxwriter')),
+    'create_anomalies_excel[openpyxl]': (
+        ('rows', 'columns', 'anomaly_rate'),
+        lambda params, workdir: _bench_create_anomalies_excel(params, workdir, 'openpyxl')),
+}
+
+# Ограничения размера для операций экспорта (количество ячеек с аномалиями)
+_EXPORT_MAX_CELLS = {
+    'create_anomalies_excel[xlsxwriter]': 20_000_000,
+    'create_anomalies_excel[openpyxl]': 2_000_000,
+}
+
+
+def build_cases(preset: str, benchmarks: Sequence[str], max_cells: float) -> List[tuple]:
+    """
+    Составляет список измерений: каждый параметр меняется относительно базовой точки.
+
+    Args:
+        preset: Название набора параметров (ключ PRESETS)
+        benchmarks: Названия операций
+        max_cells: Предельное количество значений (строки x столбцы) таблицы
+
+    Returns:
+        Список пар (операция, параметры) без повторов; параметры содержат
+        только те, от которых зависит операция
+    """
+    grid = PRESETS[preset]
+    base = grid['base']
+    cases = []
+    seen = set()
+    for name in benchmarks:
+        dims = BENCHMARKS[name][0]
+        for dim in dims:
+            for value in grid[dim]:
+                params = {key: base[key] for key in dims}
+                params[dim] = value
+                cells = params['rows'] * params.get('columns', 1)
+                rate = params.get('anomaly_rate', base['anomaly_rate'])
+                if cells > max_cells:
+                    continue
+                export_limit = _EXPORT_MAX_CELLS.get(name)
+                if export_limit and cells * rate * 1.5 > export_limit:
+                    continue
+                key = (name, tuple(sorted(params.items())))
+                if key not in seen:
+                    seen.add(key)
+                    cases.append((name, params))
+    return cases
+
+
+def measure(func: Callable, repeats: int, memory: bool = True) -> dict:
+    """
+    Измеряет время выполнения и пиковую память функции.
+
+    Args:
+        func: Функция без аргументов
+        repeats: Количество замеров времени
+        memory: Измерять пиковую память (еще один запуск под tracemalloc)
+
+    Returns:
+        Словарь с минимальным и медианным временем в секундах и пиком
+        памяти в байтах
+    """
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+
+    result = {
+        'seconds_min': min(timings),
+        'seconds_median': statistics.median(timings),
+        'repeats': repeats,
+    }
+    if memory:
+        tracemalloc.start()
+        try:
+            func()
+            result['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def run_suite(preset: str = 'quick',
+              benchmarks: Optional[Sequence[str]] = None,
+              max_cells: float = 1e8,
+              repeats: Optional[int] = None,
+              memory: bool = True,
+              progress: Optional[Callable[[str], None]] = None) -> dict:
+    """
+    Выполняет измерения набора.
+
+    Args:
+        preset: Название набора параметров
+        benchmarks: Названия операций (по умолчанию - все)
+        max_cells: Предельное количество значений таблицы
+        repeats: Количество замеров времени (по умолчанию 5 для таблиц
+            до 1e6 значений, иначе 1)
+        memory: Измерять пиковую память
+        progress: Функция для вывода строки о каждом измерении
+
+    Returns:
+        Словарь с описанием окружения (meta) и списком измерений (results)
+    """
+    benchmarks = list(benchmarks or BENCHMARKS)
+    unknown = set(benchmarks) - set(BENCHMARKS)
+    if unknown:
+        raise ValueError(f"Неизвестные операции: {', '.join(sorted(unknown))}. "
+                         f"Доступны: {', '.join(BENCHMARKS)}")
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='anomalizer-bench-') as workdir:
+        for name, params in build_cases(preset, benchmarks, max_cells):
+            # Параметры, от которых операция не зависит, берутся из базовой точки
+            func = BENCHMARKS[name][1](dict(PRESETS[preset]['base'], **params), Path(workdir))
+            cells = params['rows'] * params.get('columns', 1)
+            case_repeats = repeats or (5 if cells <= 1_000_000 else 1)
+            record = {'benchmark': name, 'params': params}
+            record.update(measure(func, case_repeats, memory))
+            results.append(record)
+            if progress:
+                progress(_format_record(record))
+
+    return {'meta': environment_info(preset), 'results': results}
+
+
+def environment_info(preset: str) -> dict:
+    """Описание окружения для сравнения результатов разных запусков."""
+    return {
+        'preset': preset,
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare(current: dict, baseline: dict, ratio: float = DEFAULT_REGRESSION_RATIO) -> List[dict]:
+    """
+    Сравнивает измерения с результатами другого запуска.
+
+    Args:
+        current: Результат run_suite
+        baseline: Результат run_suite для сравнения (например, прошлого коммита)
+        ratio: Отношение времени, начиная с которого замедление - регрессия
+
+    Returns:
+        Список сравнений общих измерений: операция, параметры, отношение
+        времени (новое / старое) и признак регрессии
+    """
+    previous = {_record_key(record): record for record in baseline['results']}
+    comparisons = []
+    for record in current['results']:
+        old = previous.get(_record_key(record))
+        if old is None:
+            continue
+        time_ratio = record['seconds_min'] / old['seconds_min'] if old['seconds_min'] else float('inf')
+        comparisons.append({
+            'benchmark': record['benchmark'],
+            'params': record['params'],
+            'ratio': time_ratio,
+            'regression': time_ratio >= ratio,
+        })
+    return comparisons
+
+
+def _record_key(record: dict) -> tuple:
+    """Ключ измерения для сопоставления между запусками."""
+    return record['benchmark'], tuple(sorted(record['params'].items()))
+
+
+def _format_record(record: dict) -> str:
+    """Строка с результатом измерения для вывода в консоль."""
+    params = ' '.join(f"{key}={value}" for key, value in record['params'].items())
+    line = f"{record['benchmark']:<36} {params:<60} {record['seconds_min'] * 1000:10.2f} мс"
+    if 'peak_memory_bytes' in record:
+        line += f" {record['peak_memory_bytes'] / 2 ** 20:9.1f} МБ"
+    return line
+
+
+def _git_commit() -> Optional[str]:
+    """Текущий коммит репозитория, если он доступен."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=Path(__file__).resolve().parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(description="Тесты производительности Anomalizer.")
+    parser.add_argument('--preset', choices=PRESETS, default='quick',
+                        help="набор параметров (по умолчанию quick)")
+    parser.add_argument('--only',
+                        help="операции через запятую: " + ', '.join(BENCHMARKS))
+    parser.add_argument('--max-cells', type=float, default=1e8,
+                        help="пропускать таблицы больше этого количества значений")
+    parser.add_argument('--repeats', type=int,
+                        help="количество замеров времени")
+    parser.add_argument('--no-memory', action='store_true',
+                        help="не измерять пиковую память")
+    parser.add_argument('-o', '--output',
+                        help="файл для результатов в JSON (по умолчанию - stdout)")
+    parser.add_argument('--compare',
+                        help="JSON с результатами другого запуска для сравнения")
+    parser.add_argument('--regression-ratio', type=float, default=DEFAULT_REGRESSION_RATIO,
+                        help="отношение времени, считающееся регрессией")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """
+    Точка входа командной строки.
+
+    Returns:
+        Код завершения: 0, либо 1, если при сравнении найдены регрессии
+    """
+    args = parse_args(argv)
+    benchmarks = args.only.split(',') if args.only else None
+    log = (lambda line: print(line, file=sys.stderr, flush=True))
+    suite = run_suite(args.preset, benchmarks, args.max_cells, args.repeats,
+                      not args.no_memory, progress=log)
+
+    report = json.dumps(suite, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(report, encoding='utf-8')
+    else:
+        print(report)
+
+    if not args.compare:
+        return 0
+    baseline = json.loads(Path(args.compare).read_text(encoding='utf-8'))
+    comparisons = compare(suite, baseline, args.regression_ratio)
+    for item in comparisons:
+        params = ' '.join(f"{key}={value}" for key, value in item['params'].items())
+        mark = ' РЕГРЕССИЯ' if item['regression'] else ''
+        log(f"{item['benchmark']:<36} {params:<60} x{item['ratio']:.2f}{mark}")
+    return 1 if any(item['regression'] for item in comparisons) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Модуль дискового кеша разобранных таблиц.
+
+Разбор Excel файла - самый медленный шаг загрузки. Кеш сохраняет уже
+разобранный DataFrame в формате Arrow IPC (Feather v2) под ключом SHA-256
+от байтов исходного файла; при повторной загрузке того же файла таблица
+читается через отображение файла в память вместо повторного разбора XML.
+
+Настройки задаются переменными окружения:
+    ANOMALIZER_CACHE_DIR - каталог кеша (по умолчанию .anomalizer_cache)
+    ANOMALIZER_CACHE_MAX_BYTES - предельный размер кеша в байтах; при
+        превышении удаляются давно не использовавшиеся записи (LRU)
+"""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Callable, Optional
+
+import pandas as pd
+import pyarrow as pa
+
+CACHE_DIR_ENV = 'ANOMALIZER_CACHE_DIR'
+CACHE_MAX_BYTES_ENV = 'ANOMALIZER_CACHE_MAX_BYTES'
+DEFAULT_CACHE_DIR = '.anomalizer_cache'
+DEFAULT_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+_SUFFIX = '.arrow'
+
+
+def file_digest(data: bytes) -> str:
+    """Возвращает SHA-256 от содержимого файла в шестнадцатеричном виде."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class FrameCache:
+    """
+    Кеш DataFrame на диске с ключом по содержимому файла и вытеснением LRU.
+
+    Args:
+        cache_dir: Каталог кеша (по умолчанию из ANOMALIZER_CACHE_DIR)
+        max_bytes: Предельный размер кеша (по умолчанию из ANOMALIZER_CACHE_MAX_BYTES)
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        if cache_dir is None:
+            cache_dir = os.environ.get(CACHE_DIR_ENV, DEFAULT_CACHE_DIR)
+        if max_bytes is None:
+            max_bytes = int(os.environ.get(CACHE_MAX_BYTES_ENV, DEFAULT_CACHE_MAX_BYTES))
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+
+    def load(self, data: bytes, parser: Callable[[bytes], pd.DataFrame]) -> pd.DataFrame:
+        """
+        Возвращает таблицу из кеша или разбирает файл и сохраняет результат.
+
+        Args:
+            data: Байты исходного файла
+            parser: Функция разбора байтов в DataFrame
+
+        Returns:
+            DataFrame с данными файла
+        """
+        digest = file_digest(data)
+        frame = self.get(digest)
+        if frame is None:
+            frame = parser(data)
+            self.put(digest, frame)
+        return frame
+
+    def get(self, digest: str) -> Optional[pd.DataFrame]:
+        """
+        Читает таблицу из кеша через отображение файла в память.
+
+        Args:
+            digest: SHA-256 исходного файла
+
+        Returns:
+            DataFrame или None, если записи нет
+        """
+        path = self._path(digest)
+        try:
+            with pa.memory_map(str(path), 'r') as source:
+                table = pa.ipc.open_file(source).read_all()
+        except (FileNotFoundError, pa.ArrowInvalid):
+            return None
+        # Отмечаем использование записи для вытеснения LRU
+        os.utime(path)
+        return table.to_pandas()
+
+    def put(self, digest: str, frame: pd.DataFrame) -> bool:
+        """
+        Сохраняет таблицу в кеш.
+
+        Args:
+            digest: SHA-256 исходного файла
+            frame: Разобранный DataFrame
+
+        Returns:
+            True, если таблица сохранена; False, если ее нельзя представить
+            в Arrow без потерь (например, столбец со значениями разных типов
+            или заголовки не строки)
+        """
+        # Arrow хранит названия столбцов строками: заголовки-числа (например,
+        # годы) вернулись бы из кеша строками, и выбор столбцов зависел бы
+        # от того, прочитана ли таблица из кеша
+        if not all(isinstance(column, str) for column in frame.columns):
+            return False
+        try:
+            table = pa.Table.from_pandas(frame)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            return False
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(digest)
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with pa.OSFile(str(temp_path), 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(temp_path, path)
+
+        self.evict()
+        return True
+
+    def evict(self) -> None:
+        """Удаляет давно не использовавшиеся записи, пока кеш больше предела."""
+        entries = []
+        for path in self.cache_dir.glob(f"*{_SUFFIX}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def _path(self, digest: str) -> Path:
+        """Путь к файлу записи кеша."""
+        return self.cache_dir / f"{digest}{_SUFFIX}"
@@ -0,0 +1,360 @@
+"""
+Модуль для чтения входных данных.
+
+Содержит чтение таблиц в форматах Excel, CSV, Parquet и Feather с
+автоматическим определением формата, потоковое чтение Excel файлов по
+частям фиксированного размера, которое позволяет обрабатывать большие
+книги без загрузки листа целиком, и уменьшение типов данных прочитанной
+таблицы.
+"""
+
+import codecs
+import csv
+import io
+import os
+from typing import BinaryIO, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from pyarrow import csv as pa_csv
+from openpyxl import load_workbook
+
+# Количество строк в одной части по умолчанию
+DEFAULT_CHUNK_SIZE = 50_000
+
+# Поддерживаемые расширения файлов и соответствующие форматы
+FORMAT_EXTENSIONS = {
+    'xlsx': 'xlsx',
+    'xls': 'xls',
+    'csv': 'csv',
+    'txt': 'csv',
+    'parquet': 'parquet',
+    'pq': 'parquet',
+    'feather': 'feather',
+    'arrow': 'feather',
+}
+
+# Сигнатуры начала файлов
+_MAGIC_BYTES = (
+    (b'PK\x03\x04', 'xlsx'),
+    (b'\xd0\xcf\x11\xe0', 'xls'),
+    (b'PAR1', 'parquet'),
+    (b'ARROW1', 'feather'),
+)
+
+# Разделители, среди которых определяется разделитель CSV
+_CSV_DELIMITERS = ',;\t|'
+
+# Доля уникальных значений, до которой текстовый столбец переводится в category
+DEFAULT_MAX_CATEGORY_RATIO = 0.5
+
+# Кодировка CSV файлов не в UTF-8 (выгрузки Excel в русской Windows)
+_CSV_FALLBACK_ENCODING = 'cp1251'
+
+Source = Union[str, os.PathLike, bytes, BinaryIO]
+
+
+def detect_format(source: Source, file_name: Optional[str] = None) -> str:
+    """
+    Определяет формат таблицы по расширению имени файла или по сигнатуре.
+
+    Args:
+        source: Путь к файлу, байты файла или двоичный поток
+        file_name: Имя файла (для байтов и потоков, опционально)
+
+    Returns:
+        Формат: 'xlsx', 'xls', 'csv', 'parquet' или 'feather'
+    """
+    if file_name is None and isinstance(source, (str, os.PathLike)):
+        file_name = os.fspath(source)
+    if file_name:
+        extension = os.path.splitext(file_name)[1].lower().lstrip('.')
+        if extension in FORMAT_EXTENSIONS:
+            return FORMAT_EXTENSIONS[extension]
+
+    head = _read_head(source, 8)
+    for magic, file_format in _MAGIC_BYTES:
+        if head.startswith(magic):
+            return file_format
+    return 'csv'
+
+
+def read_table(source: Source,
+               file_name: Optional[str] = None,
+               columns: Optional[List[str]] = None,
+               sheet_name: Union[str, int] = 0) -> pd.DataFrame:
+    """
+    Читает таблицу из файла в любом поддерживаемом формате.
+
+    CSV читается многопоточным парсером pyarrow, Parquet и Feather - с
+    проекцией столбцов, то есть с диска читаются только нужные столбцы.
+
+    Args:
+        source: Путь к файлу, байты файла или двоичный поток
+        file_name: Имя файла для определения формата по расширению
+        columns: Список столбцов для чтения (по умолчанию - все)
+        sheet_name: Лист Excel файла (по умолчанию - первый)
+
+    Returns:
+        DataFrame с данными
+    """
+    file_format = detect_format(source, file_name)
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    elif not isinstance(source, (str, os.PathLike)):
+        source.seek(0)
+
+    if file_format == 'csv':
+        return _read_csv(source, columns)
+    if file_format == 'parquet':
+        return pd.read_parquet(source, columns=columns)
+    if file_format == 'feather':
+        return pd.read_feather(source, columns=columns)
+    engine = 'openpyxl' if file_format == 'xlsx' else 'xlrd'
+    return pd.read_excel(source, engine=engine, usecols=columns, sheet_name=sheet_name)
+
+
+def excel_sheet_names(source: Source, file_name: Optional[str] = None) -> List[str]:
+    """
+    Возвращает названия листов Excel файла без чтения их содержимого.
+
+    Args:
+        source: Путь к файлу, байты файла или двоичный поток
+        file_name: Имя файла для определения формата по расширению
+
+    Returns:
+        Список названий листов в порядке книги
+    """
+    file_format = detect_format(source, file_name)
+    if file_format not in ('xlsx', 'xls'):
+        raise ValueError(f"Файл в формате {file_format} не содержит листов Excel")
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    engine = 'openpyxl' if file_format == 'xlsx' else 'xlrd'
+    with pd.ExcelFile(source, engine=engine) as workbook:
+        return list(workbook.sheet_names)
+
+
+def optimize_dtypes(df: pd.DataFrame,
+                    max_category_ratio: float = DEFAULT_MAX_CATEGORY_RATIO,
+                    float32: bool = False) -> Tuple[pd.DataFrame, dict]:
+    """
+    Уменьшает типы данных таблицы без потери значений.
+
+    Текстовые столбцы с небольшим числом различных значений переводятся в
+    category: значения хранятся один раз, а группировка и фильтрация
+    работают с целочисленными кодами вместо хеширования строк. Целые
+    числа переводятся в наименьший вмещающий их целый тип.
+
+    Args:
+        df: Исходная таблица (не изменяется)
+        max_category_ratio: Наибольшая доля уникальных значений среди
+            непустых, при которой столбец переводится в category
+        float32: Переводить в float32 дробные столбцы, значения которых
+            представимы в float32 точно (квартили таких столбцов тоже
+            вычисляются в float32, поэтому по умолчанию выключено)
+
+    Returns:
+        Кортеж (таблица с уменьшенными типами, отчет): в отчете размер
+        таблицы в байтах до и после (memory_before, memory_after) и
+        измененные столбцы {столбец: (старый тип, новый тип)}
+    """
+    result = df.copy(deep=False)
+    changed = {}
+    for position in range(df.shape[1]):
+        series = df.iloc[:, position]
+        converted = _optimize_series(series, max_category_ratio, float32)
+        if converted is not None:
+            result.isetitem(position, converted)
+            changed[df.columns[position]] = (str(series.dtype), str(converted.dtype))
+
+    report = {
+        'memory_before': int(df.memory_usage(deep=True).sum()),
+        'memory_after': int(result.memory_usage(deep=True).sum()),
+        'columns': changed,
+    }
+    return result, report
+
+
+def _optimize_series(series: pd.Series,
+                     max_category_ratio: float,
+                     float32: bool) -> Optional[pd.Series]:
+    """Возвращает столбец с уменьшенным типом или None, если тип не меняется."""
+    if pd.api.types.is_bool_dtype(series) or isinstance(series.dtype, pd.CategoricalDtype):
+        return None
+    if pd.api.types.is_integer_dtype(series):
+        return _downcast_integer(series)
+    if pd.api.types.is_float_dtype(series):
+        return _downcast_float(series) if float32 else None
+    if pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+        return _to_category(series, max_category_ratio)
+    return None
+
+
+def _downcast_integer(series: pd.Series) -> Optional[pd.Series]:
+    """Целый столбец наименьшего подходящего типа."""
+    if not isinstance(series.dtype, np.dtype):
+        # Целые с пропусками (Int64 и т.п.) остаются как есть
+        return None
+    converted = pd.to_numeric(series, downcast='integer')
+    return converted if converted.dtype != series.dtype else None
+
+
+def _downcast_float(series: pd.Series) -> Optional[pd.Series]:
+    """Столбец float64 в float32, если все значения представимы точно."""
+    if series.dtype != np.float64:
+        return None
+    converted = series.astype(np.float32)
+    # Значения, не представимые в float32 точно, оставляют столбец в float64
+    if np.array_equal(converted.to_numpy(dtype=np.float64), series.to_numpy(), equal_nan=True):
+        return converted
+    return None
+
+
+def _to_category(series: pd.Series, max_category_ratio: float) -> Optional[pd.Series]:
+    """Строковый столбец с малой долей уникальных значений в category."""
+    count = series.count()
+    if count == 0:
+        return None
+    try:
+        unique = series.nunique()
+    except TypeError:
+        # Нехешируемые значения (списки, словари)
+        return None
+    if unique / count <= max_category_ratio:
+        return series.astype('category')
+    return None
+
+
+def _read_csv(source: Union[str, os.PathLike, BinaryIO],
+              columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Читает CSV файл через pyarrow с автоматическим определением разделителя."""
+    sample = _read_head(source, 64 * 1024)
+    delimiter = _sniff_delimiter(sample)
+    if not _is_utf8(sample):
+        # Многопоточный парсер pyarrow работает только с UTF-8
+        return pd.read_csv(source, sep=delimiter, usecols=columns,
+                           encoding=_CSV_FALLBACK_ENCODING)
+
+    convert_options = pa_csv.ConvertOptions(include_columns=columns) if columns else None
+    table = pa_csv.read_csv(source,
+                            parse_options=pa_csv.ParseOptions(delimiter=delimiter),
+                            convert_options=convert_options)
+    return table.to_pandas(date_as_object=False)
+
+
+def _is_utf8(sample: bytes) -> bool:
+    """Проверяет, что начало файла - корректный UTF-8 (образец может обрываться посреди символа)."""
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def _sniff_delimiter(sample: bytes) -> str:
+    """Определяет разделитель CSV по началу файла (по умолчанию - запятая)."""
+    text = sample.decode('utf-8' if _is_utf8(sample) else _CSV_FALLBACK_ENCODING, errors='replace')
+    lines = text.splitlines()
+    if len(lines) > 1 and not sample.endswith(b'\n'):
+        # Последняя строка образца может быть обрезана
+        text = '\n'.join(lines[:-1])
+    try:
+        return csv.Sniffer().sniff(text, delimiters=_CSV_DELIMITERS).delimiter
+    except csv.Error:
+        return ','
+
+
+def _read_head(source: Source, size: int) -> bytes:
+    """Читает первые size байтов источника (позиция потока сбрасывается в начало)."""
+    if isinstance(source, bytes):
+        return source[:size]
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return f.read(size)
+    source.seek(0)
+    head = source.read(size)
+    source.seek(0)
+    return head
+
+
+def iter_excel_chunks(file_path: str,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE,
+                      sheet_name: Optional[str] = None) -> Iterator[pd.DataFrame]:
+    """
+    Читает лист Excel файла частями по chunk_size строк.
+
+    Используется режим openpyxl read-only: строки разбираются по мере
+    чтения, поэтому в памяти одновременно находится не больше одной части.
+    Первая строка листа считается заголовком, полностью пустые строки
+    пропускаются (как в pd.read_excel). Индекс каждой части продолжает
+    нумерацию строк листа, поэтому он совпадает с индексом pd.read_excel.
+
+    Args:
+        file_path: Путь к Excel файлу (.xlsx)
+        chunk_size: Количество строк в одной части
+        sheet_name: Название листа (по умолчанию - первый лист)
+
+    Yields:
+        DataFrame с очередной частью строк
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size должен быть положительным")
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        rows = worksheet.iter_rows(values_only=True)
+
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = _make_column_names(header)
+        width = len(columns)
+
+        buffer = []
+        offset = 0
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            buffer.append(_fit_row(row, width))
+            if len(buffer) >= chunk_size:
+                yield _make_chunk(buffer, columns, offset)
+                offset += len(buffer)
+                buffer = []
+        if buffer:
+            yield _make_chunk(buffer, columns, offset)
+    finally:
+        workbook.close()
+
+
+def _make_column_names(header: Sequence) -> List[str]:
+    """Формирует названия столбцов по правилам pd.read_excel."""
+    while header and header[-1] is None:
+        header = header[:-1]
+
+    names = []
+    seen = {}
+    for position, value in enumerate(header):
+        name = f"Unnamed: {position}" if value is None else value
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _fit_row(row: tuple, width: int) -> tuple:
+    """Дополняет или обрезает строку до ширины заголовка."""
+    if len(row) < width:
+        return row + (None,) * (width - len(row))
+    return row[:width]
+
+
+def _make_chunk(buffer: list, columns: List[str], offset: int) -> pd.DataFrame:
+    """Создает DataFrame из накопленных строк с индексом, продолжающим нумерацию листа."""
+    chunk = pd.DataFrame.from_records(buffer, columns=columns)
+    chunk.index = pd.RangeIndex(offset, offset + len(buffer))
+    return chunk
@@ -0,0 +1,150 @@
+"""
+Модуль экспорта таблиц в Excel.
+
+Поддерживает два движка записи:
+    openpyxl - книга целиком строится в памяти, выделение задается
+        стилем каждой ячейки;
+    xlsxwriter - строки потоково записываются на диск в режиме
+        constant_memory, выделение задается одним общим форматом или
+        условным форматированием диапазона, поэтому расход памяти не
+        зависит от размера таблицы.
+"""
+
+import io
+from typing import BinaryIO, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+EXCEL_ENGINES = ('openpyxl', 'xlsxwriter')
+
+# Цвет выделения аномальных ячеек
+HIGHLIGHT_COLOR = '#FF0000'
+
+# Количество строк, преобразуемых к значениям Python за один шаг
+_ROWS_PER_BATCH = 10_000
+
+# Правило выделения: (столбец, нижний порог, верхний порог)
+ThresholdRule = Tuple[str, float, float]
+
+
+def export_frame(frame: pd.DataFrame,
+                 sheet_name: str,
+                 engine: str = 'openpyxl',
+                 threshold_rule: Optional[ThresholdRule] = None) -> bytes:
+    """
+    Сохраняет DataFrame в Excel файл на одном листе.
+
+    Args:
+        frame: Таблица для экспорта
+        sheet_name: Название листа
+        engine: Движок записи ('openpyxl' или 'xlsxwriter')
+        threshold_rule: Для xlsxwriter - столбец и пороги; значения столбца
+            вне порогов выделяются условным форматированием
+
+    Returns:
+        Байтовое представление Excel файла
+    """
+    check_engine(engine)
+    output = io.BytesIO()
+    if engine == 'xlsxwriter':
+        write_xlsxwriter(frame, output, sheet_name, threshold_rule=threshold_rule)
+    else:
+        with pd.ExcelWriter(output, engine='openpyxl') as writer:
+            frame.to_excel(writer, index=False, sheet_name=sheet_name)
+    return output.getvalue()
+
+
+def write_xlsxwriter(frame: pd.DataFrame,
+                     target: Union[str, BinaryIO],
+                     sheet_name: str,
+                     highlight_columns: Optional[Sequence[int]] = None,
+                     threshold_rule: Optional[ThresholdRule] = None) -> None:
+    """
+    Записывает DataFrame в Excel файл через xlsxwriter в режиме constant_memory.
+
+    Строки записываются по порядку и сразу сбрасываются на диск, поэтому
+    в памяти хранится только текущая строка. Для выделения используется
+    один заранее созданный формат, а не отдельный объект стиля на ячейку.
+
+    Args:
+        frame: Таблица для экспорта
+        target: Путь к файлу или двоичный поток
+        sheet_name: Название листа
+        highlight_columns: Для каждой строки - номер столбца (с 0), ячейку
+            которого нужно выделить, или -1
+        threshold_rule: Столбец и пороги для условного форматирования
+    """
+    write_xlsxwriter_sheets(target, [(sheet_name, frame, highlight_columns, threshold_rule)])
+
+
+def write_xlsxwriter_sheets(target: Union[str, BinaryIO], sheets: list) -> None:
+    """
+    Записывает несколько листов через xlsxwriter в режиме constant_memory.
+
+    Args:
+        target: Путь к файлу или двоичный поток
+        sheets: Список кортежей (название листа, таблица, highlight_columns,
+            threshold_rule) с тем же смыслом, что и в write_xlsxwriter
+    """
+    workbook = xlsxwriter.Workbook(target, {
+        'constant_memory': True,
+        'nan_inf_to_errors': True,
+        'remove_timezone': True,
+        'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+    })
+    try:
+        highlight = workbook.add_format({'bg_color': HIGHLIGHT_COLOR})
+        header = workbook.add_format({'bold': True, 'border': 1})
+        for sheet_name, frame, highlight_columns, threshold_rule in sheets:
+            worksheet = workbook.add_worksheet(sheet_name)
+            _write_sheet(worksheet, frame, header, highlight, highlight_columns, threshold_rule)
+    finally:
+        workbook.close()
+
+
+def _write_sheet(worksheet, frame: pd.DataFrame, header, highlight,
+                 highlight_columns: Optional[Sequence[int]],
+                 threshold_rule: Optional[ThresholdRule]) -> None:
+    """Построчно записывает таблицу на лист xlsxwriter."""
+    worksheet.write_row(0, 0, [str(column) for column in frame.columns], header)
+    for start in range(0, len(frame), _ROWS_PER_BATCH):
+        rows = _python_rows(frame.iloc[start:start + _ROWS_PER_BATCH])
+        for offset, values in enumerate(rows):
+            row = start + offset + 1
+            worksheet.write_row(row, 0, values)
+            if highlight_columns is not None and highlight_columns[row - 1] >= 0:
+                column = highlight_columns[row - 1]
+                worksheet.write(row, column, values[column], highlight)
+
+    if threshold_rule is not None and len(frame):
+        column_name, lower_threshold, upper_threshold = threshold_rule
+        column = frame.columns.get_loc(column_name)
+        worksheet.conditional_format(1, column, len(frame), column, {
+            'type': 'cell',
+            'criteria': 'not between',
+            'minimum': lower_threshold,
+            'maximum': upper_threshold,
+            'format': highlight,
+        })
+
+
+def check_engine(engine: str) -> None:
+    """Проверяет, что движок записи Excel поддерживается."""
+    if engine not in EXCEL_ENGINES:
+        raise ValueError(f"Неизвестный движок Excel: {engine}. Доступны: {', '.join(EXCEL_ENGINES)}")
+
+
+def _python_rows(frame: pd.DataFrame) -> list:
+    """Преобразует строки таблицы в списки значений Python (пропуски - None)."""
+    values = frame.astype(object).to_numpy(copy=True)
+    values[pd.isna(values)] = None
+    return [[_cell_value(value) for value in row] for row in values]
+
+
+def _cell_value(value):
+    """Приводит значение к типу, который xlsxwriter записывает как есть."""
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
@@ -0,0 +1,273 @@
+"""
+Модуль измерения времени и памяти этапов обработки.
+
+Этапы (загрузка, фильтрация, расчет статистики, поиск аномалий, построение
+графика, выгрузка) оборачиваются в span:
+
+    with span('detect_anomalies', rows=len(df)) as current:
+        anomalies = detect_anomalies(...)
+        current.set(anomalies=len(anomalies))
+
+Для каждого этапа записываются время, количество строк и память в одном
+из режимов:
+    rss - текущий размер резидентной памяти процесса и прирост его пика
+        (почти без затрат; пик RSS только растет, поэтому прирост виден
+        лишь у этапа, который его обновил);
+    tracemalloc - пик памяти, выделенной Python и NumPy за время этапа
+        (точнее, но замедляет выполнение; tracemalloc общий для процесса,
+        поэтому измерения параллельных сессий влияют друг на друга).
+
+Записи выводятся в журнал anomalizer.instrumentation (уровень INFO) одной
+строкой JSON и собираются для панели отладки веб-интерфейса
+(start_recording). Пока измерения выключены, span возвращает общий пустой
+объект, и затраты сводятся к одной проверке.
+
+Измерения включаются для всего процесса переменной окружения
+ANOMALIZER_INSTRUMENTATION (1 или rss, tracemalloc) или функцией enable,
+для текущего потока - функцией start_recording.
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+INSTRUMENTATION_ENV = 'ANOMALIZER_INSTRUMENTATION'
+MEMORY_MODES = ('rss', 'tracemalloc')
+
+logger = logging.getLogger('anomalizer.instrumentation')
+
+# Режим памяти при измерениях, включенных для всего процесса (None - выключены)
+_process_memory: Optional[str] = None
+
+# Запись измерений текущего потока (сессии Streamlit выполняются в своих потоках)
+_local = threading.local()
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+# ru_maxrss в macOS - в байтах, в Linux - в килобайтах
+_MAXRSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+class Span:
+    """
+    Измерение одного этапа.
+
+    Args:
+        stage: Название этапа
+        memory: Режим измерения памяти ('rss' или 'tracemalloc')
+        fields: Дополнительные поля записи (например, rows)
+    """
+
+    def __init__(self, stage: str, memory: str, fields: dict):
+        self.stage = stage
+        self.memory = memory
+        self.fields = fields
+        self.parent: Optional['Span'] = None
+        self.record: Optional[dict] = None
+        self._started = 0.0
+        self._rss = (None, None)
+        self._traced_start = 0
+        self._traced_peak = 0
+        self._started_tracing = False
+
+    def set(self, **fields) -> None:
+        """Добавляет поля записи (например, количество найденных аномалий)."""
+        self.fields.update(fields)
+
+    def __enter__(self) -> 'Span':
+        stack = _stack()
+        self.parent = stack[-1] if stack else None
+        stack.append(self)
+
+        if self.memory == 'tracemalloc':
+            self._started_tracing = not tracemalloc.is_tracing()
+            if self._started_tracing:
+                tracemalloc.start()
+            current, peak = tracemalloc.get_traced_memory()
+            if self.parent is not None and self.parent.memory == 'tracemalloc':
+                # Пик внешнего этапа до начала вложенного сохраняется до сброса
+                self.parent._traced_peak = max(self.parent._traced_peak, peak)
+            tracemalloc.reset_peak()
+            self._traced_start = self._traced_peak = current
+        else:
+            self._rss = _rss()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        elapsed = time.perf_counter() - self._started
+        record = {
+            'event': 'span',
+            'stage': self.stage,
+            'seconds': round(elapsed, 6),
+        }
+        record.update(self.fields)
+
+        if self.memory == 'tracemalloc':
+            peak = max(self._traced_peak, tracemalloc.get_traced_memory()[1])
+            record['traced_peak_bytes'] = peak - self._traced_start
+            if self.parent is not None and self.parent.memory == 'tracemalloc':
+                self.parent._traced_peak = max(self.parent._traced_peak, peak)
+            if self._started_tracing:
+                tracemalloc.stop()
+        else:
+            rss, peak = _rss()
+            if rss is not None:
+                record['rss_bytes'] = rss
+                record['rss_delta_bytes'] = rss - self._rss[0]
+            if peak is not None:
+                record['peak_rss_delta_bytes'] = peak - self._rss[1]
+
+        if self.parent is not None:
+            record['parent'] = self.parent.stage
+        if exc_type is not None:
+            record['error'] = exc_type.__name__
+        record['timestamp'] = datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+        self.record = record
+
+        _stack().pop()
+        records = getattr(_local, 'records', None)
+        if records is not None:
+            records.append(record)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(record, ensure_ascii=False, default=str))
+        return False
+
+
+class _NullSpan:
+    """Пустое измерение, возвращаемое при выключенных измерениях."""
+
+    __slots__ = ()
+
+    def set(self, **fields) -> None:
+        pass
+
+    def __enter__(self) -> '_NullSpan':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(stage: str, **fields):
+    """
+    Создает измерение этапа для использования в блоке with.
+
+    Args:
+        stage: Название этапа
+        **fields: Дополнительные поля записи (rows, column и т.п.)
+
+    Returns:
+        Span, либо пустой объект с тем же интерфейсом, если измерения выключены
+    """
+    memory = getattr(_local, 'memory', None) or _process_memory
+    if memory is None:
+        return _NULL_SPAN
+    return Span(stage, memory, fields)
+
+
+def enable(memory: str = 'rss', log_to_stderr: bool = True) -> None:
+    """
+    Включает измерения для всего процесса.
+
+    Args:
+        memory: Режим измерения памяти ('rss' или 'tracemalloc')
+        log_to_stderr: Выводить записи в stderr, если у журнала нет
+            обработчиков
+    """
+    global _process_memory
+    _check_memory(memory)
+    _process_memory = memory
+    if log_to_stderr and not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+
+
+def disable() -> None:
+    """Выключает измерения для всего процесса."""
+    global _process_memory
+    _process_memory = None
+
+
+def start_recording(memory: str = 'rss') -> List[dict]:
+    """
+    Включает измерения в текущем потоке и начинает сбор записей.
+
+    Args:
+        memory: Режим измерения памяти ('rss' или 'tracemalloc')
+
+    Returns:
+        Список, в который добавляются записи завершенных этапов
+    """
+    _check_memory(memory)
+    _local.memory = memory
+    _local.records = []
+    return _local.records
+
+
+def stop_recording() -> List[dict]:
+    """
+    Прекращает сбор записей в текущем потоке.
+
+    Returns:
+        Собранные записи (пустой список, если сбор не был начат)
+    """
+    records = getattr(_local, 'records', None) or []
+    _local.memory = None
+    _local.records = None
+    return records
+
+
+def _stack() -> List[Span]:
+    """Стек незавершенных измерений текущего потока."""
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _rss() -> Tuple[Optional[int], Optional[int]]:
+    """Текущий и пиковый размер резидентной памяти процесса в байтах (None - недоступен)."""
+    current = None
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            current = int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        pass
+    peak = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_UNIT
+    return current, peak
+
+
+def _check_memory(memory: str) -> None:
+    """Проверяет режим измерения памяти."""
+    if memory not in MEMORY_MODES:
+        raise ValueError(f"Неизвестный режим измерения памяти: {memory}. "
+                         f"Доступны: {', '.join(MEMORY_MODES)}")
+
+
+def _configure_from_env() -> None:
+    """Включает измерения, если это задано переменной окружения."""
+    value = os.environ.get(INSTRUMENTATION_ENV, '').strip().lower()
+    if value in ('', '0', 'false', 'no', 'off'):
+        return
+    enable('tracemalloc' if value == 'tracemalloc' else 'rss')
+
+
+_configure_from_env()
@@ -0,0 +1,359 @@
+"""
+Модуль фоновых заданий обработки всех столбцов файла.
+
+Задание (поиск аномалий во всех столбцах и выгрузка в Excel) выполняется
+в пуле процессов, поэтому долгая обработка не блокирует веб-интерфейс.
+Все состояние задания хранится в его каталоге на диске:
+    job.json - параметры задания;
+    input.<расширение> - входной файл;
+    status.json - состояние, прогресс и итоги (заменяется целиком);
+    cancel - отметка об отмене (процесс проверяет ее между шагами);
+    result.xlsx - файл с аномалиями.
+Поэтому состояние можно читать из любого потока или процесса, а
+результаты переживают перезапуск веб-интерфейса. Внешний брокер не нужен.
+
+Каталог заданий задается переменной окружения ANOMALIZER_JOBS_DIR (по
+умолчанию .anomalizer_jobs). Excel файлы (.xlsx) от
+ANOMALIZER_STREAMING_MIN_BYTES байт (по умолчанию 20 МБ) обрабатываются
+потоково (process_file_streaming, метод exact): лист не загружается в
+память целиком.
+"""
+
+import json
+import math
+import multiprocessing
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from anomaly_processor import (
+    process_file_streaming, process_frame, write_anomalies_excel, write_workbook_anomalies_excel
+)
+from anomaly_detection import numeric_columns
+from data_loader import read_table
+
+JOBS_DIR_ENV = 'ANOMALIZER_JOBS_DIR'
+DEFAULT_JOBS_DIR = '.anomalizer_jobs'
+STREAMING_MIN_BYTES_ENV = 'ANOMALIZER_STREAMING_MIN_BYTES'
+DEFAULT_STREAMING_MIN_BYTES = 20 * 1024 * 1024
+
+# Состояния задания; FINAL_STATES - задание больше не изменится
+JOB_STATES = ('queued', 'running', 'done', 'failed', 'cancelled')
+FINAL_STATES = ('done', 'failed', 'cancelled')
+
+# Количество частей, на которые делятся столбцы листа для отчета о прогрессе
+PROGRESS_STEPS = 20
+
+_SPEC_FILE = 'job.json'
+_STATUS_FILE = 'status.json'
+_CANCEL_FILE = 'cancel'
+_RESULT_FILE = 'result.xlsx'
+_JOB_ID = re.compile(r'[0-9a-f]{32}')
+
+
+class JobCancelled(Exception):
+    """Задание отменено пользователем."""
+
+
+class JobQueue:
+    """
+    Очередь фоновых заданий на пуле процессов.
+
+    Args:
+        jobs_dir: Каталог заданий (по умолчанию из ANOMALIZER_JOBS_DIR)
+        workers: Количество процессов (одновременно выполняемых заданий)
+        streaming_min_bytes: Размер xlsx файла, начиная с которого он
+            обрабатывается потоково (по умолчанию из
+            ANOMALIZER_STREAMING_MIN_BYTES)
+    """
+
+    def __init__(self, jobs_dir: Optional[str] = None, workers: int = 1,
+                 streaming_min_bytes: Optional[int] = None):
+        if jobs_dir is None:
+            jobs_dir = os.environ.get(JOBS_DIR_ENV, DEFAULT_JOBS_DIR)
+        if streaming_min_bytes is None:
+            streaming_min_bytes = int(os.environ.get(STREAMING_MIN_BYTES_ENV, DEFAULT_STREAMING_MIN_BYTES))
+        self.jobs_dir = Path(jobs_dir)
+        self.workers = max(1, workers)
+        self.streaming_min_bytes = streaming_min_bytes
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, data: bytes, file_name: str,
+               sheets: Optional[List[str]] = None,
+               engine: str = 'xlsxwriter',
+               streaming: Optional[str] = None) -> str:
+        """
+        Ставит в очередь обработку всех столбцов файла.
+
+        Args:
+            data: Байты входного файла
+            file_name: Имя файла (по расширению определяется формат)
+            sheets: Листы Excel файла (по умолчанию - первый лист)
+            engine: Движок записи xlsx
+            streaming: Метод потоковой обработки xlsx файла ('exact' или
+                'sketch', см. process_file_streaming); по умолчанию 'exact'
+                для файлов от streaming_min_bytes байт, остальные файлы
+                загружаются целиком
+
+        Returns:
+            Идентификатор задания
+        """
+        job_id = uuid.uuid4().hex
+        directory = self.jobs_dir / job_id
+        directory.mkdir(parents=True)
+
+        input_name = 'input' + os.path.splitext(file_name)[1].lower()
+        if input_name != 'input.xlsx':
+            streaming = None
+        elif streaming is None and len(data) >= self.streaming_min_bytes:
+            streaming = 'exact'
+        (directory / input_name).write_bytes(data)
+        _write_json(directory / _SPEC_FILE, {
+            'file_name': file_name,
+            'input': input_name,
+            'sheets': list(sheets) if sheets else None,
+            'engine': engine,
+            'streaming': streaming,
+        })
+        _write_json(directory / _STATUS_FILE, {
+            'id': job_id,
+            'file_name': file_name,
+            'state': 'queued',
+            'progress': 0.0,
+            'message': "В очереди",
+            'created': time.time(),
+        })
+
+        with self._lock:
+            try:
+                future = self._pool().submit(run_job, str(directory))
+            except BrokenProcessPool:
+                # Процесс пула завершился аварийно (например, по нехватке памяти):
+                # пул создается заново, а его задания отмечены в _finish как failed
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+                future = self._pool().submit(run_job, str(directory))
+            self._futures[job_id] = future
+        future.add_done_callback(lambda done: self._finish(job_id, done))
+        return job_id
+
+    def status(self, job_id: str) -> Optional[dict]:
+        """
+        Возвращает состояние задания.
+
+        Returns:
+            Словарь со state, progress (от 0 до 1), message и итогами
+            завершенного задания, либо None, если задания нет
+        """
+        try:
+            return _read_json(self._job_dir(job_id) / _STATUS_FILE)
+        except FileNotFoundError:
+            return None
+
+    def result_path(self, job_id: str) -> Optional[Path]:
+        """Путь к файлу с аномалиями выполненного задания (None - результата нет)."""
+        status = self.status(job_id)
+        if status is None or status['state'] != 'done':
+            return None
+        return self._job_dir(job_id) / _RESULT_FILE
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Отменяет задание: ожидающее снимается с очереди, выполняемое
+        останавливается на ближайшей проверке между шагами.
+
+        Returns:
+            True, если задание еще не было завершено
+        """
+        status = self.status(job_id)
+        if status is None or status['state'] in FINAL_STATES:
+            return False
+        directory = self._job_dir(job_id)
+        (directory / _CANCEL_FILE).touch()
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None:
+            # Ожидающее задание снимается с очереди (состояние отмечает _finish)
+            future.cancel()
+        return True
+
+    def delete(self, job_id: str) -> bool:
+        """
+        Удаляет завершенное задание вместе с файлами.
+
+        Returns:
+            True, если задание было удалено
+        """
+        status = self.status(job_id)
+        if status is None or status['state'] not in FINAL_STATES:
+            return False
+        shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+        with self._lock:
+            self._futures.pop(job_id, None)
+        return True
+
+    def purge(self, max_age_seconds: float) -> int:
+        """
+        Удаляет завершенные задания старше max_age_seconds.
+
+        Returns:
+            Количество удаленных заданий
+        """
+        if not self.jobs_dir.is_dir():
+            return 0
+        deadline = time.time() - max_age_seconds
+        removed = 0
+        for directory in self.jobs_dir.iterdir():
+            if not _JOB_ID.fullmatch(directory.name):
+                continue
+            status = self.status(directory.name)
+            if status and status['state'] in FINAL_STATES and status.get('finished', 0) < deadline:
+                removed += self.delete(directory.name)
+        return removed
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Останавливает пул процессов (ожидающие задания отменяются)."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        """Пул процессов (создается при первом обращении; вызывается под self._lock)."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def _finish(self, job_id: str, future: Future) -> None:
+        """Отмечает задание, снятое с очереди или завершившееся аварийно вместе с процессом."""
+        if not future.cancelled() and future.exception() is None:
+            return
+        status = self.status(job_id)
+        if status is None or status['state'] in FINAL_STATES:
+            return
+        if future.cancelled():
+            _update_status(self._job_dir(job_id), state='cancelled', message="Отменено", finished=time.time())
+        else:
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool):
+                error = "Процесс обработки завершился аварийно (возможно, не хватило памяти)"
+            else:
+                error = f"{type(error).__name__}: {error}"
+            _update_status(self._job_dir(job_id), state='failed', message="Ошибка", finished=time.time(),
+                           error=error)
+
+    def _job_dir(self, job_id: str) -> Path:
+        """Каталог задания (идентификатор проверяется, чтобы не выйти за пределы каталога)."""
+        if not _JOB_ID.fullmatch(job_id):
+            raise ValueError(f"Некорректный идентификатор задания: {job_id}")
+        return self.jobs_dir / job_id
+
+
+def run_job(job_dir: str) -> None:
+    """
+    Выполняет задание (в процессе-обработчике).
+
+    Прогресс записывается после каждого листа или части столбцов листа;
+    между шагами проверяется отметка об отмене. Ошибка обработки
+    записывается в состояние задания.
+
+    Args:
+        job_dir: Каталог задания
+    """
+    directory = Path(job_dir)
+    spec = _read_json(directory / _SPEC_FILE)
+    source = str(directory / spec['input'])
+    streaming = spec.get('streaming')
+
+    def report(progress: float, message: str) -> None:
+        if (directory / _CANCEL_FILE).exists():
+            raise JobCancelled()
+        _update_status(directory, state='running', progress=round(progress, 4), message=message)
+
+    try:
+        _update_status(directory, started=time.time())
+        report(0.0, "Чтение файла")
+        if spec['sheets']:
+            sheets = spec['sheets']
+            results_by_sheet = {}
+            for number, sheet in enumerate(sheets):
+                report(number / (len(sheets) + 1), f"Лист {sheet} ({number + 1} из {len(sheets)})")
+                if streaming:
+                    results_by_sheet[sheet] = process_file_streaming(source, sheet_name=sheet, method=streaming)
+                else:
+                    df = read_table(source, spec['file_name'], sheet_name=sheet)
+                    results_by_sheet[sheet] = process_frame(df)
+            report(len(sheets) / (len(sheets) + 1), "Запись Excel файла")
+            counts = {f"{sheet}: {result['column']}": result.count
+                      for sheet, results in results_by_sheet.items() for result in results}
+            write = partial(write_workbook_anomalies_excel, results_by_sheet, engine=spec['engine'])
+        else:
+            if streaming:
+                # Лист читается частями; прогресс внутри обработки не сообщается
+                report(0.0, "Потоковая обработка")
+                results = process_file_streaming(source, method=streaming)
+            else:
+                df = read_table(source, spec['file_name'])
+                results = _process_in_steps(df, report)
+            report(1 - 1 / (PROGRESS_STEPS + 2), "Запись Excel файла")
+            counts = {str(result['column']): result.count for result in results}
+            write = partial(write_anomalies_excel, results, engine=spec['engine'])
+
+        temp_path = directory / f"tmp_{_RESULT_FILE}"
+        write(str(temp_path))
+        os.replace(temp_path, directory / _RESULT_FILE)
+    except JobCancelled:
+        _update_status(directory, state='cancelled', message="Отменено", finished=time.time())
+        return
+    except Exception as error:
+        _update_status(directory, state='failed', message="Ошибка", finished=time.time(),
+                       error=f"{type(error).__name__}: {error}")
+        return
+
+    _update_status(directory, state='done', progress=1.0, message="Готово", finished=time.time(),
+                   anomalies=sum(counts.values()), anomalies_by_column=counts)
+
+
+def _process_in_steps(df, report) -> list:
+    """Анализирует столбцы частями, сообщая о прогрессе после каждой части."""
+    columns = numeric_columns(df)
+    step = max(1, math.ceil(len(columns) / PROGRESS_STEPS))
+    total = PROGRESS_STEPS + 2
+    results = []
+    for start in range(0, len(columns), step):
+        report((1 + start / step) / total,
+               f"Столбцы {start + 1}-{min(start + step, len(columns))} из {len(columns)}")
+        results.extend(process_frame(df, columns=columns[start:start + step]))
+    return results
+
+
+def _update_status(directory: Path, **fields) -> None:
+    """Дополняет состояние задания."""
+    status = _read_json(directory / _STATUS_FILE)
+    status.update(fields)
+    _write_json(directory / _STATUS_FILE, status)
+
+
+def _read_json(path: Path) -> dict:
+    """Читает JSON файл."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_json(path: Path, data: dict) -> None:
+    """Записывает JSON файл атомарно: файл заменяется целиком."""
+    temp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp_path, path)
@@ -0,0 +1,295 @@
+"""
+Модуль подготовки данных для графиков.
+
+Браузер плохо справляется с сотнями тысяч точек, поэтому фоновые данные
+перед отправкой прореживаются на сервере до заданного бюджета точек:
+    minmax - ось X делится на равные интервалы, в каждом сохраняются точки
+        с минимальным и максимальным значением (огибающая и выбросы
+        остаются видны);
+    lttb - Largest-Triangle-Three-Buckets (Steinarsson, 2013): из каждой
+        группы соседних точек выбирается точка, образующая наибольший
+        треугольник с соседними группами (сохраняет форму ряда).
+Аномалии не прореживаются - они выводятся отдельным набором точек.
+"""
+
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+DOWNSAMPLE_METHODS = ('minmax', 'lttb')
+
+# Бюджет точек фоновых данных на один график по умолчанию
+DEFAULT_MAX_POINTS = 20_000
+
+# Наибольшее количество групп, выводимых отдельными наборами точек
+DEFAULT_MAX_GROUPS = 20
+
+
+def downsample_positions(x, y, max_points: int = DEFAULT_MAX_POINTS,
+                         method: str = 'minmax') -> np.ndarray:
+    """
+    Выбирает точки ряда для отображения.
+
+    Точки с пропуском по X или Y не отображаются и не выбираются.
+
+    Args:
+        x: Значения по оси X (числа, даты или произвольные метки)
+        y: Значения по оси Y
+        max_points: Максимальное количество выбранных точек
+        method: Метод прореживания ('minmax' или 'lttb')
+
+    Returns:
+        Отсортированные номера выбранных точек (позиции в x и y)
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Неизвестный метод прореживания: {method}. "
+                         f"Доступны: {', '.join(DOWNSAMPLE_METHODS)}")
+
+    x = _as_numeric(x)
+    y = pd.Series(y).to_numpy(dtype=float, na_value=np.nan)
+    valid = np.flatnonzero(~np.isnan(x) & ~np.isnan(y))
+    if valid.size <= max_points:
+        return valid
+    if max_points < 2:
+        raise ValueError("max_points должен быть не меньше 2")
+
+    order = valid[np.argsort(x[valid], kind='stable')]
+    if method == 'lttb':
+        selected = _lttb(x[order], y[order], max_points)
+    else:
+        selected = _minmax(x[order], y[order], max_points // 2)
+    return np.sort(order[selected])
+
+
+def band_positions(x, lower, upper, max_points=None) -> np.ndarray:
+    """
+    Выбирает точки для отображения полосы порогов, упорядоченные по оси X.
+
+    Args:
+        x: Значения по оси X
+        lower: Нижние пороги строк
+        upper: Верхние пороги строк
+        max_points: Максимальное количество точек полосы (None - все); точки
+            общие для обеих границ, поэтому каждая граница получает не
+            больше max_points точек
+
+    Returns:
+        Номера точек, где определены оба порога, в порядке возрастания X
+    """
+    numeric_x = _as_numeric(x)
+    lower = np.asarray(lower, dtype=float)
+    upper = np.asarray(upper, dtype=float)
+    positions = np.flatnonzero(~np.isnan(numeric_x) & ~np.isnan(lower) & ~np.isnan(upper))
+    if max_points is not None and positions.size > max_points:
+        # Каждая граница прореживается до половины бюджета с сохранением
+        # формы (LTTB); объединение при необходимости прореживается равномерно
+        half = max(2, max_points // 2)
+        selected = np.union1d(downsample_positions(numeric_x[positions], lower[positions], half, 'lttb'),
+                              downsample_positions(numeric_x[positions], upper[positions], half, 'lttb'))
+        if selected.size > max_points:
+            selected = selected[np.linspace(0, selected.size - 1, max_points).round().astype(np.int64)]
+        positions = positions[selected]
+    return positions[np.argsort(numeric_x[positions], kind='stable')]
+
+
+def split_budget(sizes: Sequence[int], max_points: int) -> np.ndarray:
+    """
+    Делит бюджет точек между рядами пропорционально их размеру.
+
+    Сумма бюджетов не превышает max_points, и ни один ряд не получает
+    больше точек, чем в нем есть. Если бюджета хватает, каждый ряд сначала
+    получает до 2 точек (минимум для прореживания), остаток делится
+    пропорционально оставшимся точкам.
+
+    Args:
+        sizes: Количество точек в каждом ряду
+        max_points: Общий бюджет точек
+
+    Returns:
+        Бюджет каждого ряда
+    """
+    sizes = np.asarray(sizes, dtype=np.int64)
+    budgets = np.minimum(sizes, 2)
+    if budgets.sum() > max_points:
+        budgets = np.zeros_like(sizes)
+    remaining = max_points - budgets.sum()
+    extra = sizes - budgets
+    total = extra.sum()
+    if total > 0:
+        budgets = budgets + np.minimum(extra, np.floor(remaining * extra / total).astype(np.int64))
+    return budgets.astype(int)
+
+
+def band_share(size: int, budget: Optional[int]) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Делит бюджет ряда между точками данных и полосой порогов.
+
+    Полоса - две границы с общими точками, поэтому бюджет делится
+    split_budget на три доли: одна - данным, две - полосе (по одной на
+    границу).
+
+    Args:
+        size: Количество точек ряда
+        budget: Бюджет точек ряда (None - без прореживания)
+
+    Returns:
+        (бюджет данных, количество точек полосы); без бюджета - (None, None)
+    """
+    if budget is None:
+        return None, None
+    data_budget, band_budget = split_budget([size, 2 * size], budget)
+    return int(data_budget), int(band_budget) // 2
+
+
+def trace_budgets(sizes: Sequence[int], max_points: Optional[int],
+                  bands: Sequence[bool]) -> List[Tuple[Optional[int], Optional[int]]]:
+    """
+    Распределяет бюджет точек графика между рядами и их полосами порогов.
+
+    Бюджет делится между рядами split_budget, а внутри ряда с полосой -
+    между данными и полосой band_share. Без бюджета точки не прореживаются
+    и выводятся в SVG, с бюджетом - через WebGL.
+
+    Args:
+        sizes: Количество точек каждого ряда
+        max_points: Бюджет точек графика (None или 0 - без прореживания)
+        bands: Выводится ли у ряда полоса порогов
+
+    Returns:
+        Для каждого ряда (бюджет данных, количество точек полосы); None -
+        все точки, бюджет данных 0 - данные ряда не выводятся
+    """
+    if not max_points:
+        return [(None, None)] * len(sizes)
+    return [band_share(size, int(budget)) if band else (int(budget), None)
+            for size, budget, band in zip(sizes, split_budget(sizes, max_points), bands)]
+
+
+def limit_groups(groups: List[Tuple[tuple, np.ndarray, np.ndarray]],
+                 max_groups: int = DEFAULT_MAX_GROUPS) -> List[Tuple[Optional[tuple], np.ndarray, np.ndarray]]:
+    """
+    Ограничивает количество групп, выводимых отдельными наборами точек.
+
+    Каждая группа - отдельный набор точек (trace) графика, и десятки тысяч
+    наборов замораживают браузер. Крупнейшие max_groups - 1 групп остаются
+    отдельными (в исходном порядке), остальные объединяются в одну группу.
+
+    Args:
+        groups: Результат split_by_group
+        max_groups: Наибольшее количество групп в результате
+
+    Returns:
+        Список в формате split_by_group; у объединенной группы (последней)
+        ключ None
+    """
+    if len(groups) <= max_groups:
+        return groups
+    sizes = np.array([len(positions) for _, positions, _ in groups])
+    kept = np.sort(np.argsort(-sizes, kind='stable')[:max_groups - 1])
+    merged = np.setdiff1d(np.arange(len(groups)), kept)
+    return [groups[index] for index in kept] + [(
+        None,
+        np.sort(np.concatenate([groups[index][1] for index in merged])),
+        np.sort(np.concatenate([groups[index][2] for index in merged])),
+    )]
+
+
+def split_by_group(data: pd.DataFrame,
+                   anomalies: pd.DataFrame,
+                   group_columns: List[str]) -> List[Tuple[tuple, np.ndarray, np.ndarray]]:
+    """
+    Делит данные и аномалии на группы за один проход.
+
+    Номера групп вычисляются один раз (``groupby().ngroup()``), аномалии
+    сопоставляются группам хеш-соединением по ключам, после чего обе
+    таблицы раскладываются по группам одной стабильной сортировкой. Порядок
+    и названия групп совпадают с обходом ``data.groupby(group_columns)``;
+    строки с пропусками в ключах, как и в ``groupby``, не попадают ни в
+    одну группу.
+
+    Args:
+        data: Данные для графика
+        anomalies: Аномалии (строки с теми же столбцами группировки)
+        group_columns: Список столбцов для группировки
+
+    Returns:
+        Список кортежей (ключ группы, позиции строк группы в data,
+        позиции аномалий группы в anomalies)
+    """
+    grouped = data.groupby(group_columns, sort=True, observed=True)
+    codes = grouped.ngroup().to_numpy()
+    keys = grouped.size().index
+    if len(group_columns) == 1:
+        anomaly_keys = pd.Index(anomalies[group_columns[0]])
+    else:
+        anomaly_keys = pd.MultiIndex.from_frame(anomalies[group_columns])
+    anomaly_codes = keys.get_indexer(anomaly_keys)
+
+    names = [key if isinstance(key, tuple) else (key,) for key in keys]
+    return list(zip(names,
+                    _split_positions(codes, len(keys)),
+                    _split_positions(anomaly_codes, len(keys))))
+
+
+def _split_positions(codes: np.ndarray, n_groups: int) -> List[np.ndarray]:
+    """Раскладывает позиции строк по номерам групп (NaN и -1 - без группы)."""
+    codes = np.asarray(codes, dtype=float)
+    positions = np.flatnonzero(~np.isnan(codes) & (codes >= 0))
+    group_codes = codes[positions].astype(np.int64)
+    order = np.argsort(group_codes, kind='stable')
+    counts = np.bincount(group_codes, minlength=n_groups)
+    return np.split(positions[order], np.cumsum(counts)[:-1])
+
+
+def _as_numeric(x) -> np.ndarray:
+    """Приводит значения оси X к float (даты - к наносекундам, метки - к номерам)."""
+    x = pd.Series(x)
+    if pd.api.types.is_datetime64_any_dtype(x):
+        values = x.to_numpy(dtype='datetime64[ns]')
+        result = values.view('int64').astype(float)
+        result[np.isnat(values)] = np.nan
+        return result
+    if pd.api.types.is_numeric_dtype(x) and not pd.api.types.is_bool_dtype(x):
+        return x.to_numpy(dtype=float, na_value=np.nan)
+    # Нечисловые метки отображаются по порядку следования
+    return np.arange(len(x), dtype=float)
+
+
+def _minmax(x: np.ndarray, y: np.ndarray, n_bins: int) -> np.ndarray:
+    """Номера точек с минимумом и максимумом Y в каждом из n_bins интервалов X."""
+    span = x[-1] - x[0]
+    if span > 0:
+        bins = np.minimum(((x - x[0]) / span * n_bins).astype(np.int64), n_bins - 1)
+    else:
+        bins = np.zeros(x.size, dtype=np.int64)
+
+    order = np.lexsort((y, bins))
+    sorted_bins = bins[order]
+    starts = np.flatnonzero(np.r_[True, sorted_bins[1:] != sorted_bins[:-1]])
+    ends = np.r_[starts[1:], order.size] - 1
+    return np.unique(np.concatenate([order[starts], order[ends]]))
+
+
+def _lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Номера n_out точек, выбранных методом LTTB (x отсортирован по возрастанию)."""
+    n = x.size
+    if n_out < 3:
+        return np.array([0, n - 1])
+
+    # Первая и последняя точки сохраняются, остальные делятся на n_out - 2 группы
+    edges = np.r_[np.linspace(1, n - 1, n_out - 1).astype(np.int64), n]
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    anchor = 0
+    for bucket in range(n_out - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_stop = edges[bucket + 2]
+        average_x = x[stop:next_stop].mean()
+        average_y = y[stop:next_stop].mean()
+        areas = np.abs((x[anchor] - average_x) * (y[start:stop] - y[anchor])
+                       - (x[anchor] - x[start:stop]) * (average_y - y[anchor]))
+        anchor = start + int(np.argmax(areas))
+        selected[bucket + 1] = anchor
+    return selected
@@ -1,7 +1,10 @@
 import pandas as pd
 import numpy as np
 import pytest
-from anomaly_detection import calculate_stats, detect_anomalies
+from anomaly_detection import (
+    calculate_stats, calculate_group_stats, calculate_rolling_stats, calculate_seasonal_stats,
+    calculate_stats_batch, detect_anomalies, detect_anomalies_matrix, seasonal_keys, seasonal_thresholds
+)
 
 
 @pytest.fixture
@@ -63,6 +66,25 @@ class TestCalculateStats:
         assert q3 == 17.5
         assert iqr == 5.0
     
+    def test_calculate_stats_sketch(self, data_with_multiple_outliers):
+        """Метод 'sketch' на небольших данных совпадает с точным расчетом."""
+        exact = calculate_stats(data_with_multiple_outliers, 'value')
+        approximate = calculate_stats(data_with_multiple_outliers, 'value', method='sketch')
+
+        assert approximate == pytest.approx(exact)
+
+    def test_calculate_stats_sketch_is_deterministic(self):
+        """Метод 'sketch' дает одни и те же квартили при повторных расчетах."""
+        df = pd.DataFrame({'value': np.random.default_rng(3).lognormal(size=20_000)})
+        first = calculate_stats(df, 'value', method='sketch', sketch_k=50)
+
+        assert calculate_stats(df, 'value', method='sketch', sketch_k=50) == first
+
+    def test_calculate_stats_unknown_method(self, sample_data):
+        """Неизвестный метод расчета вызывает ошибку."""
+        with pytest.raises(ValueError):
+            calculate_stats(sample_data, 'value', method='median')
+
     def test_calculate_stats_with_nan(self):
         """Проверяем работу с NaN значениями."""
         data = pd.DataFrame({'value': [10, np.nan, 12, 13, 14, np.nan, 16]})
@@ -217,4 +239,298 @@ class TestEdgeCases:
         
         # Проверяем, что функция работает корректно с отрицательными числами
         assert isinstance(iqr, (int, float))
-        assert isinstance(len(anomalies), int)
\ No newline at end of file
+        assert isinstance(len(anomalies), int)
+
+
+def _detect_grouped_reference(data, column, lower_threshold, upper_threshold, group_columns):
+    """Прежняя реализация: обход групп и накопление через pd.concat."""
+    anomalies = pd.DataFrame()
+    for _, group in data.groupby(group_columns):
+        group_anomalies = group[(group[column] < lower_threshold) |
+                                (group[column] > upper_threshold)]
+        anomalies = pd.concat([anomalies, group_anomalies])
+    return anomalies
+
+
+@pytest.fixture
+def grouped_data():
+    """Фикстура с большим числом групп, пропусками и перемешанным индексом."""
+    rng = np.random.default_rng(42)
+    n = 2000
+    data = pd.DataFrame({
+        'store': rng.choice(['s1', 's2', 's3', None], size=n),
+        'sku': rng.integers(0, 50, size=n),
+        'value': rng.normal(100, 10, size=n),
+    })
+    data.loc[rng.choice(n, 100, replace=False), 'value'] = np.nan
+    data.loc[rng.choice(n, 50, replace=False), 'value'] = 500
+    data.index = rng.permutation(n) * 3
+    return data
+
+
+class TestGroupedDetection:
+    """Регрессионные тесты векторизованного обнаружения с группировкой."""
+
+    @pytest.mark.parametrize('group_columns', [['store'], ['sku'], ['store', 'sku']])
+    def test_matches_reference(self, grouped_data, group_columns):
+        """Результат совпадает с поочередным обходом групп: те же строки в том же порядке."""
+        expected = _detect_grouped_reference(grouped_data, 'value', 80, 120, group_columns)
+        result = detect_anomalies(grouped_data, 'value', 80, 120, group_columns=group_columns)
+
+        pd.testing.assert_frame_equal(result, expected)
+
+    def test_matches_reference_with_selected_categories(self, grouped_data):
+        """Фильтрация по категориям сохраняет совпадение с прежней реализацией."""
+        selected = {'store': ['s1', 's3']}
+        filtered = grouped_data[grouped_data['store'].isin(selected['store'])]
+        expected = _detect_grouped_reference(filtered, 'value', 80, 120, ['store', 'sku'])
+        result = detect_anomalies(grouped_data, 'value', 80, 120,
+                                  group_columns=['store', 'sku'],
+                                  selected_categories=selected)
+
+        pd.testing.assert_frame_equal(result, expected)
+
+
+class TestGroupStats:
+    """Тесты для порогов, рассчитанных отдельно по группам."""
+
+    def test_calculate_group_stats_matches_per_group(self, grouped_data):
+        """Статистика каждой группы совпадает с calculate_stats по этой группе."""
+        stats = calculate_group_stats(grouped_data, 'value', ['store', 'sku'])
+
+        for key, group in grouped_data.groupby(['store', 'sku']):
+            iqr, q1, q3 = calculate_stats(group, 'value')
+            assert stats.loc[key, 'Q1'] == pytest.approx(q1)
+            assert stats.loc[key, 'Q3'] == pytest.approx(q3)
+            assert stats.loc[key, 'IQR'] == pytest.approx(iqr)
+
+    def test_detect_with_group_thresholds(self):
+        """Каждая группа проверяется по собственным порогам."""
+        data = pd.DataFrame({
+            'value': [1, 2, 3, 2, 9, 100, 101, 102, 101, 90],
+            'category': ['A'] * 5 + ['B'] * 5
+        })
+        stats = calculate_group_stats(data, 'value', ['category'])
+        lower = stats['Q1'] - 1.5 * stats['IQR']
+        upper = stats['Q3'] + 1.5 * stats['IQR']
+
+        anomalies = detect_anomalies(data, 'value', lower, upper, group_columns=['category'])
+
+        # При глобальных порогах ни 9, ни 90 не выделялись бы
+        assert sorted(anomalies['value'].tolist()) == [9, 90]
+
+    def test_group_thresholds_match_loop(self, grouped_data):
+        """Векторизованное применение порогов совпадает с обходом групп."""
+        group_columns = ['store', 'sku']
+        stats = calculate_group_stats(grouped_data, 'value', group_columns)
+        lower = stats['Q1'] - 1.5 * stats['IQR']
+        upper = stats['Q3'] + 1.5 * stats['IQR']
+
+        expected = pd.concat([
+            detect_anomalies(group, 'value', lower[key], upper[key])
+            for key, group in grouped_data.groupby(group_columns)
+        ])
+        result = detect_anomalies(grouped_data, 'value', lower, upper, group_columns=group_columns)
+
+        pd.testing.assert_frame_equal(result, expected)
+
+    def test_categorical_group_columns(self, grouped_data):
+        """Столбцы category (после optimize_dtypes) дают те же аномалии; пустые категории не мешают."""
+        group_columns = ['store', 'sku']
+        categorical = grouped_data.astype({'store': pd.CategoricalDtype(['s0', 's1', 's2', 's3']),
+                                           'sku': 'category'})
+
+        stats = calculate_group_stats(grouped_data, 'value', group_columns)
+        categorical_stats = calculate_group_stats(categorical, 'value', group_columns)
+        expected = detect_anomalies(grouped_data, 'value', stats['Q1'] - 1.5 * stats['IQR'],
+                                    stats['Q3'] + 1.5 * stats['IQR'], group_columns)
+        result = detect_anomalies(categorical, 'value',
+                                  categorical_stats['Q1'] - 1.5 * categorical_stats['IQR'],
+                                  categorical_stats['Q3'] + 1.5 * categorical_stats['IQR'], group_columns)
+
+        assert len(categorical_stats) == len(stats)
+        assert result.index.tolist() == expected.index.tolist()
+
+    def test_group_thresholds_require_group_columns(self, sample_data):
+        """Пороги по группам без group_columns недопустимы."""
+        stats = calculate_group_stats(sample_data, 'value', ['category'])
+
+        with pytest.raises(ValueError):
+            detect_anomalies(sample_data, 'value', stats['Q1'], stats['Q3'])
+
+
+class TestBatchStats:
+    """Тесты для пакетного расчета статистики по нескольким столбцам."""
+
+    @pytest.fixture
+    def wide_data(self):
+        rng = np.random.default_rng(7)
+        data = pd.DataFrame({
+            'ints': rng.integers(0, 100, size=200),
+            'floats': rng.normal(size=200),
+            'sparse': np.where(rng.random(200) < 0.3, np.nan, rng.normal(size=200)),
+            'label': ['x'] * 200,
+        })
+        data.loc[[3, 50], 'ints'] = 1000
+        return data
+
+    def test_calculate_stats_batch_matches_single(self, wide_data):
+        """Пакетная статистика совпадает с calculate_stats для каждого столбца."""
+        stats = calculate_stats_batch(wide_data)
+
+        assert list(stats.index) == ['ints', 'floats', 'sparse']
+        for column in stats.index:
+            iqr, q1, q3 = calculate_stats(wide_data, column)
+            assert stats.loc[column, 'IQR'] == iqr
+            assert stats.loc[column, 'Q1'] == q1
+            assert stats.loc[column, 'Q3'] == q3
+
+    def test_detect_anomalies_matrix_matches_single(self, wide_data):
+        """Каждый столбец матрицы совпадает с маской detect_anomalies."""
+        columns = ['ints', 'floats', 'sparse']
+        stats = calculate_stats_batch(wide_data, columns)
+        lower = stats['Q1'] - 1.5 * stats['IQR']
+        upper = stats['Q3'] + 1.5 * stats['IQR']
+
+        mask = detect_anomalies_matrix(wide_data, columns, lower, upper)
+
+        assert mask.shape == (len(wide_data), len(columns))
+        for position, column in enumerate(columns):
+            expected = detect_anomalies(wide_data, column, lower[column], upper[column])
+            pd.testing.assert_frame_equal(wide_data[mask[:, position]], expected)
+
+
+@pytest.fixture
+def timestamped_data():
+    """Создает неупорядоченные по времени данные с группами и пропусками дат."""
+    rng = np.random.default_rng(5)
+    n = 400
+    data = pd.DataFrame({
+        'date': pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 30 * 24, n), unit='h'),
+        'store': rng.choice(['s1', 's2', 's3'], n),
+        'value': rng.normal(100, 10, n),
+    }, index=rng.permutation(10 * n)[:n])
+    data.iloc[[3, 7], 0] = pd.NaT
+    return data
+
+
+def _rolling_reference(data, column, date_column, window, group_columns=None):
+    """Квартили окна каждой строки, рассчитанные перебором строк."""
+    q1 = pd.Series(np.nan, index=data.index)
+    q3 = pd.Series(np.nan, index=data.index)
+    width = pd.Timedelta(window)
+    for label, row in data.iterrows():
+        if pd.isna(row[date_column]):
+            continue
+        in_window = ((data[date_column] > row[date_column] - width) &
+                     (data[date_column] <= row[date_column]))
+        for group_column in group_columns or []:
+            in_window &= data[group_column] == row[group_column]
+        q1[label] = data.loc[in_window, column].quantile(0.25)
+        q3[label] = data.loc[in_window, column].quantile(0.75)
+    return q1, q3
+
+
+class TestRollingStats:
+    """Тесты для функции calculate_rolling_stats."""
+
+    @pytest.mark.parametrize('group_columns', [None, ['store']])
+    def test_matches_reference(self, timestamped_data, group_columns):
+        """Тест: квартили совпадают с перебором окон, индекс - как у данных."""
+        stats = calculate_rolling_stats(timestamped_data, 'value', 'date', '3D', group_columns)
+        q1, q3 = _rolling_reference(timestamped_data, 'value', 'date', '3D', group_columns)
+
+        assert stats.index.equals(timestamped_data.index)
+        np.testing.assert_allclose(stats['Q1'], q1)
+        np.testing.assert_allclose(stats['Q3'], q3)
+        np.testing.assert_allclose(stats['IQR'], q3 - q1)
+
+    def test_expanding_window(self, timestamped_data):
+        """Тест: у последней строки нарастающего окна квартили всей истории."""
+        stats = calculate_rolling_stats(timestamped_data, 'value', 'date', expanding=True)
+        last = timestamped_data['date'].idxmax()
+        values = timestamped_data.loc[timestamped_data['date'] <= timestamped_data.loc[last, 'date'], 'value']
+        assert stats.loc[last, 'Q1'] == pytest.approx(values.quantile(0.25))
+
+    def test_row_thresholds_in_detect_anomalies(self, timestamped_data):
+        """Тест обнаружения по порогам строк, в том числе с фильтром категорий."""
+        data = timestamped_data.copy()
+        data.loc[data.index[10], 'value'] = 1000.0
+        stats = calculate_rolling_stats(data, 'value', 'date', '7D', ['store'], min_periods=5)
+        lower = (stats['Q1'] - 1.5 * stats['IQR']).to_numpy()
+        upper = (stats['Q3'] + 1.5 * stats['IQR']).to_numpy()
+
+        anomalies = detect_anomalies(data, 'value', lower, upper)
+        expected = data[(data['value'] < lower) | (data['value'] > upper)]
+        pd.testing.assert_frame_equal(anomalies, expected)
+        assert data.index[10] in anomalies.index
+
+        store = data.loc[data.index[10], 'store']
+        grouped = detect_anomalies(data, 'value', lower, upper, ['store'], {'store': [store]})
+        assert set(grouped.index) == set(expected.index[expected['store'] == store])
+
+
+@pytest.fixture
+def hourly_load():
+    """Создает почасовую нагрузку с суточной сезонностью и одним выбросом."""
+    rng = np.random.default_rng(11)
+    dates = pd.date_range('2023-01-02', periods=24 * 7 * 8, freq='h')
+    data = pd.DataFrame({
+        'date': dates,
+        'region': rng.choice(['north', 'south'], len(dates)),
+        # Ночью нагрузка около 10, днем - около 100
+        'load': np.where((dates.hour >= 8) & (dates.hour < 20), 100.0, 10.0) + rng.uniform(-2, 2, len(dates)),
+    })
+    # Дневное значение ночью - выброс только для своего часа
+    data.loc[3, 'load'] = 100.0
+    return data
+
+
+class TestSeasonalStats:
+    """Тесты для сезонных порогов по календарным интервалам."""
+
+    @pytest.mark.parametrize('bucket, expected', [
+        ('hour', [0, 13]),
+        ('weekday', [0, 6]),
+        ('hour_of_week', [0, 6 * 24 + 13]),
+        ('day_of_month', [2, 8]),
+        ('month', [1, 1]),
+    ])
+    def test_keys(self, bucket, expected):
+        """Тест номеров календарных интервалов."""
+        data = pd.DataFrame({'date': pd.to_datetime(['2023-01-02 00:00', '2023-01-08 13:30', None])})
+        keys = seasonal_keys(data, 'date', bucket)
+        assert keys[bucket].iloc[:2].tolist() == expected
+        assert keys[bucket].isna().iloc[2]
+
+    def test_stats_match_group_stats(self, hourly_load):
+        """Тест: статистика интервалов совпадает с calculate_group_stats по явному столбцу часа."""
+        stats = calculate_seasonal_stats(hourly_load, 'load', 'date', 'hour', ['region'])
+        reference = calculate_group_stats(hourly_load.assign(hour=hourly_load['date'].dt.hour),
+                                          'load', ['region', 'hour'])
+        assert list(stats.index.names) == ['region', 'hour']
+        np.testing.assert_allclose(stats.to_numpy(), reference.to_numpy())
+
+    def test_seasonality_is_not_anomaly(self, hourly_load):
+        """Тест: сезонные пороги находят ночной выброс, а общие - нет."""
+        stats = calculate_seasonal_stats(hourly_load, 'load', 'date', 'hour')
+        lower, upper = seasonal_thresholds(hourly_load, stats, 'date', 'hour')
+        anomalies = detect_anomalies(hourly_load, 'load', lower, upper)
+        assert anomalies.index.tolist() == [3]
+
+        iqr, q1, q3 = calculate_stats(hourly_load, 'load')
+        assert detect_anomalies(hourly_load, 'load', q1 - 1.5 * iqr, q3 + 1.5 * iqr).empty
+
+    def test_rows_without_date_or_stats(self, hourly_load):
+        """Тест: строки без даты и интервалы без статистики получают NaN."""
+        stats = calculate_seasonal_stats(hourly_load, 'load', 'date', 'hour')
+        data = hourly_load.head(3).copy()
+        data.loc[0, 'date'] = pd.NaT
+        lower, upper = seasonal_thresholds(data, stats.drop(index=1), 'date', 'hour')
+        assert np.isnan(lower[0]) and np.isnan(upper[1])
+        assert not np.isnan(lower[2])
+
+    def test_invalid_bucket(self, hourly_load):
+        """Тест ошибки для неизвестного интервала."""
+        with pytest.raises(ValueError):
+            calculate_seasonal_stats(hourly_load, 'load', 'date', 'week')
@@ -2,7 +2,14 @@ import pandas as pd
 import pytest
 import tempfile
 import os
-from anomaly_processor import process_file, display_results, create_anomalies_excel
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+import anomaly_processor
+from baseline_store import BaselineStore, group_token
+from anomaly_processor import (
+    process_file, process_file_streaming, process_frame, process_incremental, process_workbook,
+    display_results, create_anomalies_excel, create_workbook_anomalies_excel
+)
 
 
 @pytest.fixture
@@ -81,6 +88,55 @@ class TestProcessFile:
         assert len(humidity_anomalies) >= 1  # Должны найти как минимум 200
         assert 200 in humidity_anomalies['humidity'].values
     
+    def test_process_file_csv(self, test_excel_file, tmp_path):
+        """Проверяет, что CSV файл обрабатывается так же, как Excel."""
+        csv_path = tmp_path / 'data.csv'
+        pd.read_excel(test_excel_file).to_csv(csv_path, index=False)
+
+        expected = process_file(test_excel_file)
+        results = process_file(str(csv_path))
+
+        assert [r['column'] for r in results] == [r['column'] for r in expected]
+        for result, expected_result in zip(results, expected):
+            assert result['lower_threshold'] == expected_result['lower_threshold']
+            assert len(result['anomalies']) == len(expected_result['anomalies'])
+
+    @pytest.mark.parametrize('source_type', ['dataframe', 'bytes', 'stream'])
+    def test_process_file_in_memory(self, test_excel_file, source_type):
+        """Проверяет обработку уже загруженной таблицы, байтов и потока без записи на диск."""
+        expected = process_file(test_excel_file)
+        with open(test_excel_file, 'rb') as f:
+            file_bytes = f.read()
+        source = {
+            'dataframe': pd.read_excel(test_excel_file),
+            'bytes': file_bytes,
+            'stream': pd.io.common.BytesIO(file_bytes),
+        }[source_type]
+
+        results = process_file(source, file_name='data.xlsx')
+
+        assert [r['column'] for r in results] == [r['column'] for r in expected]
+        for result, expected_result in zip(results, expected):
+            pd.testing.assert_frame_equal(result['anomalies'], expected_result['anomalies'])
+
+    def test_process_file_dataframe_columns(self, test_excel_file):
+        """Проверяет выбор столбцов уже загруженной таблицы."""
+        results = process_file(pd.read_excel(test_excel_file), columns=['humidity'])
+
+        assert [r['column'] for r in results] == ['humidity']
+
+    def test_process_file_batch_matches_serial(self, test_excel_file):
+        """Проверяет, что пакетный режим дает те же результаты, что и поочередный."""
+        batch_results = process_file(test_excel_file, batch=True)
+        serial_results = process_file(test_excel_file, batch=False)
+
+        assert len(batch_results) == len(serial_results)
+        for batch_result, serial_result in zip(batch_results, serial_results):
+            assert batch_result['column'] == serial_result['column']
+            assert batch_result['lower_threshold'] == serial_result['lower_threshold']
+            assert batch_result['upper_threshold'] == serial_result['upper_threshold']
+            pd.testing.assert_frame_equal(batch_result['anomalies'], serial_result['anomalies'])
+
     def test_process_file_empty_excel(self):
         """Проверяет обработку пустого файла."""
         # Создаем пустой Excel файл
@@ -114,6 +170,192 @@ class TestProcessFile:
             os.unlink(temp_name)
 
 
+class TestProcessFrameParallel:
+    """Тесты для параллельной обработки столбцов."""
+
+    @pytest.fixture
+    def wide_frame(self):
+        rng = np.random.default_rng(3)
+        frame = pd.DataFrame(rng.normal(size=(500, 7)), columns=[f'sensor_{i}' for i in range(7)])
+        frame['ints'] = rng.integers(0, 100, size=500)
+        frame['label'] = 'x'
+        frame.loc[rng.choice(500, 40, replace=False), 'sensor_3'] = np.nan
+        frame.index = frame.index * 2
+        return frame
+
+    def test_parallel_matches_serial(self, wide_frame, monkeypatch):
+        """Проверяет, что параллельная обработка дает те же результаты."""
+        monkeypatch.setattr(anomaly_processor, 'PARALLEL_MIN_CELLS', 0)
+        expected = process_frame(wide_frame)
+        results = process_frame(wide_frame, workers=3)
+
+        assert [r['column'] for r in results] == [r['column'] for r in expected]
+        for result, expected_result in zip(results, expected):
+            assert result['lower_threshold'] == expected_result['lower_threshold']
+            assert result['upper_threshold'] == expected_result['upper_threshold']
+            pd.testing.assert_frame_equal(result['anomalies'], expected_result['anomalies'])
+
+    def test_small_frame_falls_back_to_serial(self, wide_frame, monkeypatch):
+        """Проверяет, что небольшие таблицы обрабатываются без запуска процессов."""
+        def fail(*args, **kwargs):
+            raise AssertionError("Параллельная обработка не должна запускаться")
+
+        monkeypatch.setattr(anomaly_processor, '_process_columns_parallel', fail)
+        results = process_frame(wide_frame, workers=4)
+
+        assert len(results) == 8
+
+
+@pytest.fixture
+def test_workbook_file():
+    """Создает временный Excel файл с несколькими листами (по листу на завод)."""
+    with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as tmp:
+        temp_name = tmp.name
+    with pd.ExcelWriter(temp_name) as writer:
+        for plant, spike in [('Plant1', 50), ('Plant2', 500), ('Plant3', -100)]:
+            pd.DataFrame({
+                'date': pd.date_range('2023-01-01', periods=8),
+                'load': [20, 22, 21, spike, 19, 18, 20, 21],
+                'shift': ['A', 'B'] * 4
+            }).to_excel(writer, sheet_name=plant, index=False)
+    yield temp_name
+    os.unlink(temp_name)
+
+
+class TestProcessWorkbook:
+    """Тесты для обработки нескольких листов Excel файла."""
+
+    def test_all_sheets(self, test_workbook_file):
+        """Проверяет, что обрабатываются все листы и результаты привязаны к листам."""
+        results = process_workbook(test_workbook_file)
+
+        assert list(results) == ['Plant1', 'Plant2', 'Plant3']
+        assert results['Plant2'][0]['anomalies']['load'].tolist() == [500]
+        assert results['Plant3'][0]['anomalies']['load'].tolist() == [-100]
+
+    def test_selected_sheets(self, test_workbook_file):
+        """Проверяет обработку выбранных листов через process_file."""
+        results = process_file(test_workbook_file, sheets=['Plant3', 'Plant1'])
+
+        assert list(results) == ['Plant3', 'Plant1']
+
+    def test_parallel_matches_serial(self, test_workbook_file):
+        """Проверяет, что параллельная обработка листов дает те же результаты."""
+        expected = process_workbook(test_workbook_file)
+        results = process_file(test_workbook_file, sheets='all', workers=2)
+
+        assert list(results) == list(expected)
+        for sheet in expected:
+            for result, expected_result in zip(results[sheet], expected[sheet]):
+                pd.testing.assert_frame_equal(result['anomalies'], expected_result['anomalies'])
+
+    def test_sheets_from_bytes(self, test_workbook_file):
+        """Проверяет обработку листов из байтов файла, в том числе параллельную."""
+        expected = process_workbook(test_workbook_file)
+        with open(test_workbook_file, 'rb') as f:
+            file_bytes = f.read()
+
+        for workers in (1, 2):
+            results = process_file(file_bytes, sheets='all', workers=workers)
+            assert list(results) == list(expected)
+            for sheet in expected:
+                for result, expected_result in zip(results[sheet], expected[sheet]):
+                    pd.testing.assert_frame_equal(result['anomalies'], expected_result['anomalies'])
+
+    def test_bytes_are_passed_to_workers_as_file(self, test_workbook_file, monkeypatch):
+        """Проверяет, что процессам передается путь к временному файлу, а не байты."""
+        sources = []
+
+        class RecordingExecutor(ThreadPoolExecutor):
+            def __init__(self, max_workers, mp_context):
+                super().__init__(max_workers)
+
+            def submit(self, function, source, *args):
+                sources.append(source)
+                return super().submit(function, source, *args)
+
+        monkeypatch.setattr(anomaly_processor, 'ProcessPoolExecutor', RecordingExecutor)
+        with open(test_workbook_file, 'rb') as f:
+            results = process_file(f.read(), sheets='all', workers=2, file_name='book.xlsx')
+
+        assert list(results) == list(process_workbook(test_workbook_file))
+        assert len(set(sources)) == 1 and isinstance(sources[0], str)
+        assert sources[0].endswith('.xlsx')
+        assert not os.path.exists(sources[0])
+
+    def test_sheets_with_dataframe(self, test_workbook_file):
+        """Проверяет, что листы нельзя выбрать у DataFrame."""
+        with pytest.raises(ValueError):
+            process_file(pd.read_excel(test_workbook_file), sheets='all')
+
+    def test_unknown_sheet(self, test_workbook_file):
+        """Проверяет, что неизвестный лист вызывает ошибку."""
+        with pytest.raises(ValueError):
+            process_workbook(test_workbook_file, sheets=['Plant9'])
+
+    @pytest.mark.parametrize('engine', ['openpyxl', 'xlsxwriter'])
+    def test_combined_export(self, test_workbook_file, engine):
+        """Проверяет, что общий файл содержит по листу на каждый исходный лист."""
+        results = process_workbook(test_workbook_file)
+
+        excel_data = create_workbook_anomalies_excel(results, engine=engine)
+        sheets = pd.read_excel(pd.io.common.BytesIO(excel_data), sheet_name=None)
+
+        assert list(sheets) == ['Plant1', 'Plant2', 'Plant3']
+        assert sheets['Plant2']['Anomaly'].tolist() == ['500 load']
+
+
+class TestProcessFileStreaming:
+    """Тесты для потоковой обработки файла."""
+
+    @pytest.mark.parametrize('chunk_size', [1, 3, 100])
+    def test_streaming_matches_process_file(self, test_excel_file, chunk_size):
+        """Проверяет, что потоковая обработка совпадает с обычной."""
+        expected = process_file(test_excel_file)
+        results = process_file_streaming(test_excel_file, chunk_size=chunk_size)
+
+        assert [r['column'] for r in results] == [r['column'] for r in expected]
+        for result, expected_result in zip(results, expected):
+            assert result['lower_threshold'] == expected_result['lower_threshold']
+            assert result['upper_threshold'] == expected_result['upper_threshold']
+            pd.testing.assert_frame_equal(result['anomalies'], expected_result['anomalies'],
+                                          check_dtype=False)
+
+    def test_streaming_sketch_matches_exact(self, test_excel_file):
+        """Проверяет, что на небольших данных скетчи дают те же аномалии."""
+        expected = process_file_streaming(test_excel_file, chunk_size=3)
+        results = process_file_streaming(test_excel_file, chunk_size=3, method='sketch')
+
+        for result, expected_result in zip(results, expected):
+            assert result['lower_threshold'] == pytest.approx(expected_result['lower_threshold'])
+            assert result['upper_threshold'] == pytest.approx(expected_result['upper_threshold'])
+            pd.testing.assert_frame_equal(result['anomalies'], expected_result['anomalies'])
+
+    def test_streaming_sketch_is_deterministic(self, tmp_path):
+        """Проверяет, что скетчи дают одни и те же аномалии при повторной обработке."""
+        path = tmp_path / 'large.xlsx'
+        pd.DataFrame({'value': np.random.default_rng(5).lognormal(size=3000)}).to_excel(path, index=False)
+
+        first = process_file_streaming(str(path), chunk_size=500, method='sketch', sketch_k=20)
+        second = process_file_streaming(str(path), chunk_size=500, method='sketch', sketch_k=20)
+
+        assert first[0]['lower_threshold'] == second[0]['lower_threshold']
+        assert first[0]['upper_threshold'] == second[0]['upper_threshold']
+        pd.testing.assert_frame_equal(first[0]['anomalies'], second[0]['anomalies'])
+
+    def test_streaming_no_numeric_columns(self):
+        """Проверяет потоковую обработку файла без числовых столбцов."""
+        df = pd.DataFrame({'name': ['Alice', 'Bob'], 'city': ['NYC', 'LA']})
+        with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as tmp:
+            temp_name = tmp.name
+            df.to_excel(temp_name, index=False)
+
+        try:
+            assert process_file_streaming(temp_name, chunk_size=1) == []
+        finally:
+            os.unlink(temp_name)
+
+
 class TestDisplayResults:
     """Тесты для функции display_results."""
     
@@ -152,6 +394,49 @@ class TestCreateAnomaliesExcel:
         assert 'Anomaly' in df.columns
         assert len(df) == 3  # Всего 3 аномалии в test_results
     
+    @pytest.mark.parametrize('engine', ['openpyxl', 'xlsxwriter'])
+    def test_create_anomalies_excel_highlights_exact_cells(self, engine):
+        """Проверяет, что выделены только аномальные ячейки, без совпадений по значению."""
+        from openpyxl import load_workbook
+
+        frame = pd.DataFrame({
+            'temperature': [50, 20, 50],
+            'humidity': [60, 200, 61]
+        })
+        results = [
+            {'column': 'temperature', 'anomalies': frame.iloc[[0]],
+             'lower_threshold': 15, 'upper_threshold': 25},
+            {'column': 'humidity', 'anomalies': frame.iloc[[1, 2]],
+             'lower_threshold': 55, 'upper_threshold': 100},
+        ]
+
+        excel_data = create_anomalies_excel(results, engine=engine)
+        worksheet = load_workbook(pd.io.common.BytesIO(excel_data))['All Anomalies']
+        highlighted = {
+            (cell.row, cell.column)
+            for row in worksheet.iter_rows(min_row=2)
+            for cell in row
+            if cell.fill.fgColor.rgb == 'FFFF0000'
+        }
+
+        # В строке 4 temperature = 50 совпадает с аномалией из строки 2, но
+        # аномалия этой строки найдена в humidity, поэтому ячейка (4, 1) не выделяется
+        assert highlighted == {(2, 1), (3, 2), (4, 2)}
+        assert 'Anomaly' not in results[0]['anomalies'].columns
+
+    def test_create_anomalies_excel_xlsxwriter(self, test_results):
+        """Проверяет потоковую запись через xlsxwriter."""
+        excel_data = create_anomalies_excel(test_results, engine='xlsxwriter')
+
+        df = pd.read_excel(pd.io.common.BytesIO(excel_data))
+        expected = pd.read_excel(pd.io.common.BytesIO(create_anomalies_excel(test_results)))
+        pd.testing.assert_frame_equal(df, expected)
+
+    def test_create_anomalies_excel_unknown_engine(self, test_results):
+        """Проверяет, что неизвестный движок записи вызывает ошибку."""
+        with pytest.raises(ValueError):
+            create_anomalies_excel(test_results, engine='xlwt')
+
     def test_create_anomalies_excel_empty(self):
         """Проверяет создание Excel для пустых результатов."""
         excel_data = create_anomalies_excel([])
@@ -178,4 +463,183 @@ class TestCreateAnomaliesExcel:
         
         assert isinstance(excel_data, bytes)
         df = pd.read_excel(pd.io.common.BytesIO(excel_data))
-        assert len(df) == 0
\ No newline at end of file
+        assert len(df) == 0
+
+
+class TestColumnResult:
+    """Тесты для результатов с общей таблицей аномальных строк."""
+
+    @pytest.fixture
+    def wide_frame(self):
+        """Широкая таблица, в которой одни и те же строки аномальны во многих столбцах."""
+        rng = np.random.default_rng(0)
+        frame = pd.DataFrame(rng.uniform(99, 101, size=(2000, 20)),
+                             columns=[f'sensor_{i}' for i in range(20)])
+        frame.iloc[::10] = 1000
+        frame.index = frame.index * 2
+        return frame
+
+    def test_dict_access(self, wide_frame):
+        """Проверяет доступ к результату как к словарю."""
+        result = process_frame(wide_frame)[0]
+
+        assert set(result) == {'column', 'anomalies', 'lower_threshold', 'upper_threshold'}
+        assert result['column'] == 'sensor_0'
+        assert result['anomalies'].index.tolist() == list(range(0, 4000, 20))
+        assert result.count == 200
+        assert dict(result)['lower_threshold'] == result.lower_threshold
+        with pytest.raises(KeyError):
+            result['mask']
+
+    def test_rows_are_stored_once(self, wide_frame):
+        """Проверяет, что все столбцы ссылаются на одну таблицу аномальных строк."""
+        results = process_frame(wide_frame)
+
+        assert len({id(result.frame) for result in results}) == 1
+        assert len(results[0].frame) == 200
+
+    @pytest.mark.parametrize('batch', [True, False])
+    def test_anomalies_match_detection(self, wide_frame, batch):
+        """Проверяет, что таблицы аномалий совпадают с detect_anomalies."""
+        for result in process_frame(wide_frame, batch=batch):
+            expected = anomaly_processor.detect_anomalies(
+                wide_frame, result['column'], result['lower_threshold'], result['upper_threshold'])
+            pd.testing.assert_frame_equal(result['anomalies'], expected)
+
+    def test_combine_matches_separate_frames(self, wide_frame):
+        """Проверяет, что объединение через общую таблицу совпадает с объединением копий."""
+        results = process_frame(wide_frame)
+        copies = [dict(result) for result in results]
+
+        combined, blocks = anomaly_processor.combine_anomalies(results)
+        expected, expected_blocks = anomaly_processor.combine_anomalies(copies)
+
+        pd.testing.assert_frame_equal(combined, expected)
+        assert blocks == expected_blocks
+
+    def test_combine_int_column_labels(self):
+        """Проверяет объединение столбцов с числовыми заголовками (например, годами)."""
+        frame = pd.DataFrame({'region': list('abcdefghij'),
+                              2021: [20, 22, 21, 50, 19, 18, 20, 21, 100, 22],
+                              2022: [60, 62, 61, 59, 58, 200, 61, 60, 59, 62]})
+        results = process_frame(frame)
+
+        for source in (results, [dict(result) for result in results]):
+            combined, blocks = anomaly_processor.combine_anomalies(source)
+            assert combined['Anomaly'].tolist() == ['50 2021', '100 2021', '200 2022']
+            assert blocks == [(2021, 2), (2022, 1)]
+        assert create_anomalies_excel(results)
+
+    def test_changing_anomalies_does_not_change_result(self, wide_frame):
+        """Проверяет, что изменение выданной таблицы не затрагивает результат."""
+        result = process_frame(wide_frame)[0]
+        anomalies = result['anomalies']
+        anomalies['Anomaly'] = 'x'
+
+        assert 'Anomaly' not in result['anomalies'].columns
+
+
+@pytest.fixture
+def daily_data():
+    """Создает данные за несколько дней с группами и выбросами."""
+    rng = np.random.default_rng(3)
+    n = 600
+    df = pd.DataFrame({
+        'date': pd.date_range('2023-01-01', periods=n, freq='h'),
+        'store': rng.choice(['s1', 's2'], n),
+        'sales': rng.uniform(90, 110, n),
+        'visits': rng.uniform(40, 60, n),
+    })
+    df.loc[df['store'] == 's2', 'sales'] += 100
+    df.loc[[10, 550], 'sales'] = [400.0, -500.0]
+    return df
+
+
+class TestProcessIncremental:
+    """Тесты для инкрементальной обработки."""
+
+    def test_first_run_matches_full_processing(self, tmp_path, daily_data):
+        """Тест: при первом запуске анализируются все строки."""
+        data = daily_data.iloc[:150]
+        results = process_incremental(data, 'daily.xlsx', BaselineStore(str(tmp_path)))
+        expected = process_frame(data)
+
+        assert [r['column'] for r in results] == [r['column'] for r in expected]
+        for result, reference in zip(results, expected):
+            # Пока значений меньше емкости скетча, квартили точные
+            assert result['lower_threshold'] == pytest.approx(reference['lower_threshold'])
+            pd.testing.assert_frame_equal(result['anomalies'], reference['anomalies'])
+
+    @pytest.mark.parametrize('date_column', [None, 'date'])
+    def test_only_new_rows_are_classified(self, tmp_path, daily_data, date_column):
+        """Тест: повторный запуск анализирует только добавленные строки."""
+        store = BaselineStore(str(tmp_path))
+        process_incremental(daily_data.iloc[:500], 'daily.xlsx', store, date_column=date_column)
+        results = process_incremental(daily_data, 'daily.xlsx', store, date_column=date_column)
+
+        sales = next(r for r in results if r['column'] == 'sales')
+        assert 550 in sales['anomalies'].index
+        assert sales['anomalies'].index.min() >= 500
+
+        baseline = store.load('daily.xlsx')
+        assert baseline.column_sketches['sales'].count == len(daily_data)
+        if date_column:
+            assert baseline.last_date == daily_data['date'].max()
+        else:
+            assert baseline.rows == len(daily_data)
+
+        # Без новых строк аномалий нет, статистика не меняется
+        results = process_incremental(daily_data, 'daily.xlsx', store, date_column=date_column)
+        assert all(r['anomalies'].empty for r in results)
+        assert store.load('daily.xlsx').column_sketches['sales'].count == len(daily_data)
+
+    def test_group_baselines(self, tmp_path, daily_data):
+        """Тест: новые строки сравниваются с порогами своей группы."""
+        store = BaselineStore(str(tmp_path))
+        process_incremental(daily_data.iloc[:500], 'daily.xlsx', store,
+                            date_column='date', group_columns=['store'])
+        new_rows = daily_data.iloc[500:].copy()
+        # Значение обычное для s2, но аномальное для s1
+        new_rows.loc[new_rows['store'] == 's1', 'sales'] = 200.0
+        results = process_incremental(pd.concat([daily_data.iloc[:500], new_rows]), 'daily.xlsx', store,
+                                      date_column='date', group_columns=['store'])
+
+        sales = next(r for r in results if r['column'] == 'sales')
+        expected = set(new_rows.index[new_rows['store'] == 's1']) | {550}
+        assert set(sales['anomalies'].index) == expected
+        assert list(sales['lower_threshold'].index) == ['s1', 's2']
+        assert [r['column'] for r in results] == ['sales', 'visits']
+
+    def test_only_groups_of_new_rows_are_updated(self, tmp_path):
+        """Тест: обновляются скетчи только групп новых строк, новая группа получает пороги столбца."""
+        rng = np.random.default_rng(0)
+        groups = [f'g{number}' for number in range(200)]
+        data = pd.DataFrame({'group': np.repeat(groups, 10), 'value': rng.normal(100, 5, 2000)})
+        store = BaselineStore(str(tmp_path))
+        process_incremental(data, 'groups.xlsx', store, group_columns=['group'])
+        before = store.load('groups.xlsx')
+
+        new_rows = pd.DataFrame({'group': ['g3', 'g3', 'new', None], 'value': [100.0, 1000.0, 1000.0, 1000.0]})
+        results = process_incremental(pd.concat([data, new_rows], ignore_index=True), 'groups.xlsx', store,
+                                      group_columns=['group'])
+        after = store.load('groups.xlsx')
+
+        value = results[0]
+        assert list(value['anomalies'].index) == [2001, 2002, 2003]
+        assert list(value['lower_threshold'].index) == ['g3', 'new']
+        q1, q3 = before.column_sketches['value'].quantile([0.25, 0.75])
+        assert value['lower_threshold']['new'] == q1 - 1.5 * (q3 - q1)
+
+        old = before.group_sketches['value']
+        changed = {token for token, sketch in after.group_sketches['value'].items()
+                   if token not in old or sketch.count != old[token].count}
+        assert changed == {group_token('g3'), group_token('new')}
+
+    def test_parameters_must_match_baseline(self, tmp_path, daily_data):
+        """Тест ошибок при смене параметров и при уменьшении числа строк."""
+        store = BaselineStore(str(tmp_path))
+        process_incremental(daily_data, 'daily.xlsx', store)
+        with pytest.raises(ValueError):
+            process_incremental(daily_data, 'daily.xlsx', store, date_column='date')
+        with pytest.raises(ValueError):
+            process_incremental(daily_data.iloc[:100], 'daily.xlsx', store)
@@ -0,0 +1,183 @@
+import asyncio
+import io
+import json
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import pyarrow as pa
+import pytest
+from pyarrow import ipc
+import api_server
+from api_server import create_app, encode_table, read_body
+
+
+def call(app, method, path, body=b'', headers=None, query=''):
+    """Выполняет запрос к ASGI приложению; возвращает (код, заголовки, тело)."""
+    messages = []
+    requests = [{'type': 'http.request', 'body': body, 'more_body': False}]
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        await asyncio.Event().wait()
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0', 'spec_version': '2.4'}, 'http_version': '1.1',
+        'method': method, 'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+        'query_string': query.encode(), 'client': ('test', 1), 'server': ('test', 80),
+        'headers': [(name.encode(), value.encode()) for name, value in (headers or {}).items()],
+    }
+    asyncio.run(app(scope, receive, send))
+    start, parts = messages[0], messages[1:]
+    response_headers = {name.decode(): value.decode() for name, value in start['headers']}
+    return start['status'], response_headers, b''.join(part.get('body', b'') for part in parts)
+
+
+def ndjson(body):
+    return [json.loads(line) for line in body.decode('utf-8').splitlines()]
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """Приложение, выполняющее расчеты в потоках текущего процесса."""
+    monkeypatch.setattr(api_server, 'ProcessPoolExecutor',
+                        lambda max_workers, mp_context: ThreadPoolExecutor(max_workers))
+    app = create_app(workers=2)
+    yield app
+    api_server._shutdown(app)
+
+
+@pytest.fixture
+def data():
+    return pd.DataFrame({
+        'plant': ['a', 'a', 'b', 'b', 'a', 'a', 'b', 'b', 'a', 'b'],
+        'temperature': [20, 22, 21, 50, 19, 18, 20, 21, 100, 22],  # 50 и 100 - аномалии
+        'humidity': [60, 62, 61, 59, 58, 200, 61, 60, 59, 62],  # 200 - аномалия
+    })
+
+
+class TestApiServer:
+    def test_health(self, app):
+        status, _, body = call(app, 'GET', '/api/health')
+        assert status == 200
+        assert json.loads(body)['status'] == 'ok'
+
+    def test_stats(self, app, data):
+        status, headers, body = call(app, 'POST', '/api/stats', data.to_csv(index=False).encode(),
+                                     {'content-type': 'text/csv'}, 'column=temperature&multiplier=2')
+        assert status == 200
+        assert headers['content-type'] == 'application/x-ndjson'
+        assert ndjson(body) == [{'IQR': 2.0, 'Q1': 20.0, 'Q3': 22.0,
+                                 'lower_threshold': 16.0, 'upper_threshold': 26.0}]
+
+    def test_group_stats(self, app, data):
+        _, _, body = call(app, 'POST', '/api/stats', data.to_parquet(), query='column=temperature&group=plant')
+        rows = ndjson(body)
+        assert [row['plant'] for row in rows] == ['a', 'b']
+        assert rows[0]['upper_threshold'] == 22.0 + 1.5 * 3.0
+
+    def test_detect(self, app, data):
+        status, _, body = call(app, 'POST', '/api/detect', data.to_csv(index=False).encode(),
+                               query='column=temperature')
+        assert status == 200
+        assert ndjson(body) == [{'row': 3, 'plant': 'b', 'temperature': 50, 'humidity': 59},
+                                {'row': 8, 'plant': 'a', 'temperature': 100, 'humidity': 59}]
+
+    def test_detect_arrow_stream(self, app, data):
+        table = pa.Table.from_pandas(data)
+        sink = io.BytesIO()
+        with ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+
+        status, headers, body = call(app, 'POST', '/api/detect', sink.getvalue(),
+                                     {'accept': 'application/vnd.apache.arrow.stream'}, 'column=humidity')
+        assert status == 200
+        assert headers['content-type'] == 'application/vnd.apache.arrow.stream'
+        anomalies = ipc.open_stream(body).read_pandas()
+        assert anomalies['row'].tolist() == [5]
+        assert anomalies['humidity'].tolist() == [200]
+
+    def test_process(self, app, data):
+        status, _, body = call(app, 'POST', '/api/process', data.to_csv(index=False).encode(),
+                               query='format=arrow')
+        assert status == 200
+        anomalies = ipc.open_stream(body).read_pandas()
+        assert list(anomalies.columns[:4]) == list(api_server.PROCESS_COLUMNS)
+        assert anomalies['anomaly_column'].tolist() == ['temperature', 'temperature', 'humidity']
+        assert anomalies['row'].tolist() == [3, 8, 5]
+
+        _, _, body = call(app, 'POST', '/api/process', data.to_csv(index=False).encode(), query='column=humidity')
+        assert [row['row'] for row in ndjson(body)] == [5]
+
+    @pytest.mark.parametrize('query, body, expected', [
+        ('column=pressure', None, 400),
+        ('column=temperature&format=xml', None, 400),
+        ('column=temperature&multiplier=x', None, 400),
+        ('', None, 400),
+        ('column=temperature', b'', 400),
+    ])
+    def test_bad_request(self, app, data, query, body, expected):
+        if body is None:
+            body = data.to_csv(index=False).encode()
+        status, _, response = call(app, 'POST', '/api/detect', body, query=query)
+        assert status == expected
+        assert json.loads(response)['error']
+
+    def test_limits(self, monkeypatch, data):
+        monkeypatch.setattr(api_server, 'ProcessPoolExecutor',
+                            lambda max_workers, mp_context: ThreadPoolExecutor(max_workers))
+        body = data.to_csv(index=False).encode()
+        status, _, _ = call(create_app(workers=1, max_body_bytes=10), 'POST', '/api/detect', body,
+                            query='column=temperature')
+        assert status == 413
+        status, _, _ = call(create_app(workers=1, max_pending=0), 'POST', '/api/detect', body,
+                            query='column=temperature')
+        assert status == 503
+
+    def test_overload_does_not_read_body(self, monkeypatch, data):
+        async def fail(request):
+            raise AssertionError("тело запроса прочитано")
+
+        monkeypatch.setattr(api_server, '_read_request_body', fail)
+        status, _, _ = call(create_app(workers=1, max_pending=0), 'POST', '/api/detect',
+                            data.to_csv(index=False).encode(), query='column=temperature')
+        assert status == 503
+
+    def test_result_is_streamed_from_file(self, app, data, monkeypatch, tmp_path):
+        monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+        monkeypatch.setattr(api_server, 'READ_CHUNK_BYTES', 16)
+        status, _, body = call(app, 'POST', '/api/process', data.to_csv(index=False).encode(),
+                               query='format=arrow')
+        assert status == 200
+        assert ipc.open_stream(body).read_pandas()['row'].tolist() == [3, 8, 5]
+        # Файл результата удален после передачи
+        assert list(tmp_path.iterdir()) == []
+
+    def test_process_pool(self, data):
+        app = create_app(workers=1)
+        try:
+            for _ in range(2):
+                status, _, body = call(app, 'POST', '/api/detect', data.to_csv(index=False).encode(),
+                                       query='column=temperature')
+                assert status == 200
+                assert [row['row'] for row in ndjson(body)] == [3, 8]
+        finally:
+            api_server._shutdown(app)
+
+
+def test_read_body_formats(data):
+    assert read_body(data.to_parquet(), 'application/vnd.apache.parquet').equals(data)
+    assert read_body(data.to_csv(index=False).encode(), 'text/csv; charset=utf-8').equals(data)
+    indexed = data.set_index('plant')
+    assert read_body(indexed.to_parquet())['humidity'].tolist() == data['humidity'].tolist()
+
+
+def test_encode_table_chunks(data):
+    assert len(list(encode_table(data, 'ndjson', rows_per_chunk=4))) == 3
+    arrow = b''.join(encode_table(data, 'arrow', rows_per_chunk=4))
+    assert ipc.open_stream(arrow).read_pandas().equals(data)
+    empty = b''.join(encode_table(data.iloc[:0], 'arrow'))
+    assert ipc.open_stream(empty).read_pandas().columns.tolist() == data.columns.tolist()
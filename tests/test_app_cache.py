@@ -0,0 +1,74 @@
+import pandas as pd
+import pytest
+from data_cache import file_digest
+
+
+@pytest.fixture(scope='module')
+def app5():
+    """Модуль веб-интерфейса (страница выполняется без сервера streamlit)."""
+    import app5
+    return app5
+
+
+class UploadedFile:
+    """Загруженный файл с интерфейсом streamlit UploadedFile."""
+
+    def __init__(self, data, file_id, name='data.csv'):
+        self.data = data
+        self.file_id = file_id
+        self.name = name
+        self.size = len(data)
+
+    def getvalue(self):
+        return self.data
+
+
+class FrozenFrame(pd.DataFrame):
+    """Таблица, запрещающая присваивание столбцов."""
+
+    def __setitem__(self, key, value):
+        raise AssertionError(f"Столбец {key} изменен")
+
+
+class TestCacheKeys:
+    """Тесты ключей кеширования веб-интерфейса."""
+
+    def test_fingerprint_is_content_hash(self, app5):
+        first = app5.data_fingerprint(UploadedFile(b'a,b\n1,2\n', 'upload-1'))
+        same = app5.data_fingerprint(UploadedFile(b'a,b\n1,2\n', 'upload-2'))
+        other = app5.data_fingerprint(UploadedFile(b'a,b\n1,3\n', 'upload-3'))
+
+        assert first == same == file_digest(b'a,b\n1,2\n')
+        assert other != first
+
+    def test_fingerprint_without_upload_id(self, app5):
+        first = app5.data_fingerprint(UploadedFile(b'a\n1\n', None))
+        other = app5.data_fingerprint(UploadedFile(b'a\n2\n', None))
+
+        assert first != other
+
+    def test_data_key(self, app5):
+        key = app5.make_data_key(file_digest(b'file'), ['plant'], {'plant': ['a', 'b']})
+
+        assert key == app5.make_data_key(file_digest(b'file'), ['plant'], {'plant': ['a', 'b']})
+        assert key != app5.make_data_key(file_digest(b'other'), ['plant'], {'plant': ['a', 'b']})
+        assert key != app5.make_data_key(file_digest(b'file'), ['plant'], {'plant': ['a']})
+        assert key != app5.make_data_key(file_digest(b'file'), [], {})
+
+    def test_wrappers_are_keyed_by_data_key(self, app5):
+        """Таблица не хешируется: результат определяется ключом данных и параметрами."""
+        first = pd.DataFrame({'value': [1, 2, 3, 4, 100]})
+        second = pd.DataFrame({'value': [10, 20, 30, 40, 50]})
+
+        stats = app5.cached_stats('key-1', first, 'value')
+        assert app5.cached_stats('key-1', second, 'value') == stats
+        assert app5.cached_stats('key-2', second, 'value') == app5.calculate_stats(second, 'value')
+
+        assert app5.cached_filter_data('key-1', first, [], {}) is app5.cached_filter_data('key-1', second, [], {})
+        assert app5.cached_filter_data('key-2', second, [], {}) is second
+
+    def test_select_columns_does_not_modify_frame(self, app5):
+        """Загруженная таблица общая для всех сессий и не должна изменяться."""
+        df = FrozenFrame({'date': pd.date_range('2023-01-01', periods=3), 'value': [1, 2, 3]})
+
+        assert app5.select_columns(df) == ('date', 'value')
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+from anomaly_detection import calculate_group_stats, detect_anomalies
+from plot_utils import DEFAULT_MAX_GROUPS
+
+
+@pytest.fixture(scope='module')
+def app5():
+    """Модуль веб-интерфейса (страница выполняется без сервера streamlit)."""
+    import app5
+    return app5
+
+
+@pytest.fixture
+def grouped_data():
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({
+        'date': pd.date_range('2023-01-01', periods=300, freq='h'),
+        'plant': np.tile(['a', 'b', 'c'], 100),
+        'value': rng.uniform(90, 110, 300),
+    })
+    df.loc[df['plant'] == 'b', 'value'] += 100
+    df.loc[[4, 150], 'value'] = [1000.0, -1000.0]
+    return df
+
+
+class TestCreateVisualization:
+    """Тесты построения графика аномалий."""
+
+    @pytest.mark.parametrize('max_points', [None, 60])
+    def test_group_thresholds_are_drawn(self, app5, grouped_data, max_points):
+        """Пороги по группам выводятся полосой для каждой группы."""
+        stats = calculate_group_stats(grouped_data, 'value', ['plant'])
+        lower = stats['Q1'] - 1.5 * stats['IQR']
+        upper = stats['Q3'] + 1.5 * stats['IQR']
+        anomalies = detect_anomalies(grouped_data, 'value', lower, upper, ['plant'])
+
+        fig = app5.create_visualization(grouped_data, anomalies, 'value', 'date', ['plant'],
+                                        lower, upper, max_points)
+
+        bands = {trace.name: trace for trace in fig.data if trace.name and trace.name.startswith('Пороги')}
+        assert set(bands) == {'Пороги: (\'a\',)', 'Пороги: (\'b\',)', 'Пороги: (\'c\',)'}
+        for (plant,), trace in zip(stats.index.to_frame().itertuples(index=False), bands.values()):
+            assert set(np.round(trace.y, 6)) == {round(lower[plant], 6)}
+
+    @pytest.mark.parametrize('group_columns', [None, ['plant']])
+    def test_band_respects_budget(self, app5, grouped_data, group_columns):
+        """Данные и полосы порогов вместе укладываются в max_points и выводятся через WebGL."""
+        lower = grouped_data['value'].rolling(24, min_periods=1).mean().to_numpy() - 15
+        upper = lower + 30
+        anomalies = grouped_data.iloc[[4, 150]]
+
+        fig = app5.create_visualization(grouped_data, anomalies, 'value', 'date', group_columns,
+                                        lower, upper, 60)
+
+        background = [trace for trace in fig.data if not (trace.name or '').startswith('Аномалии')]
+        assert any(trace.fill == 'tonexty' for trace in background)
+        assert sum(len(trace.x) for trace in background) <= 60
+        assert {trace.type for trace in fig.data} == {'scattergl'}
+
+    def test_global_thresholds_are_lines(self, app5, grouped_data):
+        fig = app5.create_visualization(grouped_data, grouped_data.iloc[:0], 'value', 'date', None,
+                                        50.0, 250.0)
+
+        assert [shape.y0 for shape in fig.layout.shapes] == [50.0, 250.0]
+
+    @pytest.mark.parametrize('threshold_mode', ['global', 'groups'])
+    def test_many_groups_respect_budget(self, app5, threshold_mode):
+        """При десятках тысяч групп точек не больше max_points, наборов точек - ограниченное число."""
+        rng = np.random.default_rng(2)
+        n = 200_000
+        df = pd.DataFrame({'date': pd.date_range('2023-01-01', periods=n, freq='min'),
+                           'device': rng.integers(0, 40_000, n).astype(str),
+                           'value': rng.normal(100, 5, n)})
+        if threshold_mode == 'groups':
+            stats = calculate_group_stats(df, 'value', ['device'])
+            lower = stats['Q1'] - 1.5 * stats['IQR']
+            upper = stats['Q3'] + 1.5 * stats['IQR']
+        else:
+            lower, upper = 80.0, 120.0
+        anomalies = detect_anomalies(df, 'value', lower, upper, ['device'])
+
+        fig = app5.create_visualization(df, anomalies, 'value', 'date', ['device'], lower, upper, 5000)
+
+        data_traces = [trace for trace in fig.data if trace.name and trace.name.startswith('Данные')]
+        assert sum(len(trace.x) for trace in data_traces) <= 5000
+        assert len(data_traces) <= DEFAULT_MAX_GROUPS
+        assert len(fig.data) <= 4 * DEFAULT_MAX_GROUPS
+        assert sum(len(trace.x) for trace in fig.data if trace.name and trace.name.startswith('Аномалии')) \
+            == len(anomalies)
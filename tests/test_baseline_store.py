@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+from baseline_store import Baseline, BaselineStore, group_token
+from quantile_sketch import KLLSketch
+
+
+@pytest.fixture
+def baseline():
+    """Создает базовую статистику со скетчами столбца и групп."""
+    baseline = Baseline(sketch_k=50, date_column='date', group_columns=['store'])
+    baseline.rows = 300
+    baseline.last_date = pd.Timestamp('2023-05-01 12:00')
+    baseline.column_sketches['sales'] = KLLSketch(50, seed=0).update(np.arange(300))
+    baseline.group_sketches['sales'] = {
+        group_token('s1'): KLLSketch(50, seed=0).update(np.arange(100)),
+        group_token(('s2',)): KLLSketch(50, seed=0).update(np.arange(200)),
+    }
+    return baseline
+
+
+class TestBaselineStore:
+    """Тесты для хранилища базовых статистик."""
+
+    def test_round_trip(self, tmp_path, baseline):
+        """Тест сохранения и чтения: отметка и квантили скетчей не меняются."""
+        store = BaselineStore(str(tmp_path))
+        store.save('sales report.xlsx', baseline)
+        loaded = store.load('sales report.xlsx')
+
+        assert loaded.date_column == 'date'
+        assert loaded.group_columns == ['store']
+        assert loaded.rows == 300
+        assert loaded.last_date == baseline.last_date
+        np.testing.assert_allclose(loaded.column_sketches['sales'].quantile([0.25, 0.75]),
+                                   baseline.column_sketches['sales'].quantile([0.25, 0.75]))
+        assert set(loaded.group_sketches['sales']) == {group_token('s1'), group_token('s2')}
+
+    def test_missing_and_delete(self, tmp_path, baseline):
+        """Тест отсутствующей статистики и удаления."""
+        store = BaselineStore(str(tmp_path))
+        assert store.load('data.xlsx') is None
+        store.save('data.xlsx', baseline)
+        assert store.delete('data.xlsx') is True
+        assert store.delete('data.xlsx') is False
+        assert store.load('data.xlsx') is None
+
+    def test_store_dir_from_environment(self, tmp_path, monkeypatch):
+        """Тест каталога хранилища из переменной окружения."""
+        monkeypatch.setenv('ANOMALIZER_BASELINE_DIR', str(tmp_path / 'baselines'))
+        assert BaselineStore().store_dir == tmp_path / 'baselines'
@@ -0,0 +1,164 @@
+import json
+import os
+import sys
+import pandas as pd
+import pytest
+from batch_runner import collect_files, main, output_paths, run_batch
+
+
+@pytest.fixture
+def input_dir(tmp_path):
+    """Создает каталог с файлами разных форматов для пакетной обработки."""
+    df = pd.DataFrame({
+        'temperature': [20, 22, 21, 50, 19, 18, 20, 21, 100, 22],  # 50 и 100 - аномалии
+        'humidity': [60, 62, 61, 59, 58, 200, 61, 60, 59, 62],  # 200 - аномалия
+    })
+    directory = tmp_path / 'input'
+    (directory / 'nested').mkdir(parents=True)
+    df.to_excel(directory / 'first.xlsx', index=False)
+    df.to_csv(directory / 'nested' / 'second.csv', index=False)
+    (directory / 'notes.md').write_text('не таблица')
+    return directory
+
+
+class TestCollectFiles:
+    """Тесты для функции collect_files."""
+
+    def test_directory_is_scanned_recursively(self, input_dir):
+        """Тест выбора поддерживаемых файлов из каталога."""
+        files = collect_files([str(input_dir)])
+        assert [path.name for path in files] == ['first.xlsx', 'second.csv']
+
+    def test_glob_and_duplicates(self, input_dir):
+        """Тест шаблонов glob и удаления повторов."""
+        files = collect_files([str(input_dir / '**' / '*.csv'), str(input_dir / 'nested' / 'second.csv')])
+        assert [path.name for path in files] == ['second.csv']
+
+    def test_missing_input(self, tmp_path):
+        """Тест ошибки для несуществующего пути."""
+        with pytest.raises(FileNotFoundError):
+            collect_files([str(tmp_path / 'missing.xlsx')])
+
+    def test_output_names_are_unique(self, tmp_path):
+        """Тест нумерации выходных файлов с одинаковыми именами."""
+        paths = output_paths([tmp_path / 'a' / 'data.csv', tmp_path / 'b' / 'data.xlsx'], tmp_path, 'csv')
+        assert [path.name for path in paths] == ['data_anomalies.csv', 'data_anomalies_2.csv']
+
+
+class TestRunBatch:
+    """Тесты для пакетной обработки."""
+
+    @pytest.mark.parametrize('output_format', ['xlsx', 'csv', 'parquet'])
+    def test_outputs_and_summary(self, input_dir, tmp_path, output_format):
+        """Тест выходных файлов и сводки для каждого формата."""
+        files = collect_files([str(input_dir)])
+        summary = run_batch(files, tmp_path / 'out', output_format)
+
+        assert summary['total_files'] == 2
+        assert summary['failed_files'] == 0
+        assert summary['total_anomalies'] == 6
+        for record in summary['files']:
+            assert record['status'] == 'ok'
+            assert record['anomalies_by_column'] == {'temperature': 2, 'humidity': 1}
+            assert set(record['seconds']) == {'read', 'detect', 'write', 'total'}
+
+        output = summary['files'][1]['output']
+        if output_format == 'xlsx':
+            saved = pd.read_excel(output)
+        elif output_format == 'csv':
+            saved = pd.read_csv(output)
+        else:
+            saved = pd.read_parquet(output)
+        assert len(saved) == 3
+        assert 'Anomaly' in saved.columns
+
+    def test_process_pool(self, input_dir, tmp_path):
+        """Тест обработки пулом процессов: порядок записей совпадает с порядком файлов."""
+        files = collect_files([str(input_dir)])
+        progress = []
+        summary = run_batch(files, tmp_path / 'out', 'csv', jobs=2,
+                            progress=lambda done, total, record: progress.append((done, total)))
+
+        assert [record['file'] for record in summary['files']] == [str(path) for path in files]
+        assert summary['total_anomalies'] == 6
+        assert progress == [(1, 2), (2, 2)]
+
+    def test_broken_file_is_reported(self, input_dir, tmp_path):
+        """Тест: ошибка в одном файле не останавливает обработку остальных."""
+        broken = input_dir / 'broken.xlsx'
+        broken.write_bytes(b'not a workbook')
+        summary = run_batch(collect_files([str(input_dir)]), tmp_path / 'out', 'csv')
+
+        statuses = {record['file']: record['status'] for record in summary['files']}
+        assert statuses[str(broken)] == 'error'
+        assert summary['failed_files'] == 1
+        assert summary['total_anomalies'] == 6
+
+    def test_xlsx_is_written_to_disk(self, input_dir, tmp_path, monkeypatch):
+        """Тест: xlsx записывается xlsxwriter прямо в файл, без сборки в памяти."""
+        import anomaly_processor
+        targets = []
+        write_sheets = anomaly_processor.write_xlsxwriter_sheets
+
+        def record(target, sheets):
+            targets.append(target)
+            write_sheets(target, sheets)
+
+        monkeypatch.setattr(anomaly_processor, 'write_xlsxwriter_sheets', record)
+        summary = run_batch([input_dir / 'first.xlsx'], tmp_path / 'out', 'xlsx')
+
+        assert targets == [summary['files'][0]['output']]
+        assert len(pd.read_excel(targets[0])) == 3
+
+    @pytest.mark.parametrize('method', ['exact', 'sketch'])
+    def test_streaming(self, input_dir, tmp_path, method):
+        """Тест потоковой обработки: xlsx читается частями, csv - целиком."""
+        files = collect_files([str(input_dir)])
+        summary = run_batch(files, tmp_path / 'out', 'csv', streaming=method)
+
+        excel, text = summary['files']
+        assert excel['rows'] is None
+        assert text['rows'] == 10
+        for record in summary['files']:
+            assert record['anomalies_by_column'] == {'temperature': 2, 'humidity': 1}
+        assert len(pd.read_csv(excel['output'])) == 3
+
+
+class TestMain:
+    """Тесты для командной строки."""
+
+    def test_summary_file(self, input_dir, tmp_path):
+        """Тест записи JSON сводки и кода завершения."""
+        summary_path = tmp_path / 'summary.json'
+        code = main([str(input_dir), '-o', str(tmp_path / 'out'), '-f', 'csv',
+                     '-j', '1', '--summary', str(summary_path), '-q'])
+
+        assert code == 0
+        summary = json.loads(summary_path.read_text(encoding='utf-8'))
+        assert summary['total_anomalies'] == 6
+
+    def test_incremental_runs(self, input_dir, tmp_path):
+        """Тест: повторный запуск с базовой статистикой не находит аномалий в старых строках."""
+        args = [str(input_dir), '-o', str(tmp_path / 'out'), '-f', 'csv', '-j', '1', '-q',
+                '--baseline-dir', str(tmp_path / 'baselines'), '--summary', str(tmp_path / 'summary.json')]
+        assert main(args) == 0
+        assert json.loads((tmp_path / 'summary.json').read_text(encoding='utf-8'))['total_anomalies'] == 6
+        assert main(args) == 0
+        assert json.loads((tmp_path / 'summary.json').read_text(encoding='utf-8'))['total_anomalies'] == 0
+
+    def test_streaming_with_baseline_is_rejected(self, input_dir, tmp_path):
+        """Тест: потоковая обработка несовместима с базовой статистикой."""
+        assert main([str(input_dir), '-q', '--streaming', 'exact',
+                     '--baseline-dir', str(tmp_path / 'baselines')]) == 2
+
+    def test_no_files(self, tmp_path):
+        """Тест кода завершения, если файлов нет."""
+        assert main([str(tmp_path), '-q']) == 2
+
+    def test_gui_libraries_are_not_imported(self):
+        """Тест: пакетная обработка не импортирует streamlit и plotly."""
+        import subprocess
+        code = ("import sys, batch_runner; "
+                "sys.exit(any(name in sys.modules for name in ('streamlit', 'plotly')))")
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        assert subprocess.run([sys.executable, '-c', code], cwd=root).returncode == 0
@@ -0,0 +1,68 @@
+import importlib.util
+import json
+from pathlib import Path
+import pytest
+
+_SPEC = importlib.util.spec_from_file_location(
+    'run_benchmarks', Path(__file__).resolve().parent.parent / 'benchmarks' / 'run_benchmarks.py')
+run_benchmarks = importlib.util.module_from_spec(_SPEC)
+_SPEC.loader.exec_module(run_benchmarks)
+
+
+class TestMakeFrame:
+    """Тесты для функции make_frame."""
+
+    def test_shape_and_groups(self):
+        """Тест размеров таблицы и номеров групп."""
+        frame = run_benchmarks.make_frame(1000, columns=3, groups=7)
+        assert list(frame.columns) == ['group', 'value_0', 'value_1', 'value_2']
+        assert len(frame) == 1000
+        assert frame['group'].between(0, 6).all()
+
+    def test_anomaly_rate(self):
+        """Тест доли выбросов."""
+        frame = run_benchmarks.make_frame(20_000, anomaly_rate=0.05)
+        outliers = ((frame['value_0'] - 100).abs() >= 100).mean()
+        assert outliers == pytest.approx(0.05, abs=0.01)
+
+
+class TestBuildCases:
+    """Тесты для функции build_cases."""
+
+    def test_one_factor_at_a_time(self):
+        """Тест изменения параметров по одному без повторов."""
+        cases = run_benchmarks.build_cases('smoke', ['calculate_stats'], 1e8)
+        assert [params for _, params in cases] == [
+            {'rows': 1_000, 'groups': 1},
+            {'rows': 5_000, 'groups': 1},
+            {'rows': 1_000, 'groups': 10},
+        ]
+
+    def test_max_cells(self):
+        """Тест пропуска слишком больших таблиц."""
+        cases = run_benchmarks.build_cases('smoke', ['process_file'], 10_000)
+        assert all(params['rows'] * params['columns'] <= 10_000 for _, params in cases)
+
+
+class TestRunSuite:
+    """Тесты для функций run_suite и compare."""
+
+    def test_results_are_comparable(self):
+        """Тест формата результатов и сравнения двух запусков."""
+        suite = run_benchmarks.run_suite('smoke', ['calculate_stats', 'detect_anomalies'], repeats=1)
+        suite = json.loads(json.dumps(suite))
+
+        assert suite['meta']['preset'] == 'smoke'
+        assert len(suite['results']) == 6
+        for record in suite['results']:
+            assert record['seconds_min'] > 0
+            assert record['peak_memory_bytes'] > 0
+
+        comparisons = run_benchmarks.compare(suite, suite)
+        assert len(comparisons) == 6
+        assert all(item['ratio'] == 1 and not item['regression'] for item in comparisons)
+
+    def test_unknown_benchmark(self):
+        """Тест ошибки для неизвестной операции."""
+        with pytest.raises(ValueError, match="Неизвестные операции"):
+            run_benchmarks.run_suite('smoke', ['sort_everything'])
@@ -0,0 +1,90 @@
+import os
+import pandas as pd
+import pytest
+from data_cache import FrameCache, file_digest
+
+
+@pytest.fixture
+def sample_frame():
+    """Фикстура с таблицей, похожей на разобранный Excel файл."""
+    return pd.DataFrame({
+        'date': pd.date_range('2023-01-01', periods=5),
+        'value': [10, 12, 11, 100, 9],
+        'category': ['A', 'A', 'B', 'B', 'A']
+    })
+
+
+class TestFrameCache:
+    """Тесты для дискового кеша таблиц."""
+
+    def test_load_parses_once(self, tmp_path, sample_frame):
+        """Повторная загрузка тех же байтов берется из кеша без разбора."""
+        cache = FrameCache(cache_dir=str(tmp_path))
+        calls = []
+
+        def parser(data):
+            calls.append(data)
+            return sample_frame
+
+        first = cache.load(b'file-content', parser)
+        second = cache.load(b'file-content', parser)
+
+        assert len(calls) == 1
+        pd.testing.assert_frame_equal(first, sample_frame)
+        pd.testing.assert_frame_equal(second, sample_frame)
+
+    def test_key_is_content_hash(self, tmp_path, sample_frame):
+        """Ключ записи - SHA-256 содержимого файла."""
+        cache = FrameCache(cache_dir=str(tmp_path))
+        cache.load(b'file-content', lambda data: sample_frame)
+
+        assert cache.get(file_digest(b'file-content')) is not None
+        assert cache.get(file_digest(b'other-content')) is None
+
+    def test_unsupported_frame_is_not_cached(self, tmp_path):
+        """Таблица, которую нельзя записать в Arrow, возвращается без кеширования."""
+        cache = FrameCache(cache_dir=str(tmp_path))
+        frame = pd.DataFrame({'mixed': [1, 'a', 2.5]})
+
+        result = cache.load(b'mixed', lambda data: frame)
+
+        pd.testing.assert_frame_equal(result, frame)
+        assert cache.get(file_digest(b'mixed')) is None
+
+    def test_non_string_labels_are_not_cached(self, tmp_path):
+        """Заголовки-числа не превращаются в строки при повторной загрузке."""
+        cache = FrameCache(cache_dir=str(tmp_path))
+        frame = pd.DataFrame({'date': ['a', 'b'], 2021: [1, 2], 2022: [3, 4]})
+
+        first = cache.load(b'years', lambda data: frame)
+        second = cache.load(b'years', lambda data: frame)
+
+        assert list(second.columns) == list(first.columns) == ['date', 2021, 2022]
+        assert not cache.put(file_digest(b'years'), frame)
+        assert cache.get(file_digest(b'years')) is None
+
+    def test_lru_eviction(self, tmp_path, sample_frame):
+        """При превышении размера удаляются давно не использовавшиеся записи."""
+        cache = FrameCache(cache_dir=str(tmp_path))
+        cache.put('first', sample_frame)
+        entry_size = os.path.getsize(tmp_path / 'first.arrow')
+        cache.max_bytes = 2 * entry_size
+
+        cache.put('second', sample_frame)
+        os.utime(tmp_path / 'first.arrow', (0, 0))
+        os.utime(tmp_path / 'second.arrow', (1, 1))
+        cache.get('first')
+        cache.put('third', sample_frame)
+
+        assert cache.get('first') is not None
+        assert cache.get('second') is None
+        assert cache.get('third') is not None
+
+    def test_cache_dir_from_environment(self, tmp_path, monkeypatch):
+        """Каталог и размер кеша задаются переменными окружения."""
+        monkeypatch.setenv('ANOMALIZER_CACHE_DIR', str(tmp_path / 'cache'))
+        monkeypatch.setenv('ANOMALIZER_CACHE_MAX_BYTES', '1000')
+        cache = FrameCache()
+
+        assert cache.cache_dir == tmp_path / 'cache'
+        assert cache.max_bytes == 1000
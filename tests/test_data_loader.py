@@ -0,0 +1,182 @@
+import pandas as pd
+import pytest
+import tempfile
+import os
+from data_loader import detect_format, iter_excel_chunks, optimize_dtypes, read_table
+
+
+@pytest.fixture
+def test_excel_file():
+    """Создает временный Excel файл для тестирования."""
+    df = pd.DataFrame({
+        'date': pd.date_range('2023-01-01', periods=7),
+        'value': [1.5, 2.0, 3.5, 100.0, 2.5, 3.0, 1.0],
+        'category': ['A', 'B', 'A', 'B', 'A', 'B', 'A']
+    })
+    with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as tmp:
+        df.to_excel(tmp.name, index=False)
+        yield tmp.name
+    os.unlink(tmp.name)
+
+
+class TestIterExcelChunks:
+    """Тесты для функции iter_excel_chunks."""
+
+    def test_chunk_sizes(self, test_excel_file):
+        """Проверяет размеры частей и непрерывность индекса."""
+        chunks = list(iter_excel_chunks(test_excel_file, chunk_size=3))
+
+        assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+        assert [chunk.index[0] for chunk in chunks] == [0, 3, 6]
+
+    def test_chunks_match_read_excel(self, test_excel_file):
+        """Проверяет, что объединенные части совпадают с pd.read_excel."""
+        expected = pd.read_excel(test_excel_file)
+        result = pd.concat(iter_excel_chunks(test_excel_file, chunk_size=2))
+
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False, check_index_type=False)
+
+    def test_empty_sheet(self):
+        """Проверяет чтение пустого листа."""
+        with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as tmp:
+            temp_name = tmp.name
+            pd.DataFrame().to_excel(temp_name, index=False)
+
+        try:
+            assert list(iter_excel_chunks(temp_name)) == []
+        finally:
+            os.unlink(temp_name)
+
+    def test_invalid_chunk_size(self, test_excel_file):
+        """Проверяет, что размер части должен быть положительным."""
+        with pytest.raises(ValueError):
+            list(iter_excel_chunks(test_excel_file, chunk_size=0))
+
+
+@pytest.fixture
+def sample_frame():
+    """Фикстура с таблицей для записи в разные форматы."""
+    return pd.DataFrame({
+        'date': pd.date_range('2023-01-01', periods=4),
+        'value': [1.5, 2.0, 3.5, 100.0],
+        'category': ['A', 'B', 'A', 'B']
+    })
+
+
+class TestReadTable:
+    """Тесты для функции read_table."""
+
+    @pytest.mark.parametrize('suffix, writer', [
+        ('.xlsx', lambda df, path: df.to_excel(path, index=False)),
+        ('.csv', lambda df, path: df.to_csv(path, index=False)),
+        ('.parquet', lambda df, path: df.to_parquet(path)),
+        ('.feather', lambda df, path: df.to_feather(path)),
+    ])
+    def test_formats(self, tmp_path, sample_frame, suffix, writer):
+        """Проверяет чтение всех поддерживаемых форматов по пути и по байтам."""
+        path = tmp_path / f"data{suffix}"
+        writer(sample_frame, path)
+
+        from_path = read_table(str(path))
+        from_bytes = read_table(path.read_bytes())
+
+        pd.testing.assert_frame_equal(from_path, sample_frame, check_dtype=False)
+        pd.testing.assert_frame_equal(from_bytes, sample_frame, check_dtype=False)
+
+    @pytest.mark.parametrize('suffix, writer', [
+        ('.csv', lambda df, path: df.to_csv(path, index=False)),
+        ('.parquet', lambda df, path: df.to_parquet(path)),
+        ('.feather', lambda df, path: df.to_feather(path)),
+    ])
+    def test_column_projection(self, tmp_path, sample_frame, suffix, writer):
+        """Проверяет, что читаются только запрошенные столбцы."""
+        path = tmp_path / f"data{suffix}"
+        writer(sample_frame, path)
+
+        result = read_table(str(path), columns=['value', 'category'])
+
+        assert list(result.columns) == ['value', 'category']
+
+    def test_csv_semicolon_cp1251(self):
+        """Проверяет CSV с разделителем ';' в кодировке cp1251."""
+        data = 'дата;значение\n2023-01-01;10\n2023-01-02;12\n'.encode('cp1251')
+
+        result = read_table(data, file_name='выгрузка.csv')
+
+        assert list(result.columns) == ['дата', 'значение']
+        assert result['значение'].tolist() == [10, 12]
+
+
+class TestDetectFormat:
+    """Тесты для функции detect_format."""
+
+    def test_by_extension(self):
+        """Проверяет определение формата по расширению."""
+        assert detect_format(b'', 'data.XLSX') == 'xlsx'
+        assert detect_format(b'', 'data.pq') == 'parquet'
+        assert detect_format(b'', 'data.arrow') == 'feather'
+
+    def test_by_magic_bytes(self, sample_frame):
+        """Проверяет определение формата по сигнатуре, если расширение неизвестно."""
+        buffer = pd.io.common.BytesIO()
+        sample_frame.to_parquet(buffer)
+
+        assert detect_format(buffer.getvalue(), 'upload.bin') == 'parquet'
+        assert detect_format(b'a,b\n1,2\n') == 'csv'
+
+
+class TestOptimizeDtypes:
+    """Тесты для функции optimize_dtypes."""
+
+    @pytest.fixture
+    def store_data(self):
+        """Создает таблицу продаж с повторяющимися магазинами и артикулами."""
+        rows = 1000
+        return pd.DataFrame({
+            'store': [f'Магазин {i % 5}' for i in range(rows)],
+            'sku': [f'SKU-{i % 40}' for i in range(rows)],
+            'order_id': [f'order-{i}' for i in range(rows)],
+            'qty': [i % 100 for i in range(rows)],
+            'price': [i / 3 for i in range(rows)],
+            'half': [i / 2 for i in range(rows)],
+        })
+
+    def test_types_and_values(self, store_data):
+        """Проверяет новые типы и сохранение значений."""
+        result, report = optimize_dtypes(store_data)
+
+        assert isinstance(result['store'].dtype, pd.CategoricalDtype)
+        assert isinstance(result['sku'].dtype, pd.CategoricalDtype)
+        assert result['order_id'].dtype == store_data['order_id'].dtype
+        assert result['qty'].dtype == 'int8'
+        assert result['price'].dtype == 'float64'
+        pd.testing.assert_frame_equal(result, store_data, check_dtype=False, check_categorical=False)
+        assert set(report['columns']) == {'store', 'sku', 'qty'}
+
+    def test_memory_report(self, store_data):
+        """Проверяет отчет об экономии памяти."""
+        result, report = optimize_dtypes(store_data)
+
+        assert report['memory_before'] == store_data.memory_usage(deep=True).sum()
+        assert report['memory_after'] == result.memory_usage(deep=True).sum()
+        assert report['memory_after'] < report['memory_before']
+
+    def test_source_not_modified(self, store_data):
+        """Проверяет, что исходная таблица не изменяется."""
+        dtypes = store_data.dtypes.copy()
+        optimize_dtypes(store_data)
+        pd.testing.assert_series_equal(store_data.dtypes, dtypes)
+
+    def test_float32_only_when_lossless(self, store_data):
+        """Проверяет перевод в float32 только точно представимых значений."""
+        result, _ = optimize_dtypes(store_data, float32=True)
+
+        assert result['half'].dtype == 'float32'
+        assert result['price'].dtype == 'float64'
+
+    def test_category_ratio(self, store_data):
+        """Проверяет порог доли уникальных значений."""
+        result, _ = optimize_dtypes(store_data, max_category_ratio=0.01)
+
+        assert isinstance(result['store'].dtype, pd.CategoricalDtype)
+        assert not isinstance(result['sku'].dtype, pd.CategoricalDtype)
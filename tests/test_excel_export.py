@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+from io import BytesIO
+from openpyxl import load_workbook
+from excel_export import export_frame
+
+
+@pytest.fixture
+def anomalies_frame():
+    """Фикстура с таблицей аномалий разных типов."""
+    return pd.DataFrame({
+        'date': pd.to_datetime(['2023-01-04', '2023-01-09', None]),
+        'temperature': [50, 100, -10],
+        'humidity': [60.5, np.nan, 61.0],
+        'category': ['A', None, 'B']
+    })
+
+
+class TestExportFrame:
+    """Тесты для функции export_frame."""
+
+    @pytest.mark.parametrize('engine', ['openpyxl', 'xlsxwriter'])
+    def test_roundtrip(self, anomalies_frame, engine):
+        """Проверяет, что таблица читается обратно без изменений."""
+        excel_data = export_frame(anomalies_frame, 'Аномалии', engine=engine)
+
+        df = pd.read_excel(BytesIO(excel_data), sheet_name='Аномалии')
+        pd.testing.assert_frame_equal(df, anomalies_frame, check_dtype=False)
+
+    def test_threshold_rule_adds_conditional_format(self, anomalies_frame):
+        """Проверяет, что пороги задаются условным форматированием диапазона."""
+        excel_data = export_frame(anomalies_frame, 'Аномалии', engine='xlsxwriter',
+                                  threshold_rule=('temperature', 0, 60))
+
+        worksheet = load_workbook(BytesIO(excel_data))['Аномалии']
+        ranges = [str(rule.sqref) for rule in worksheet.conditional_formatting]
+        assert ranges == ['B2:B4']
+        assert all(cell.fill.fgColor.rgb != 'FFFF0000' for row in worksheet.iter_rows() for cell in row)
+
+    def test_unknown_engine(self, anomalies_frame):
+        """Проверяет, что неизвестный движок записи вызывает ошибку."""
+        with pytest.raises(ValueError):
+            export_frame(anomalies_frame, 'Аномалии', engine='xlwt')
@@ -0,0 +1,77 @@
+import json
+import logging
+import numpy as np
+import pytest
+import instrumentation
+from instrumentation import span, start_recording, stop_recording
+
+
+@pytest.fixture(autouse=True)
+def reset_instrumentation():
+    """Выключает измерения после каждого теста."""
+    yield
+    stop_recording()
+    instrumentation.disable()
+
+
+class TestSpan:
+    """Тесты для функции span."""
+
+    def test_disabled_span_is_shared_noop(self):
+        """Тест пустого измерения при выключенных измерениях."""
+        first = span('load_data', rows=10)
+        assert first is span('detect_anomalies')
+        with first as current:
+            current.set(anomalies=1)
+        assert stop_recording() == []
+
+    def test_records_time_rows_and_fields(self):
+        """Тест записи времени, строк и дополнительных полей."""
+        records = start_recording()
+        with span('detect_anomalies', rows=100) as current:
+            current.set(anomalies=3)
+
+        assert len(records) == 1
+        record = records[0]
+        assert record['stage'] == 'detect_anomalies'
+        assert record['rows'] == 100
+        assert record['anomalies'] == 3
+        assert record['seconds'] >= 0
+        assert 'peak_rss_delta_bytes' in record
+        assert stop_recording() is records
+
+    def test_tracemalloc_peak_of_nested_spans(self):
+        """Тест пика памяти вложенных этапов: внешний этап учитывает пик вложенного."""
+        records = start_recording('tracemalloc')
+        with span('process_file'):
+            with span('detect_anomalies'):
+                array = np.ones(1_000_000)
+                del array
+
+        inner, outer = records
+        assert inner['parent'] == 'process_file'
+        assert inner['traced_peak_bytes'] >= 8_000_000
+        assert outer['traced_peak_bytes'] >= inner['traced_peak_bytes']
+
+    def test_error_is_recorded_and_raised(self):
+        """Тест записи исключения без его подавления."""
+        records = start_recording()
+        with pytest.raises(KeyError):
+            with span('filter_data'):
+                raise KeyError('column')
+        assert records[0]['error'] == 'KeyError'
+
+    def test_json_log(self, caplog):
+        """Тест вывода записи в журнал одной строкой JSON."""
+        instrumentation.enable(log_to_stderr=False)
+        with caplog.at_level(logging.INFO, logger='anomalizer.instrumentation'):
+            with span('export', rows=5, engine='xlsxwriter'):
+                pass
+        record = json.loads(caplog.records[-1].getMessage())
+        assert record['stage'] == 'export'
+        assert record['engine'] == 'xlsxwriter'
+
+    def test_unknown_memory_mode(self):
+        """Тест ошибки для неизвестного режима измерения памяти."""
+        with pytest.raises(ValueError, match="режим измерения памяти"):
+            start_recording('psutil')
@@ -0,0 +1,210 @@
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+import pandas as pd
+import pytest
+import job_queue
+from anomaly_processor import process_file, process_file_streaming
+from job_queue import FINAL_STATES, JobQueue, run_job
+
+
+@pytest.fixture
+def excel_bytes(tmp_path):
+    """Байты Excel файла с двумя листами и известными аномалиями."""
+    path = tmp_path / 'data.xlsx'
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({
+            'temperature': [20, 22, 21, 50, 19, 18, 20, 21, 100, 22],  # 50 и 100 - аномалии
+            'humidity': [60, 62, 61, 59, 58, 200, 61, 60, 59, 62],  # 200 - аномалия
+        }).to_excel(writer, sheet_name='Plant1', index=False)
+        pd.DataFrame({'load': [10, 11, 10, 12, 500, 11]}).to_excel(writer, sheet_name='Plant2', index=False)
+    return path.read_bytes()
+
+
+@pytest.fixture
+def thread_queue(tmp_path, monkeypatch):
+    """Очередь, выполняющая задания в потоке текущего процесса."""
+    monkeypatch.setattr(job_queue, 'ProcessPoolExecutor',
+                        lambda max_workers, mp_context: ThreadPoolExecutor(max_workers))
+    queue = JobQueue(tmp_path / 'jobs')
+    yield queue
+    queue.shutdown()
+
+
+class PendingExecutor:
+    """Пул, в котором задания никогда не начинают выполняться."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def submit(self, *args):
+        return Future()
+
+
+@pytest.fixture
+def pending_queue(tmp_path, monkeypatch):
+    """Очередь, задания которой остаются ожидающими."""
+    monkeypatch.setattr(job_queue, 'ProcessPoolExecutor', PendingExecutor)
+    return JobQueue(tmp_path / 'jobs')
+
+
+def wait_for(queue, job_id, timeout=60):
+    """Ожидает завершения задания и возвращает его состояние."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = queue.status(job_id)
+        if status['state'] in FINAL_STATES:
+            return status
+        time.sleep(0.05)
+    raise TimeoutError(job_id)
+
+
+class TestJobQueue:
+    """Тесты для класса JobQueue."""
+
+    def test_first_sheet(self, thread_queue, excel_bytes):
+        """Проверяет обработку первого листа: состояние, итоги и файл результата."""
+        job_id = thread_queue.submit(excel_bytes, 'data.xlsx')
+        status = wait_for(thread_queue, job_id)
+
+        assert status['state'] == 'done'
+        assert status['progress'] == 1.0
+        assert status['anomalies_by_column'] == {'temperature': 2, 'humidity': 1}
+
+        expected = [result.count for result in process_file(excel_bytes, file_name='data.xlsx')]
+        assert status['anomalies'] == sum(expected)
+        result = pd.read_excel(thread_queue.result_path(job_id))
+        assert result['Anomaly'].tolist() == ['50 temperature', '100 temperature', '200 humidity']
+
+    def test_sheets(self, thread_queue, excel_bytes):
+        """Проверяет обработку нескольких листов с листом результата на каждый."""
+        job_id = thread_queue.submit(excel_bytes, 'data.xlsx', sheets=['Plant2', 'Plant1'])
+        status = wait_for(thread_queue, job_id)
+
+        assert status['state'] == 'done'
+        assert status['anomalies_by_column']['Plant2: load'] == 1
+        sheets = pd.read_excel(thread_queue.result_path(job_id), sheet_name=None)
+        assert list(sheets) == ['Plant2', 'Plant1']
+
+    @pytest.mark.parametrize('sheets', [None, ['Plant2', 'Plant1']])
+    def test_large_file_is_streamed(self, tmp_path, monkeypatch, excel_bytes, sheets):
+        """Проверяет потоковую обработку xlsx файла от streaming_min_bytes байт."""
+        monkeypatch.setattr(job_queue, 'ProcessPoolExecutor',
+                            lambda max_workers, mp_context: ThreadPoolExecutor(max_workers))
+        methods = []
+
+        def streaming(*args, **kwargs):
+            methods.append(kwargs['method'])
+            return process_file_streaming(*args, **kwargs)
+
+        monkeypatch.setattr(job_queue, 'process_file_streaming', streaming)
+        queue = JobQueue(tmp_path / 'jobs', streaming_min_bytes=len(excel_bytes))
+        try:
+            status = wait_for(queue, queue.submit(excel_bytes, 'data.xlsx', sheets=sheets))
+            assert methods == ['exact'] * len(sheets or [None])
+            queue.streaming_min_bytes += 1
+            wait_for(queue, queue.submit(excel_bytes, 'data.xlsx', sheets=sheets))
+            assert len(methods) == len(sheets or [None])
+        finally:
+            queue.shutdown()
+
+        assert status['state'] == 'done'
+        if sheets:
+            assert status['anomalies_by_column'] == {
+                'Plant2: load': 1, 'Plant1: temperature': 2, 'Plant1: humidity': 1}
+        else:
+            assert status['anomalies_by_column'] == {'temperature': 2, 'humidity': 1}
+
+    def test_failed_job(self, thread_queue):
+        """Проверяет, что ошибка обработки записывается в состояние задания."""
+        job_id = thread_queue.submit(b'PK\x03\x04 not a workbook', 'broken.xlsx')
+        status = wait_for(thread_queue, job_id)
+
+        assert status['state'] == 'failed'
+        assert status['error']
+        assert thread_queue.result_path(job_id) is None
+
+    def test_cancel_queued_job(self, pending_queue, excel_bytes):
+        """Проверяет снятие ожидающего задания с очереди."""
+        job_id = pending_queue.submit(excel_bytes, 'data.xlsx')
+
+        assert pending_queue.status(job_id)['state'] == 'queued'
+        assert pending_queue.cancel(job_id)
+        assert pending_queue.status(job_id)['state'] == 'cancelled'
+        assert not pending_queue.cancel(job_id)
+
+    def test_delete_and_purge(self, thread_queue, excel_bytes):
+        """Проверяет удаление завершенных заданий."""
+        first = thread_queue.submit(excel_bytes, 'data.xlsx')
+        second = thread_queue.submit(excel_bytes, 'data.xlsx')
+        wait_for(thread_queue, first)
+        wait_for(thread_queue, second)
+
+        assert thread_queue.delete(first)
+        assert thread_queue.status(first) is None
+        assert thread_queue.purge(max_age_seconds=3600) == 0
+        assert thread_queue.purge(max_age_seconds=0) == 1
+        assert thread_queue.status(second) is None
+
+    def test_invalid_job_id(self, thread_queue):
+        """Проверяет, что идентификатор не может указывать за пределы каталога заданий."""
+        with pytest.raises(ValueError):
+            thread_queue.status('../../etc')
+
+    def test_process_pool(self, tmp_path, excel_bytes):
+        """Проверяет выполнение задания в отдельном процессе."""
+        queue = JobQueue(tmp_path / 'jobs')
+        try:
+            status = wait_for(queue, queue.submit(excel_bytes, 'data.xlsx'))
+        finally:
+            queue.shutdown()
+        assert status['state'] == 'done'
+        assert status['anomalies'] == 3
+
+    def test_pool_recovers_after_worker_crash(self, tmp_path, excel_bytes):
+        """Проверяет, что после аварийного завершения процесса задания снова выполняются."""
+        queue = JobQueue(tmp_path / 'jobs')
+        try:
+            lost = queue.submit(excel_bytes, 'data.xlsx')
+            for process in list(queue._executor._processes.values()):
+                process.kill()
+            status = wait_for(queue, lost)
+            assert status['state'] == 'failed'
+            assert 'аварийно' in status['error']
+
+            status = wait_for(queue, queue.submit(excel_bytes, 'data.xlsx'))
+        finally:
+            queue.shutdown()
+        assert status['state'] == 'done'
+        assert status['anomalies'] == 3
+
+
+class TestRunJob:
+    """Тесты для функции run_job."""
+
+    def test_progress(self, pending_queue, excel_bytes, monkeypatch):
+        """Проверяет, что прогресс растет после каждой части столбцов."""
+        job_id = pending_queue.submit(excel_bytes, 'data.xlsx')
+        monkeypatch.setattr(job_queue, 'PROGRESS_STEPS', 2)
+        progress = []
+        update_status = job_queue._update_status
+
+        def record(directory, **fields):
+            if 'progress' in fields:
+                progress.append(fields['progress'])
+            update_status(directory, **fields)
+
+        monkeypatch.setattr(job_queue, '_update_status', record)
+        run_job(str(pending_queue.jobs_dir / job_id))
+
+        assert progress == sorted(progress)
+        assert len(progress) == 5  # чтение, две части столбцов, запись, готово
+        assert pending_queue.status(job_id)['state'] == 'done'
+
+    def test_cancel_running_job(self, pending_queue, excel_bytes):
+        """Проверяет остановку выполняемого задания по отметке об отмене."""
+        job_id = pending_queue.submit(excel_bytes, 'data.xlsx')
+
+        (pending_queue.jobs_dir / job_id / 'cancel').touch()
+        run_job(str(pending_queue.jobs_dir / job_id))
+
+        assert pending_queue.status(job_id)['state'] == 'cancelled'
@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+import pytest
+from plot_utils import (
+    band_positions, band_share, downsample_positions, limit_groups, split_budget, split_by_group, trace_budgets
+)
+
+
+@pytest.fixture
+def large_series():
+    """Создает длинный ряд с датами и несколькими выбросами."""
+    rng = np.random.default_rng(0)
+    dates = pd.Series(pd.date_range('2020-01-01', periods=100_000, freq='min'))
+    values = pd.Series(rng.normal(0, 1, len(dates)))
+    values.iloc[[10, 50_000, 99_990]] = [50.0, -40.0, 60.0]
+    return dates, values
+
+
+class TestDownsamplePositions:
+    """Тесты для функции downsample_positions."""
+
+    @pytest.mark.parametrize('method', ['minmax', 'lttb'])
+    def test_budget_is_respected(self, large_series, method):
+        """Тест: количество точек не превышает бюджет, номера упорядочены и уникальны."""
+        dates, values = large_series
+        positions = downsample_positions(dates, values, 1000, method)
+
+        assert 2 <= len(positions) <= 1000
+        assert np.all(np.diff(positions) > 0)
+
+    @pytest.mark.parametrize('method', ['minmax', 'lttb'])
+    def test_extremes_are_kept(self, large_series, method):
+        """Тест: выбросы сохраняются при прореживании."""
+        dates, values = large_series
+        positions = downsample_positions(dates, values, 1000, method)
+        assert {10, 50_000, 99_990} <= set(positions.tolist())
+
+    def test_minmax_keeps_bin_extremes(self):
+        """Тест: minmax сохраняет минимум и максимум каждого интервала."""
+        x = np.arange(8)
+        y = np.array([1, 5, 3, 2, 9, 0, 4, 4], dtype=float)
+        positions = downsample_positions(x, y, 4, 'minmax')
+        assert positions.tolist() == [0, 1, 4, 5]
+
+    def test_small_series_is_not_changed(self):
+        """Тест: ряд меньше бюджета возвращается целиком без пропусков."""
+        y = pd.Series([1.0, np.nan, 3.0, 4.0])
+        positions = downsample_positions(pd.RangeIndex(4), y, 10)
+        assert positions.tolist() == [0, 2, 3]
+
+    def test_unsorted_and_non_numeric_x(self):
+        """Тест: неупорядоченные даты и текстовые метки по оси X."""
+        dates = pd.Series(pd.to_datetime(['2023-01-03', '2023-01-01', '2023-01-02', pd.NaT, '2023-01-04']))
+        y = pd.Series([1.0, 2.0, 3.0, 4.0, 5.0])
+        assert len(downsample_positions(dates, y, 3, 'lttb')) == 3
+        assert len(downsample_positions(list('abcde'), y, 2)) == 2
+
+    def test_invalid_arguments(self):
+        """Тест ошибок для неизвестного метода и слишком малого бюджета."""
+        with pytest.raises(ValueError):
+            downsample_positions([1, 2, 3], [1, 2, 3], 10, 'random')
+        with pytest.raises(ValueError):
+            downsample_positions([1, 2, 3], [1, 2, 3], 1)
+
+
+def test_split_budget():
+    """Тест деления бюджета точек между группами пропорционально размеру."""
+    assert split_budget([900, 100, 0], 1000).tolist() == [900, 100, 0]
+    assert split_budget([1800, 200, 1], 1000).tolist() == [898, 100, 1]
+    assert split_budget([10, 5], 1000).tolist() == [10, 5]
+
+
+@pytest.mark.parametrize('max_points', [5, 100, 20_000])
+def test_split_budget_is_upper_bound(max_points):
+    """Тест: сумма бюджетов не превышает max_points при любом количестве групп."""
+    sizes = np.random.default_rng(0).integers(1, 50, size=30_000)
+    budgets = split_budget(sizes, max_points)
+    assert budgets.sum() <= max_points
+    assert (budgets <= sizes).all()
+
+
+def test_limit_groups():
+    """Тест: мелкие группы объединяются, крупнейшие остаются в исходном порядке."""
+    data = pd.DataFrame({'key': np.repeat(['a', 'b', 'c', 'd', 'e'], [5, 1, 4, 2, 3]),
+                         'value': np.arange(15.0)})
+    groups = split_by_group(data, data.iloc[[0, 5, 14]], ['key'])
+
+    limited = limit_groups(groups, 3)
+
+    assert [key for key, _, _ in limited] == [('a',), ('c',), None]
+    assert limited[2][1].tolist() == [5, 10, 11, 12, 13, 14]
+    assert limited[2][2].tolist() == [1, 2]
+    assert limit_groups(groups, 5) is groups
+
+
+def test_band_positions():
+    """Тест: точки полосы без пропусков порогов, упорядоченные по оси X, с прореживанием."""
+    x = pd.Series(pd.to_datetime(['2023-01-03', '2023-01-01', '2023-01-02', '2023-01-04']))
+    lower = np.array([1.0, np.nan, 2.0, 3.0])
+    upper = lower + 5
+    assert band_positions(x, lower, upper).tolist() == [2, 0, 3]
+
+    x = np.arange(10_000)
+    lower = np.sin(x / 100.0)
+    for max_points in (500, 3, 1, 0):
+        positions = band_positions(x, lower, lower + 1, max_points=max_points)
+        assert 0 < len(positions) <= max_points or max_points == 0 == len(positions)
+        assert np.all(np.diff(x[positions]) > 0)
+
+
+def test_band_share():
+    """Тест: данным треть бюджета ряда, каждой границе полосы - треть."""
+    assert band_share(10_000, 900) == (300, 299)
+    assert band_share(100, 900) == (100, 100)
+    assert band_share(10_000, 0) == (0, 0)
+    assert band_share(10_000, None) == (None, None)
+
+
+def test_trace_budgets():
+    """Тест: бюджет делится между рядами, внутри ряда с полосой - между данными и полосой."""
+    assert trace_budgets([10_000, 10_000], None, [True, False]) == [(None, None), (None, None)]
+    budgets = trace_budgets([10_000, 10_000], 1800, [True, False])
+    assert budgets == [(300, 299), (900, None)]
+    assert sum(data + 2 * (band or 0) for data, band in budgets) <= 1800
+
+
+def _split_reference(data, anomalies, group_columns):
+    """Прежнее сопоставление аномалий группам построчным сравнением кортежей."""
+    result = []
+    for name, group in data.groupby(group_columns):
+        group_mask = anomalies[group_columns].apply(tuple, axis=1).isin(
+            group[group_columns].apply(tuple, axis=1)
+        )
+        result.append((name, group, anomalies[group_mask]))
+    return result
+
+
+class TestSplitByGroup:
+    """Тесты для функции split_by_group."""
+
+    @pytest.mark.parametrize('group_columns', [['store'], ['store', 'kind'], ['kind', 'category']])
+    def test_matches_reference(self, group_columns):
+        """Тест: группы, их порядок и состав совпадают с прежним построчным сопоставлением."""
+        rng = np.random.default_rng(1)
+        data = pd.DataFrame({
+            'store': rng.choice(['s1', 's2', None], 300),
+            'kind': rng.integers(0, 4, 300),
+            'category': pd.Categorical(rng.choice(['x', 'y'], 300)),
+            'value': rng.normal(0, 1, 300),
+        }, index=rng.permutation(1000)[:300])
+        anomalies = data[data['value'].abs() > 1.5].sample(frac=1, random_state=0)
+
+        result = split_by_group(data, anomalies, group_columns)
+        reference = _split_reference(data, anomalies, group_columns)
+
+        assert [name for name, _, _ in result] == [name for name, _, _ in reference]
+        for (_, positions, anomaly_positions), (_, group, group_anomalies) in zip(result, reference):
+            pd.testing.assert_frame_equal(data.iloc[positions], group)
+            pd.testing.assert_frame_equal(anomalies.iloc[anomaly_positions], group_anomalies)
+
+    def test_no_anomalies(self):
+        """Тест: группы без аномалий получают пустой список позиций."""
+        data = pd.DataFrame({'g': ['a', 'b', 'a'], 'value': [1.0, 2.0, 3.0]})
+        result = split_by_group(data, data.iloc[:0], ['g'])
+        assert [(name, positions.tolist(), anomaly_positions.tolist())
+                for name, positions, anomaly_positions in result] == [(('a',), [0, 2], []), (('b',), [1], [])]
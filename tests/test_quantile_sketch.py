@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+from quantile_sketch import KLLSketch, pack_sketches, sketch_quantiles, unpack_sketches
+
+
+def _rank_error(sorted_values, estimate, q):
+    """Нормированная ошибка ранга оценки квантиля."""
+    rank = np.searchsorted(sorted_values, estimate) / len(sorted_values)
+    return abs(rank - q)
+
+
+@pytest.fixture
+def large_values():
+    """Фикстура с большим асимметричным набором значений."""
+    rng = np.random.default_rng(0)
+    return rng.lognormal(size=200_000)
+
+
+class TestKLLSketch:
+    """Тесты для скетча квантилей KLL."""
+
+    def test_small_data_is_exact(self):
+        """Пока данные помещаются в скетч, квантили совпадают с pandas."""
+        values = [10, 12, 11, 100, 9, 200, 13, -50, 15, 14]
+        sketch = KLLSketch().update(values)
+
+        for q in (0.25, 0.5, 0.75):
+            assert sketch.quantile(q) == pytest.approx(pd.Series(values).quantile(q))
+
+    def test_rank_error_bound(self, large_values):
+        """Ошибка ранга укладывается в документированную границу для k=200."""
+        sketch = KLLSketch(seed=1)
+        for chunk in np.array_split(large_values, 50):
+            sketch.update(chunk)
+        sorted_values = np.sort(large_values)
+
+        assert sketch.count == len(large_values)
+        assert sketch.num_retained < 1000
+        for q in (0.25, 0.75):
+            assert _rank_error(sorted_values, sketch.quantile(q), q) < 0.0133
+
+    def test_merge(self, large_values):
+        """Объединенные скетчи частей дают оценку в пределах той же границы."""
+        parts = np.array_split(large_values, 4)
+        sketch = KLLSketch(seed=1).update(parts[0])
+        for seed, part in enumerate(parts[1:], start=2):
+            sketch.merge(KLLSketch(seed=seed).update(part))
+        sorted_values = np.sort(large_values)
+
+        assert sketch.count == len(large_values)
+        assert sketch.min == large_values.min()
+        assert sketch.max == large_values.max()
+        for q in (0.25, 0.75):
+            assert _rank_error(sorted_values, sketch.quantile(q), q) < 0.0133
+
+    def test_ignores_nan(self):
+        """Пропуски не учитываются."""
+        sketch = KLLSketch().update([1.0, np.nan, 3.0])
+        assert sketch.count == 2
+        assert sketch.quantile(0.5) == 2.0
+
+    def test_empty(self):
+        """Пустой скетч возвращает NaN."""
+        assert np.isnan(KLLSketch().quantile(0.5))
+
+    def test_default_seed_is_fixed(self, large_values):
+        """Одни и те же данные дают одни и те же квантили, в том числе после восстановления."""
+        first = KLLSketch(k=20).update(large_values)
+        second = KLLSketch(k=20).update(large_values)
+        np.testing.assert_array_equal(first.quantile([0.25, 0.75]), second.quantile([0.25, 0.75]))
+
+        restored = [KLLSketch.from_dict(first.to_dict()).update(large_values) for _ in range(2)]
+        np.testing.assert_array_equal(restored[0].quantile([0.25, 0.75]), restored[1].quantile([0.25, 0.75]))
+
+    def test_sketch_quantiles_match_quantile(self, large_values):
+        """Квантили множества скетчей совпадают с квантилями каждого скетча."""
+        sketches = [KLLSketch(k=20).update(large_values[:size]) for size in (0, 1, 2, 7, 300, 5000)]
+        levels = [0, 0.1, 0.25, 0.5, 0.75, 1]
+        result = sketch_quantiles(sketches, levels)
+
+        assert np.isnan(result[0]).all()
+        for sketch, row in zip(sketches[1:], result[1:]):
+            np.testing.assert_array_equal(row, sketch.quantile(levels))
+
+    def test_pack_roundtrip(self, large_values):
+        """Упаковка в массивы сохраняет состояние скетчей."""
+        sketches = [KLLSketch(k=20).update(large_values[:size]) for size in (0, 3, 5000)]
+        restored = unpack_sketches(pack_sketches(sketches))
+
+        assert [sketch.count for sketch in restored] == [0, 3, 5000]
+        np.testing.assert_array_equal(sketch_quantiles(restored, [0.25, 0.75]),
+                                      sketch_quantiles(sketches, [0.25, 0.75]))
+
+    def test_dict_roundtrip(self, large_values):
+        """Сериализация в словарь сохраняет состояние скетча."""
+        sketch = KLLSketch(seed=1).update(large_values)
+        restored = KLLSketch.from_dict(sketch.to_dict())
+
+        assert restored.count == sketch.count
+        np.testing.assert_allclose(restored.quantile([0.25, 0.75]), sketch.quantile([0.25, 0.75]))